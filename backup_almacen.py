@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Almacén de blobs direccionado por contenido para los backups de Rauli-Bot.
+
+backups/blobs/<2 hex>/<sha256>    contenido de cada archivo (una sola copia por contenido)
+backups/snapshots/<nombre>.json   manifiesto del snapshot: ruta relativa -> hash, tamaño, mtime_ns, modo
+
+Un snapshot solo añade los blobs que aún no existen: los archivos sin cambios no ocupan disco.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Iterator
+
+from backup_hashing import BLOQUE, hash_archivo
+
+# Directorios que nunca entran en un snapshot
+EXCLUIR = frozenset({".git", "__pycache__", "node_modules", ".venv", "backups"})
+
+
+def recorrer(raiz: Path, excluir: frozenset[str] = EXCLUIR) -> Iterator[tuple[str, Path, os.stat_result]]:
+    """(ruta relativa posix, ruta, stat) de cada archivo regular bajo raiz, sin seguir symlinks."""
+    pendientes = [raiz]
+    while pendientes:
+        actual = pendientes.pop()
+        try:
+            entradas = list(os.scandir(actual))
+        except OSError:
+            continue
+        for e in entradas:
+            if e.name in excluir:
+                continue
+            try:
+                if e.is_dir(follow_symlinks=False):
+                    pendientes.append(Path(e.path))
+                elif e.is_file(follow_symlinks=False):
+                    p = Path(e.path)
+                    yield p.relative_to(raiz).as_posix(), p, e.stat(follow_symlinks=False)
+            except OSError:
+                continue
+
+
+def escribir_json_atomico(ruta: Path, datos: dict) -> None:
+    tmp = ruta.with_name(ruta.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(datos, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, ruta)
+
+
+def leer_manifiesto(ruta: Path | str) -> dict:
+    with open(ruta, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class AlmacenBlobs:
+    """Blobs inmutables nombrados por su SHA-256."""
+
+    def __init__(self, raiz: Path | str):
+        self.dir_blobs = Path(raiz) / "blobs"
+        self.dir_tmp = self.dir_blobs / "tmp"
+        self.dir_tmp.mkdir(parents=True, exist_ok=True)
+
+    def ruta(self, digest: str) -> Path:
+        return self.dir_blobs / digest[:2] / digest
+
+    def existe(self, digest: str) -> bool:
+        return self.ruta(digest).exists()
+
+    def guardar(self, origen: Path | str) -> tuple[str, int]:
+        """Copia origen al almacén hasheando lo que se copia. Devuelve (sha256, bytes escritos);
+        bytes es 0 si el blob ya estaba.
+
+        El blob se nombra por los bytes realmente copiados: si el archivo cambió desde que se hasheó
+        para el snapshot, se guarda (y se registra) su contenido nuevo en lugar de perderlo."""
+        fd_tmp, nombre_tmp = tempfile.mkstemp(suffix=".tmp", dir=self.dir_tmp)
+        tmp = Path(nombre_tmp)
+        h = hashlib.sha256()
+        escritos = 0
+        try:
+            with open(origen, "rb") as fo, os.fdopen(fd_tmp, "wb") as fd:
+                for bloque in iter(lambda: fo.read(BLOQUE), b""):
+                    h.update(bloque)
+                    fd.write(bloque)
+                    escritos += len(bloque)
+            digest = h.hexdigest()
+            destino = self.ruta(digest)
+            if destino.exists():
+                return digest, 0
+            destino.parent.mkdir(exist_ok=True)
+            os.replace(tmp, destino)
+        finally:
+            if tmp.exists():
+                tmp.unlink()
+        return digest, escritos
+
+    def restaurar(self, digest: str, destino: Path | str) -> None:
+        """Copia el blob a destino (vía archivo temporal + rename)."""
+        destino = Path(destino)
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        tmp = destino.with_name(f".{destino.name}.restaurando")
+        shutil.copyfile(self.ruta(digest), tmp)
+        os.replace(tmp, destino)
+
+    def verificar(self, digest: str) -> bool:
+        """True si el blob existe y su contenido sigue teniendo ese hash."""
+        try:
+            return hash_archivo(self.ruta(digest)) == digest
+        except OSError:
+            return False
+
+    def digests(self) -> Iterator[str]:
+        for sub in self.dir_blobs.iterdir():
+            if sub.is_dir() and len(sub.name) == 2:
+                for b in sub.iterdir():
+                    yield b.name
+
+    def recolectar(self, referenciados: set[str]) -> tuple[int, int]:
+        """Borra los blobs que ningún snapshot referencia. Devuelve (blobs borrados, bytes liberados)."""
+        borrados = liberados = 0
+        for digest in list(self.digests()):
+            if digest in referenciados:
+                continue
+            p = self.ruta(digest)
+            try:
+                tam = p.stat().st_size
+                p.unlink()
+            except OSError:
+                continue
+            borrados += 1
+            liberados += tam
+        return borrados, liberados
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Formato empaquetado de backups: un .tar con cada archivo comprimido por separado + índice.
+
+- Se escribe en una sola pasada: cada archivo se lee una vez (hash + compresión a la vez) y va
+  directo al tar; la cabecera se reescribe al final del miembro con el tamaño real (sin copias
+  temporales del árbol).
+- Compresión por archivo con zstd (paquete `zstandard` o compression.zstd de Python 3.14) o, si no
+  está disponible, gzip. Los formatos ya comprimidos (jpg, png, zip, mp4...) se guardan tal cual.
+- Índice <archivo>.tar.idx.json con el offset de cada miembro: un archivo suelto se extrae o
+  verifica con un seek, sin recorrer el tar. El índice también va como último miembro del tar.
+- El tar es estándar: `tar xf` deja los archivos con extensión .zst / .gz.
+"""
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+import os
+import tarfile
+import zlib
+from pathlib import Path
+
+from backup_hashing import BLOQUE
+
+try:  # Python 3.14+
+    from compression import zstd as _zstd_std
+except ImportError:
+    _zstd_std = None
+try:
+    import zstandard as _zstandard
+except ImportError:
+    _zstandard = None
+
+CODEC_DEFECTO = "zstd" if (_zstd_std or _zstandard) else "gzip"
+EXTENSIONES = {"zstd": ".zst", "gzip": ".gz", "ninguno": ""}
+# No merece la pena recomprimir
+SIN_COMPRIMIR = frozenset({
+    ".jpg", ".jpeg", ".png", ".gif", ".webp", ".ico", ".mp3", ".mp4", ".m4a", ".ogg", ".oga", ".webm",
+    ".zip", ".gz", ".tgz", ".zst", ".xz", ".bz2", ".7z", ".rar", ".xlsx", ".docx", ".pdf", ".woff", ".woff2",
+})
+MIEMBRO_INDICE = ".rauli_indice.json"
+
+
+def _compresor(codec: str):
+    """Objeto con compress(bytes) y flush() para el codec."""
+    if codec == "zstd":
+        if _zstandard:
+            return _zstandard.ZstdCompressor(level=3).compressobj()
+        return _zstd_std.ZstdCompressor(level=3)
+    if codec == "gzip":
+        return zlib.compressobj(6, zlib.DEFLATED, 31)
+    return None
+
+
+def _descompresor(codec: str):
+    if codec == "zstd":
+        if _zstandard:
+            return _zstandard.ZstdDecompressor().decompressobj()
+        if _zstd_std:
+            return _zstd_std.ZstdDecompressor()
+        raise RuntimeError("Este archivo usa zstd: instala el paquete zstandard")
+    if codec == "gzip":
+        return zlib.decompressobj(47)
+    return None
+
+
+def ruta_indice(ruta_tar: Path | str) -> Path:
+    return Path(str(ruta_tar) + ".idx.json")
+
+
+class EscritorArchivo:
+    """Crea un archivo empaquetado. Uso: with EscritorArchivo(ruta) as e: e.agregar(rel, path, st)."""
+
+    def __init__(self, ruta: Path | str, codec: str | None = None):
+        self.ruta = Path(ruta)
+        self.codec = codec or CODEC_DEFECTO
+        if self.codec == "zstd" and not (_zstd_std or _zstandard):
+            raise RuntimeError("zstd no disponible: instala el paquete zstandard o usa gzip")
+        self._tmp = self.ruta.with_name(self.ruta.name + ".parcial")
+        self._f = open(self._tmp, "wb")
+        self.indice: dict[str, dict] = {}
+        self.bytes_comprimidos = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, tb):
+        if tipo is None:
+            self.cerrar()
+        else:
+            self.abortar()
+
+    @staticmethod
+    def _cabecera(nombre: str, size: int, mtime: float, mode: int) -> bytes:
+        ti = tarfile.TarInfo(nombre)
+        ti.size = size
+        ti.mtime = int(mtime)
+        ti.mode = mode
+        return ti.tobuf(format=tarfile.PAX_FORMAT, encoding="utf-8", errors="surrogateescape")
+
+    def agregar(self, rel: str, ruta: Path | str, st: os.stat_result) -> dict:
+        """Añade un archivo: lo lee una vez (hash + compresión). Devuelve su entrada de índice."""
+        codec = "ninguno" if Path(rel).suffix.lower() in SIN_COMPRIMIR else self.codec
+        nombre = rel + EXTENSIONES[codec]
+        mode = st.st_mode & 0o777
+        inicio = self._f.tell()
+        try:
+            provisional = self._cabecera(nombre, 0, st.st_mtime, mode)
+            self._f.write(provisional)
+            offset = self._f.tell()
+
+            h = hashlib.sha256()
+            comp = _compresor(codec)
+            size = 0
+            with open(ruta, "rb") as fo:
+                for bloque in iter(lambda: fo.read(BLOQUE), b""):
+                    h.update(bloque)
+                    size += len(bloque)
+                    self._f.write(comp.compress(bloque) if comp else bloque)
+            if comp:
+                self._f.write(comp.flush())
+            csize = self._f.tell() - offset
+            resto = csize % tarfile.BLOCKSIZE
+            if resto:
+                self._f.write(tarfile.NUL * (tarfile.BLOCKSIZE - resto))
+            fin = self._f.tell()
+
+            # Cabecera definitiva con el tamaño comprimido real (misma longitud que la provisional)
+            definitiva = self._cabecera(nombre, csize, st.st_mtime, mode)
+            if len(definitiva) != len(provisional):
+                raise ValueError(f"{rel}: archivo demasiado grande para el formato empaquetado")
+            self._f.seek(inicio)
+            self._f.write(definitiva)
+            self._f.seek(fin)
+        except BaseException:
+            # Sin miembro a medias: una cabecera de tamaño 0 seguida de datos (o sin ellos) dejaría
+            # un archivo fantasma en `tar x` y desalinearía todos los miembros siguientes
+            self._f.seek(inicio)
+            self._f.truncate()
+            raise
+
+        entrada = {
+            "offset": offset, "csize": csize, "codec": codec,
+            "hash": h.hexdigest(), "size": size, "mtime_ns": st.st_mtime_ns, "mode": mode,
+        }
+        self.indice[rel] = entrada
+        self.bytes_comprimidos += csize
+        return entrada
+
+    def cerrar(self) -> None:
+        datos = json.dumps({"version": 1, "archivos": self.indice}, ensure_ascii=False).encode("utf-8")
+        ti = tarfile.TarInfo(MIEMBRO_INDICE)
+        ti.size = len(datos)
+        self._f.write(ti.tobuf(format=tarfile.PAX_FORMAT, encoding="utf-8"))
+        self._f.write(datos)
+        resto = len(datos) % tarfile.BLOCKSIZE
+        if resto:
+            self._f.write(tarfile.NUL * (tarfile.BLOCKSIZE - resto))
+        self._f.write(tarfile.NUL * (tarfile.BLOCKSIZE * 2))
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        self._f.close()
+        idx = ruta_indice(self.ruta)
+        idx_tmp = idx.with_name(idx.name + ".tmp")
+        idx_tmp.write_bytes(datos)
+        os.replace(self._tmp, self.ruta)
+        os.replace(idx_tmp, idx)
+
+    def abortar(self) -> None:
+        self._f.close()
+        self._tmp.unlink(missing_ok=True)
+
+
+class LectorArchivo:
+    """Lee miembros sueltos de un archivo empaquetado a partir de su índice."""
+
+    def __init__(self, ruta: Path | str):
+        self.ruta = Path(ruta)
+        idx = ruta_indice(self.ruta)
+        if idx.exists():
+            datos = json.loads(idx.read_text(encoding="utf-8"))
+        else:
+            # Sin índice aparte: se lee el que va dentro del tar
+            with tarfile.open(self.ruta, "r:") as tar:
+                datos = json.load(tar.extractfile(tar.getmember(MIEMBRO_INDICE)))
+        self.indice: dict[str, dict] = datos["archivos"]
+
+    def leer(self, rel: str, f: io.BufferedReader | None = None):
+        """Genera el contenido descomprimido de rel por bloques."""
+        e = self.indice[rel]
+        propio = f is None
+        f = f or open(self.ruta, "rb")
+        try:
+            f.seek(e["offset"])
+            desc = _descompresor(e["codec"])
+            restante = e["csize"]
+            while restante > 0:
+                bloque = f.read(min(BLOQUE, restante))
+                if not bloque:
+                    raise ValueError(f"{rel}: archivo empaquetado truncado")
+                restante -= len(bloque)
+                yield desc.decompress(bloque) if desc else bloque
+            if desc and hasattr(desc, "flush"):
+                yield desc.flush()
+        finally:
+            if propio:
+                f.close()
+
+    def extraer(self, rel: str, destino: Path | str) -> None:
+        """Escribe rel en destino (temporal + rename)."""
+        destino = Path(destino)
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        tmp = destino.with_name(f".{destino.name}.restaurando")
+        with open(tmp, "wb") as fd:
+            for bloque in self.leer(rel):
+                fd.write(bloque)
+        os.replace(tmp, destino)
+
+    def verificar(self, rel: str) -> bool:
+        """True si el contenido descomprimido de rel tiene el hash y tamaño del índice."""
+        e = self.indice[rel]
+        h = hashlib.sha256()
+        size = 0
+        try:
+            for bloque in self.leer(rel):
+                h.update(bloque)
+                size += len(bloque)
+        except Exception:
+            return False
+        return size == e["size"] and h.hexdigest() == e["hash"]
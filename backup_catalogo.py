@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Catálogo SQLite de los backups (sustituye a backups/backup_metadata.json).
+
+Tablas:
+  snapshots  una fila por backup (nombre, fecha, descripción, tipo, tamaños)
+  archivos   (snapshot, ruta) -> hash, tamaño, mtime_ns, modo
+  blobs      hash -> tamaño de cada blob del almacén (+ mtime del blob en su última verificación)
+  verificaciones  último resultado de verificar cada snapshot (fecha, modo, ok)
+  meta       clave -> valor (p. ej. backup actual)
+
+Cada snapshot se registra en una sola transacción: un corte a mitad de backup deja el catálogo
+como estaba (a lo sumo quedan blobs huérfanos, que la recolección borra después).
+"""
+from __future__ import annotations
+
+import json
+import sqlite3
+from pathlib import Path
+from typing import Callable
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    id           INTEGER PRIMARY KEY,
+    nombre       TEXT NOT NULL UNIQUE,
+    timestamp    TEXT NOT NULL,
+    descripcion  TEXT NOT NULL DEFAULT '',
+    tipo         TEXT NOT NULL,
+    path         TEXT NOT NULL DEFAULT '',
+    archivos     INTEGER NOT NULL DEFAULT 0,
+    size_total   INTEGER NOT NULL DEFAULT 0,
+    bytes_nuevos INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_snapshots_timestamp ON snapshots (timestamp);
+CREATE TABLE IF NOT EXISTS archivos (
+    snapshot_id INTEGER NOT NULL REFERENCES snapshots (id) ON DELETE CASCADE,
+    ruta        TEXT NOT NULL,
+    hash        TEXT NOT NULL,
+    size        INTEGER NOT NULL DEFAULT 0,
+    mtime_ns    INTEGER NOT NULL DEFAULT 0,
+    mode        INTEGER NOT NULL DEFAULT 0,  -- 0: desconocido (copias antiguas)
+    PRIMARY KEY (snapshot_id, ruta)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_archivos_hash ON archivos (hash);
+CREATE TABLE IF NOT EXISTS blobs (
+    hash TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    verificado_mtime_ns INTEGER
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS verificaciones (
+    snapshot_id INTEGER PRIMARY KEY REFERENCES snapshots (id) ON DELETE CASCADE,
+    fecha       TEXT NOT NULL,
+    modo        TEXT NOT NULL,
+    ok          INTEGER NOT NULL,
+    detalle     TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS meta (
+    clave TEXT PRIMARY KEY,
+    valor TEXT
+);
+"""
+
+_COLUMNAS = ("nombre", "timestamp", "descripcion", "tipo", "path", "archivos", "size_total", "bytes_nuevos")
+
+
+class CatalogoBackups:
+    def __init__(self, ruta_db: Path | str):
+        self.ruta_db = Path(ruta_db)
+        self._conn = sqlite3.connect(str(self.ruta_db))
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(_ESQUEMA)
+        columnas = {r[1] for r in self._conn.execute("PRAGMA table_info(blobs)")}
+        if "verificado_mtime_ns" not in columnas:
+            with self._conn:
+                self._conn.execute("ALTER TABLE blobs ADD COLUMN verificado_mtime_ns INTEGER")
+        self._normalizar_copias_antiguas()
+
+    def _normalizar_copias_antiguas(self) -> None:
+        """Corrige catálogos migrados antes de normalizar en importar_json (rutas con '\\', backups/)."""
+        antiguas = "SELECT id FROM snapshots WHERE tipo NOT IN ('snapshot', 'archivo', 'enlaces')"
+        with self._conn:
+            self._conn.execute(
+                f"UPDATE OR IGNORE archivos SET ruta = REPLACE(ruta, '\\', '/')"
+                f" WHERE snapshot_id IN ({antiguas}) AND INSTR(ruta, '\\') > 0")
+            self._conn.execute(
+                f"DELETE FROM archivos WHERE snapshot_id IN ({antiguas})"
+                f" AND (INSTR(ruta, '\\') > 0 OR ruta LIKE 'backups/%')")
+
+    def cerrar(self) -> None:
+        self._conn.close()
+
+    # --- Snapshots ---
+
+    def registrar(self, info: dict, archivos: dict[str, dict], con_blobs: bool = True) -> None:
+        """Alta de un snapshot con sus archivos (y sus blobs) en una transacción."""
+        with self._conn:
+            cur = self._conn.execute(
+                f"INSERT INTO snapshots ({', '.join(_COLUMNAS)}) VALUES ({', '.join('?' * len(_COLUMNAS))})",
+                [info.get(c, "" if c in ("descripcion", "path") else 0) for c in _COLUMNAS],
+            )
+            sid = cur.lastrowid
+            self._conn.executemany(
+                "INSERT INTO archivos (snapshot_id, ruta, hash, size, mtime_ns, mode) VALUES (?, ?, ?, ?, ?, ?)",
+                ((sid, rel, a["hash"], a.get("size", 0), a.get("mtime_ns", 0), a.get("mode", 0))
+                 for rel, a in archivos.items()),
+            )
+            if con_blobs:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO blobs (hash, size) VALUES (?, ?)",
+                    ((a["hash"], a.get("size", 0)) for a in archivos.values()),
+                )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (clave, valor) VALUES ('current_backup', ?)", (info["nombre"],)
+            )
+
+    def snapshot(self, nombre: str) -> dict | None:
+        r = self._conn.execute("SELECT * FROM snapshots WHERE nombre = ?", (nombre,)).fetchone()
+        return dict(r) if r else None
+
+    def snapshots(self, desde: str | None = None, hasta: str | None = None) -> list[dict]:
+        """Snapshots del más reciente al más antiguo, opcionalmente entre dos timestamps.
+        Incluyen la última verificación guardada (ver_fecha, ver_modo, ver_ok; None si nunca)."""
+        sql = ("SELECT s.*, v.fecha AS ver_fecha, v.modo AS ver_modo, v.ok AS ver_ok FROM snapshots s"
+               " LEFT JOIN verificaciones v ON v.snapshot_id = s.id WHERE 1=1")
+        args = []
+        if desde:
+            sql += " AND s.timestamp >= ?"
+            args.append(desde)
+        if hasta:
+            sql += " AND s.timestamp < ?"
+            args.append(hasta)
+        sql += " ORDER BY s.timestamp DESC, s.id DESC"
+        return [dict(r) for r in self._conn.execute(sql, args)]
+
+    def existe(self, nombre: str) -> bool:
+        return self._conn.execute("SELECT 1 FROM snapshots WHERE nombre = ?", (nombre,)).fetchone() is not None
+
+    def actual(self) -> str | None:
+        r = self._conn.execute("SELECT valor FROM meta WHERE clave = 'current_backup'").fetchone()
+        return r[0] if r else None
+
+    def archivos(self, nombre: str) -> dict[str, dict]:
+        """{ruta: {hash, size, mtime_ns, mode}} de un snapshot."""
+        cur = self._conn.execute(
+            "SELECT a.ruta, a.hash, a.size, a.mtime_ns, a.mode FROM archivos a"
+            " JOIN snapshots s ON s.id = a.snapshot_id WHERE s.nombre = ?",
+            (nombre,),
+        )
+        return {r["ruta"]: {"hash": r["hash"], "size": r["size"], "mtime_ns": r["mtime_ns"], "mode": r["mode"]}
+                for r in cur}
+
+    def archivo(self, nombre: str, ruta: str) -> dict | None:
+        r = self._conn.execute(
+            "SELECT a.hash, a.size, a.mtime_ns, a.mode FROM archivos a"
+            " JOIN snapshots s ON s.id = a.snapshot_id WHERE s.nombre = ? AND a.ruta = ?",
+            (nombre, ruta),
+        ).fetchone()
+        return dict(r) if r else None
+
+    def eliminar(self, nombre: str) -> None:
+        """Baja del snapshot y de sus filas de archivos (los blobs se recolectan aparte)."""
+        with self._conn:
+            self._conn.execute("DELETE FROM snapshots WHERE nombre = ?", (nombre,))
+            if self.actual() == nombre:
+                r = self._conn.execute("SELECT nombre FROM snapshots ORDER BY timestamp DESC, id DESC LIMIT 1").fetchone()
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO meta (clave, valor) VALUES ('current_backup', ?)", (r[0] if r else None,)
+                )
+
+    # --- Verificación ---
+
+    def blobs_de(self, nombre: str) -> list[tuple[str, int, int | None]]:
+        """[(hash, tamaño, mtime_ns del blob en su última verificación)] de un snapshot."""
+        return [(r[0], r[1], r[2]) for r in self._conn.execute(
+            "SELECT DISTINCT b.hash, b.size, b.verificado_mtime_ns FROM archivos a"
+            " JOIN snapshots s ON s.id = a.snapshot_id JOIN blobs b ON b.hash = a.hash WHERE s.nombre = ?",
+            (nombre,),
+        )]
+
+    def marcar_blobs_verificados(self, verificados: list[tuple[str, int]]) -> None:
+        """[(hash, mtime_ns del blob)] que se acaban de rehashear sin errores."""
+        with self._conn:
+            self._conn.executemany(
+                "UPDATE blobs SET verificado_mtime_ns = ? WHERE hash = ?", ((m, h) for h, m in verificados)
+            )
+
+    def guardar_verificacion(self, nombre: str, fecha: str, modo: str, ok: bool, detalle: str = "") -> None:
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO verificaciones (snapshot_id, fecha, modo, ok, detalle)"
+                " SELECT id, ?, ?, ?, ? FROM snapshots WHERE nombre = ?",
+                (fecha, modo, int(ok), detalle, nombre),
+            )
+
+    # --- Blobs ---
+
+    def blobs_sin_referencias(self) -> list[tuple[str, int]]:
+        return [(r[0], r[1]) for r in self._conn.execute(
+            "SELECT b.hash, b.size FROM blobs b WHERE NOT EXISTS (SELECT 1 FROM archivos a WHERE a.hash = b.hash)"
+        )]
+
+    def bytes_exclusivos(self, nombres: list[str]) -> int:
+        """Bytes de blobs que solo referencian estos snapshots (lo que liberaría borrarlos)."""
+        with self._conn:
+            self._conn.execute("CREATE TEMP TABLE IF NOT EXISTS _candidatos (nombre TEXT PRIMARY KEY)")
+            self._conn.execute("DELETE FROM _candidatos")
+            self._conn.executemany("INSERT OR IGNORE INTO _candidatos (nombre) VALUES (?)", ((n,) for n in nombres))
+        r = self._conn.execute(
+            "SELECT COALESCE(SUM(b.size), 0) FROM blobs b WHERE EXISTS ("
+            "  SELECT 1 FROM archivos a JOIN snapshots s ON s.id = a.snapshot_id"
+            "  WHERE a.hash = b.hash AND s.nombre IN (SELECT nombre FROM _candidatos)"
+            ") AND NOT EXISTS ("
+            "  SELECT 1 FROM archivos a JOIN snapshots s ON s.id = a.snapshot_id"
+            "  WHERE a.hash = b.hash AND s.nombre NOT IN (SELECT nombre FROM _candidatos)"
+            ")"
+        ).fetchone()
+        return r[0]
+
+    def hashes_en_uso(self) -> set[str]:
+        return {r[0] for r in self._conn.execute("SELECT DISTINCT hash FROM archivos")}
+
+    def olvidar_blobs(self, hashes: list[str]) -> None:
+        with self._conn:
+            self._conn.executemany("DELETE FROM blobs WHERE hash = ?", ((h,) for h in hashes))
+
+    # --- Migración ---
+
+    def vacio(self) -> bool:
+        return self._conn.execute("SELECT 1 FROM snapshots LIMIT 1").fetchone() is None
+
+    def importar_json(self, metadata_file: Path, leer_manifiesto: Callable[[str], dict]) -> int:
+        """Importa backup_metadata.json (copias de directorio y snapshots con manifiesto JSON).
+        Devuelve cuántos backups se importaron."""
+        with open(metadata_file, "r", encoding="utf-8") as f:
+            metadata = json.load(f)
+        n = 0
+        for b in metadata.get("backups", []):
+            if self.existe(b["name"]):
+                continue
+            if b.get("tipo") == "snapshot":
+                try:
+                    archivos = leer_manifiesto(b["path"])["archivos"]
+                except Exception:
+                    continue
+                con_blobs = True
+            else:
+                # Copia de directorio: solo se conocen los hashes. Las rutas de Windows se pasan a
+                # '/' (si no, el rollback escribiría 'a\\b' y borraría 'a/b') y se descarta backups/,
+                # que robocopy también copiaba.
+                archivos = {}
+                for rel, h in (b.get("file_hashes") or {}).items():
+                    rel = rel.replace("\\", "/")
+                    if rel.split("/", 1)[0] == "backups":
+                        continue
+                    archivos[rel] = {"hash": h}
+                con_blobs = False
+            info = dict(b, nombre=b["name"], archivos=len(archivos))
+            self.registrar(info, archivos, con_blobs=con_blobs)
+            n += 1
+        actual = metadata.get("current_backup")
+        if actual and self.existe(actual):
+            with self._conn:
+                self._conn.execute("INSERT OR REPLACE INTO meta (clave, valor) VALUES ('current_backup', ?)", (actual,))
+        return n
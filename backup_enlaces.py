@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Snapshots con hardlinks (estilo rsync --link-dest) para backups/enlaces/<nombre>/.
+
+Cada snapshot es un directorio normal que replica el árbol y se puede navegar o copiar con
+cualquier herramienta. Los archivos cuyo contenido y modo coinciden con el snapshot anterior se
+enlazan (os.link: sin copiar datos ni ocupar espacio); solo se copian los nuevos o cambiados.
+Si el enlace no es posible (otro volumen, sistema sin hardlinks, límite de enlaces) se copia.
+
+Los archivos enlazados son el mismo inodo en todos los snapshots: no se deben editar en sitio.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import shutil
+from pathlib import Path
+
+from backup_hashing import BLOQUE
+
+
+def copiar_con_hash(origen: Path | str, destino: Path | str) -> tuple[str, int]:
+    """Copia origen a destino (con permisos y mtime) hasheando lo escrito. Devuelve (sha256, bytes)."""
+    h = hashlib.sha256()
+    escritos = 0
+    with open(origen, "rb") as fo, open(destino, "wb") as fd:
+        for bloque in iter(lambda: fo.read(BLOQUE), b""):
+            h.update(bloque)
+            fd.write(bloque)
+            escritos += len(bloque)
+    shutil.copystat(origen, destino)
+    return h.hexdigest(), escritos
+
+
+class ConstructorEnlazado:
+    """Construye un snapshot enlazando contra el anterior. Uso: agregar() por archivo y cerrar()."""
+
+    def __init__(self, destino: Path | str, anterior: Path | str | None = None, archivos_anterior: dict | None = None):
+        self.destino = Path(destino)
+        self._tmp = self.destino.with_name(self.destino.name + ".parcial")
+        if self._tmp.exists():
+            shutil.rmtree(self._tmp)
+        self._tmp.mkdir(parents=True)
+        # (hash, modo) -> archivo del snapshot anterior: también enlaza archivos movidos o duplicados
+        self._previos: dict[tuple[str, int], tuple[Path, int]] = {}
+        if anterior:
+            for rel, info in (archivos_anterior or {}).items():
+                self._previos.setdefault((info["hash"], info.get("mode", 0)), (Path(anterior) / rel, info["size"]))
+        self.enlazados = self.copiados = self.bytes_copiados = 0
+
+    def agregar(self, rel: str, origen: Path, st: os.stat_result, digest: str) -> dict:
+        """Enlaza o copia un archivo. Devuelve su entrada para el catálogo."""
+        destino = self._tmp / rel
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        mode = st.st_mode & 0o777
+        previo = self._previos.get((digest, mode))
+        if previo:
+            ruta_previa, size = previo
+            try:
+                # Un snapshot editado a mano no debe propagarse: al menos el tamaño tiene que cuadrar
+                if ruta_previa.stat().st_size == size:
+                    os.link(ruta_previa, destino)
+                    self.enlazados += 1
+                    return {"hash": digest, "size": size, "mtime_ns": st.st_mtime_ns, "mode": mode}
+            except OSError:
+                pass
+        real, escritos = copiar_con_hash(origen, destino)
+        self.copiados += 1
+        self.bytes_copiados += escritos
+        # Se registra lo que realmente quedó copiado aunque el archivo cambiara tras hashearlo
+        self._previos.setdefault((real, mode), (destino, escritos))
+        return {"hash": real, "size": escritos, "mtime_ns": st.st_mtime_ns, "mode": mode}
+
+    def cerrar(self) -> None:
+        os.replace(self._tmp, self.destino)
+
+    def abortar(self) -> None:
+        shutil.rmtree(self._tmp, ignore_errors=True)
+
+
+def bytes_exclusivos(directorios: list[Path | str]) -> int:
+    """Bytes que liberaría borrar estos directorios juntos: inodos cuyos enlaces están todos dentro."""
+    vistos: dict[tuple[int, int], list[int]] = {}  # (dev, inodo) -> [enlaces dentro, st_nlink, tamaño]
+    for directorio in directorios:
+        for base, _, archivos in os.walk(directorio):
+            for nombre in archivos:
+                try:
+                    st = os.lstat(os.path.join(base, nombre))
+                except OSError:
+                    continue
+                v = vistos.setdefault((st.st_dev, st.st_ino), [0, st.st_nlink, st.st_size])
+                v[0] += 1
+    return sum(size for dentro, nlink, size in vistos.values() if dentro >= nlink)
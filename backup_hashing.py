@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Motor de hashing de los backups: lectura por bloques, en paralelo y con índice persistente.
+
+- hash_archivo lee por bloques (memoria constante) con hashlib.file_digest si está disponible.
+- MotorHash reparte los archivos en un ThreadPoolExecutor (hashlib libera el GIL al procesar
+  bloques grandes, así que los hilos hashean de verdad en paralelo).
+- IndiceHashes guarda (ruta, tamaño, mtime_ns, inodo) -> sha256 en SQLite: un archivo que no
+  cambió nunca se vuelve a hashear.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable
+
+BLOQUE = 1024 * 1024
+WORKERS = min(8, os.cpu_count() or 4)
+
+
+def hash_archivo(ruta: Path | str) -> str:
+    """SHA-256 leyendo por bloques de BLOQUE bytes."""
+    with open(ruta, "rb") as f:
+        if hasattr(hashlib, "file_digest"):
+            return hashlib.file_digest(f, "sha256").hexdigest()
+        h = hashlib.sha256()
+        for bloque in iter(lambda: f.read(BLOQUE), b""):
+            h.update(bloque)
+        return h.hexdigest()
+
+
+class IndiceHashes:
+    """Índice persistente (ruta, tamaño, mtime_ns, inodo) -> digest.
+
+    Se carga entero al abrir y los cambios se escriben en una sola transacción con guardar().
+    No es seguro entre hilos: se consulta y actualiza desde el hilo que orquesta el hashing.
+    """
+
+    def __init__(self, ruta_db: Path | str):
+        self.ruta_db = Path(ruta_db)
+        self._conn = sqlite3.connect(str(self.ruta_db))
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS indice ("
+            " ruta TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, inodo INTEGER, digest TEXT)"
+        )
+        self._entradas = {
+            ruta: (size, mtime_ns, inodo, digest)
+            for ruta, size, mtime_ns, inodo, digest in self._conn.execute("SELECT * FROM indice")
+        }
+        self._pendientes: dict[str, tuple[int, int, int, str]] = {}
+
+    def buscar(self, ruta: str, st: os.stat_result) -> str | None:
+        e = self._entradas.get(ruta)
+        if e and e[0] == st.st_size and e[1] == st.st_mtime_ns and e[2] == st.st_ino:
+            return e[3]
+        return None
+
+    def actualizar(self, ruta: str, st: os.stat_result, digest: str) -> None:
+        e = (st.st_size, st.st_mtime_ns, st.st_ino, digest)
+        self._entradas[ruta] = e
+        self._pendientes[ruta] = e
+
+    def podar(self, vivas: set[str]) -> int:
+        """Quita del índice las rutas que ya no existen. Devuelve cuántas."""
+        muertas = [r for r in self._entradas if r not in vivas]
+        for r in muertas:
+            del self._entradas[r]
+            self._pendientes.pop(r, None)
+        if muertas:
+            with self._conn:
+                self._conn.executemany("DELETE FROM indice WHERE ruta = ?", [(r,) for r in muertas])
+        return len(muertas)
+
+    def guardar(self) -> None:
+        if not self._pendientes:
+            return
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO indice (ruta, size, mtime_ns, inodo, digest) VALUES (?, ?, ?, ?, ?)",
+                [(r, *e) for r, e in self._pendientes.items()],
+            )
+        self._pendientes.clear()
+
+    def cerrar(self) -> None:
+        self.guardar()
+        self._conn.close()
+
+
+class MotorHash:
+    """Hashea lotes de archivos en paralelo consultando antes el índice."""
+
+    def __init__(self, indice: IndiceHashes | None = None, workers: int = WORKERS):
+        self.indice = indice
+        self.workers = max(1, workers)
+        self.aciertos = 0
+        self.hasheados = 0
+        self.bytes_hasheados = 0
+
+    @staticmethod
+    def _hash_seguro(ruta: Path) -> str | None:
+        try:
+            return hash_archivo(ruta)
+        except OSError:
+            return None
+
+    def hashear(self, archivos: Iterable[tuple[str, Path, os.stat_result]]) -> dict[str, str]:
+        """{ruta relativa: digest} para (rel, ruta, stat). Los ilegibles se omiten."""
+        resultado: dict[str, str] = {}
+        faltan: list[tuple[str, Path, os.stat_result]] = []
+        for rel, ruta, st in archivos:
+            digest = self.indice.buscar(rel, st) if self.indice else None
+            if digest:
+                resultado[rel] = digest
+                self.aciertos += 1
+            else:
+                faltan.append((rel, ruta, st))
+        if faltan:
+            # Los grandes primero para que no queden solos al final del lote
+            faltan.sort(key=lambda t: t[2].st_size, reverse=True)
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="hash") as pool:
+                for (rel, _ruta, st), digest in zip(faltan, pool.map(self._hash_seguro, [t[1] for t in faltan])):
+                    if digest is None:
+                        continue
+                    resultado[rel] = digest
+                    self.hasheados += 1
+                    self.bytes_hasheados += st.st_size
+                    if self.indice:
+                        self.indice.actualizar(rel, st, digest)
+        if self.indice:
+            self.indice.guardar()
+        return resultado
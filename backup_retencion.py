@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Retención generacional (GFS) de backups: cuartos de hora, horarios, diarios, semanales y mensuales.
+
+Por cada nivel se conserva el backup más reciente de cada uno de los N últimos periodos con
+backups (N cuartos de hora, N horas, N días, N semanas ISO, N meses). Un backup se conserva si
+algún nivel lo reclama; el más reciente se conserva siempre, y también todo lo que tenga menos
+de `gracia_min` minutos (los snapshots finos del vigilante no se podan recién hechos). Con
+8/24/7/4/12 se guardan como mucho ~55 puntos de restauración que cubren un año, en lugar de 168
+copias horarias de una semana.
+
+Los nombres de `protegidos` (pre-rollback, manuales) nunca se proponen para borrar.
+
+Configurable con BACKUP_RETENCION="horarios,diarios,semanales,mensuales[,cuartos]" (p. ej.
+"24,7,4,12,8") y BACKUP_RETENCION_GRACIA_MIN (60).
+"""
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Iterable
+
+FORMATO_TIMESTAMP = "%Y%m%d_%H%M%S"
+
+# nivel -> clave del periodo al que pertenece un instante
+PERIODOS: dict[str, Callable[[datetime], tuple]] = {
+    "cuartos": lambda t: (t.year, t.month, t.day, t.hour, t.minute // 15),
+    "horarios": lambda t: (t.year, t.month, t.day, t.hour),
+    "diarios": lambda t: (t.year, t.month, t.day),
+    "semanales": lambda t: tuple(t.isocalendar()[:2]),
+    "mensuales": lambda t: (t.year, t.month),
+}
+
+
+@dataclass
+class PoliticaRetencion:
+    horarios: int = 24
+    diarios: int = 7
+    semanales: int = 4
+    mensuales: int = 12
+    cuartos: int = 8
+    gracia_min: float = 60.0
+
+    @classmethod
+    def desde_env(cls) -> "PoliticaRetencion":
+        politica = cls()
+        try:
+            politica.gracia_min = max(0.0, float(os.environ.get("BACKUP_RETENCION_GRACIA_MIN", politica.gracia_min)))
+        except ValueError:
+            pass
+        valor = os.environ.get("BACKUP_RETENCION", "").strip()
+        if not valor:
+            return politica
+        try:
+            return cls(*(max(0, int(x)) for x in valor.split(",")[:5]), gracia_min=politica.gracia_min)
+        except ValueError:
+            return politica
+
+    def __str__(self) -> str:
+        return f"{self.cuartos}c/{self.horarios}h/{self.diarios}d/{self.semanales}s/{self.mensuales}m"
+
+
+def seleccionar(backups: list[tuple[str, str]], politica: PoliticaRetencion, protegidos: Iterable[str] = (),
+                ahora: datetime | None = None) -> tuple[dict[str, list[str]], list[str]]:
+    """backups: [(nombre, timestamp)]. Devuelve ({conservado: [niveles que lo reclaman]}, [a borrar])."""
+    protegidos = set(protegidos)
+    limite_gracia = (ahora or datetime.now()) - timedelta(minutes=politica.gracia_min)
+    conservar: dict[str, list[str]] = {}
+    ordenados = []
+    for nombre, ts in backups:
+        t = datetime.strptime(ts[:15], FORMATO_TIMESTAMP)
+        if nombre in protegidos:
+            conservar[nombre] = ["protegido"]
+        else:
+            ordenados.append((nombre, t))
+    ordenados.sort(key=lambda b: b[1], reverse=True)
+    if ordenados:
+        conservar[ordenados[0][0]] = ["último"]
+    for nombre, t in ordenados:
+        if t > limite_gracia:
+            conservar.setdefault(nombre, []).append("reciente")
+    for nivel, clave in PERIODOS.items():
+        cupo = getattr(politica, nivel)
+        vistos = set()
+        for nombre, t in ordenados:
+            if len(vistos) >= cupo:
+                break
+            periodo = clave(t)
+            if periodo in vistos:
+                continue
+            # El primero (más reciente) de cada periodo representa al periodo
+            vistos.add(periodo)
+            conservar.setdefault(nombre, []).append(nivel)
+    borrar = [nombre for nombre, _ in ordenados if nombre not in conservar]
+    return conservar, borrar
@@ -2,124 +2,290 @@
 """
 Sistema de Backup y Rollback Automático - Rauli-Bot v5.0
 Implementa backup incremental y rollback con verificación de integridad
+
+Los snapshots se guardan en un almacén de blobs direccionado por contenido (backup_almacen.py):
+cada snapshot es un manifiesto que apunta a blobs, así que los archivos sin cambios no ocupan disco
+y el tiempo de un snapshot depende de lo que cambió, no del tamaño del árbol.
+Los manifiestos y la lista de backups viven en el catálogo SQLite backups/catalogo.db
+(backup_catalogo.py); backup_metadata.json se importa una vez y se renombra a .migrado.
+El rollback compara el árbol con el backup y solo escribe, borra o mueve lo que difiere
+(temporal + rename por archivo); con dry_run=True solo muestra los cambios.
+Opcionalmente un backup puede ser un único .tar comprimido por archivo con índice
+(backup_archivo.py): se restaura, verifica y extrae directamente del archivo.
+Los snapshots enlazados (backup_enlaces.py) son directorios navegables en backups/enlaces/ que
+enlazan con hardlinks lo que no cambió desde el anterior.
+El modo automático vigila el árbol (backup_vigilante.py) y solo hace snapshot cuando hay cambios.
 """
 
 import os
-import json
+import random
 import shutil
-import hashlib
-import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 from dotenv import load_dotenv
 
+from backup_almacen import EXCLUIR, AlmacenBlobs, leer_manifiesto, recorrer
+from backup_archivo import EscritorArchivo, LectorArchivo, ruta_indice
+from backup_catalogo import CatalogoBackups
+from backup_enlaces import ConstructorEnlazado, bytes_exclusivos
+from backup_hashing import WORKERS, IndiceHashes, MotorHash, hash_archivo
+from backup_retencion import PoliticaRetencion, seleccionar
+
 # Cargar credenciales desde la Bóveda
 load_dotenv('C:/dev/credenciales.txt')
 
+# Descripciones de los snapshots automáticos: los únicos que poda la retención
+DESCRIPCIONES_AUTOMATICAS = ('vigilante_', 'backup_programado')
+
 class BackupRollbackManager:
-    def __init__(self):
-        self.backup_dir = Path('./backups')
+    def __init__(self, raiz='.', backup_dir=None):
+        self.raiz = Path(raiz)
+        self.backup_dir = Path(backup_dir) if backup_dir else self.raiz / 'backups'
         self.backup_dir.mkdir(exist_ok=True)
         self.metadata_file = self.backup_dir / 'backup_metadata.json'
+        self.almacen = AlmacenBlobs(self.backup_dir)
+        self.catalogo = CatalogoBackups(self.backup_dir / 'catalogo.db')
+        # (ruta, tamaño, mtime_ns, inodo) -> sha256: lo que no cambió no se vuelve a leer
+        self.indice_hashes = IndiceHashes(self.backup_dir / 'indice_hashes.db')
         self.telegram_token = os.getenv('TELEGRAM_TOKEN')
         self.telegram_chat_id = os.getenv('TELEGRAM_ADMIN_CHAT_ID')
-        self.load_metadata()
-        
-    def load_metadata(self):
-        """Carga metadatos de backups existentes"""
-        try:
-            if self.metadata_file.exists():
-                with open(self.metadata_file, 'r') as f:
-                    self.metadata = json.load(f)
-            else:
-                self.metadata = {'backups': [], 'current_backup': None}
-        except Exception as e:
-            print(f"Error cargando metadatos: {e}")
-            self.metadata = {'backups': [], 'current_backup': None}
-            
-    def save_metadata(self):
-        """Guarda metadatos de backups"""
+        self.migrar_metadata()
+
+    def migrar_metadata(self):
+        """Importa backup_metadata.json al catálogo (una sola vez)"""
+        if not self.metadata_file.exists():
+            return
         try:
-            with open(self.metadata_file, 'w') as f:
-                json.dump(self.metadata, f, indent=2)
+            n = self.catalogo.importar_json(self.metadata_file, leer_manifiesto)
+            self.metadata_file.rename(self.metadata_file.with_name(self.metadata_file.name + '.migrado'))
+            # Los manifiestos JSON ya están en el catálogo
+            snapshots_dir = self.backup_dir / 'snapshots'
+            if snapshots_dir.exists():
+                for manifiesto in snapshots_dir.glob('*.json'):
+                    if self.catalogo.existe(manifiesto.stem):
+                        manifiesto.unlink()
+            print(f"📦 {n} backups migrados de backup_metadata.json al catálogo")
         except Exception as e:
-            print(f"Error guardando metadatos: {e}")
-            
+            print(f"Error migrando metadatos: {e}")
+
     def notificar_telegram(self, mensaje):
         """Envía notificación a Telegram"""
+        if not self.telegram_token or not self.telegram_chat_id:
+            return
         try:
-            import requests
-            url = f"https://api.telegram.org/bot{self.telegram_token}/sendMessage"
-            data = {
-                'chat_id': self.telegram_chat_id,
-                'text': f"💾 Rauli-Bot Backup: {mensaje}"
-            }
-            requests.post(url, data=data, timeout=10)
+            from telegram_entrega import entrega_sync
+            # Sin esperar: la cola compartida agrupa avisos seguidos y los entrega al salir
+            entrega_sync(self.telegram_token).enviar_texto(
+                self.telegram_chat_id, f"💾 Rauli-Bot Backup: {mensaje}", esperar=False
+            )
         except Exception as e:
             print(f"📱 Error Telegram: {e}")
-            
+
     def calcular_hash_archivo(self, filepath):
         """Calcula hash SHA256 para verificación de integridad"""
         try:
-            with open(filepath, 'rb') as f:
-                return hashlib.sha256(f.read()).hexdigest()
+            return hash_archivo(filepath)
         except Exception:
             return None
-            
+
     def crear_backup_completo(self, descripcion=""):
-        """Crea backup completo con verificación de integridad"""
+        """Crea un snapshot: manifiesto + blobs nuevos (solo se copian los contenidos que no estaban)"""
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         backup_name = f"backup_completo_{timestamp}"
-        backup_path = self.backup_dir / backup_name
-        
+        n = 1
+        while self.catalogo.existe(backup_name):
+            n += 1
+            backup_name = f"backup_completo_{timestamp}_{n}"
+
         try:
-            print(f"💾 Creando backup completo: {backup_name}")
-            
-            # Crear backup usando robocopy (Windows) o rsync (Linux/Mac)
-            if os.name == 'nt':  # Windows
-                result = subprocess.run([
-                    'robocopy', '.', str(backup_path), 
-                    '/E', '/NFL', '/NDL', '/NJH', '/NJS',
-                    '/XD', '.git', '__pycache__', 'node_modules', '.venv'
-                ], capture_output=True)
-            else:  # Linux/Mac
-                shutil.copytree('.', backup_path, 
-                              ignore=shutil.ignore_patterns('.git', '__pycache__', 'node_modules', '.venv'))
-            
-            # Calcular hashes para verificación
-            file_hashes = {}
-            for root, dirs, files in os.walk(backup_path):
-                for file in files:
-                    filepath = Path(root) / file
-                    file_hash = self.calcular_hash_archivo(filepath)
-                    if file_hash:
-                        relative_path = str(filepath.relative_to(backup_path))
-                        file_hashes[relative_path] = file_hash
-            
-            # Guardar metadatos del backup
-            backup_info = {
-                'name': backup_name,
+            print(f"💾 Creando snapshot: {backup_name}")
+
+            # Hashing en paralelo; el índice evita releer los archivos sin cambios
+            excluir = EXCLUIR | {self.backup_dir.name}
+            entradas = list(recorrer(self.raiz, excluir))
+            motor = MotorHash(self.indice_hashes)
+            digests = motor.hashear(entradas)
+            self.indice_hashes.podar({rel for rel, _, _ in entradas})
+
+            archivos = {}
+            size_total = bytes_nuevos = 0
+            for rel, filepath, st in entradas:
+                digest = digests.get(rel)
+                if not digest:
+                    continue
+                size = st.st_size
+                if not self.almacen.existe(digest):
+                    try:
+                        real, escritos = self.almacen.guardar(filepath)
+                    except OSError as e:
+                        print(f"⚠️ Omitido {rel}: {e}")
+                        continue
+                    bytes_nuevos += escritos
+                    if real != digest:
+                        # Cambió tras hashearlo: se registra lo que realmente quedó copiado
+                        digest, size = real, self.almacen.ruta(real).stat().st_size
+                archivos[rel] = {
+                    'hash': digest,
+                    'size': size,
+                    'mtime_ns': st.st_mtime_ns,
+                    'mode': st.st_mode & 0o777,
+                }
+                size_total += size
+
+            # Manifiesto y metadatos en una transacción del catálogo
+            self.catalogo.registrar({
+                'nombre': backup_name,
                 'timestamp': timestamp,
                 'descripcion': descripcion,
-                'tipo': 'completo',
-                'path': str(backup_path),
-                'file_hashes': file_hashes,
-                'size_total': self.calcular_tamano(backup_path)
-            }
-            
-            self.metadata['backups'].append(backup_info)
-            self.metadata['current_backup'] = backup_name
-            self.save_metadata()
-            
-            print(f"✅ Backup completado: {backup_name}")
+                'tipo': 'snapshot',
+                'archivos': len(archivos),
+                'size_total': size_total,
+                'bytes_nuevos': bytes_nuevos,
+            }, archivos)
+
+            print(f"✅ Backup completado: {backup_name} ({len(archivos)} archivos, {bytes_nuevos / (1024 * 1024):.2f} MB nuevos, "
+                  f"{motor.hasheados} hasheados / {motor.aciertos} del índice)")
             self.notificar_telegram(f"✅ Backup completo creado: {backup_name}")
-            return backup_path
-            
+            return backup_name
+
+        except Exception as e:
+            print(f"❌ Error creando backup: {e}")
+            self.notificar_telegram(f"❌ Error en backup: {e}")
+            return None
+
+    def crear_backup_empaquetado(self, descripcion="", codec=None):
+        """Crea un backup como un único .tar comprimido por archivo (una pasada, sin copia temporal)"""
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        backup_name = f"backup_empaquetado_{timestamp}"
+        n = 1
+        while self.catalogo.existe(backup_name):
+            n += 1
+            backup_name = f"backup_empaquetado_{timestamp}_{n}"
+        archivos_dir = self.backup_dir / 'archivos'
+        archivos_dir.mkdir(exist_ok=True)
+        ruta_tar = archivos_dir / f"{backup_name}.tar"
+
+        try:
+            print(f"📦 Creando backup empaquetado: {backup_name}")
+            entradas = list(recorrer(self.raiz, EXCLUIR | {self.backup_dir.name}))
+            archivos = {}
+            with EscritorArchivo(ruta_tar, codec) as escritor:
+                for rel, filepath, st in entradas:
+                    try:
+                        e = escritor.agregar(rel, filepath, st)
+                    except OSError as ex:
+                        print(f"⚠️ Omitido {rel}: {ex}")
+                        continue
+                    archivos[rel] = {'hash': e['hash'], 'size': e['size'], 'mtime_ns': e['mtime_ns'], 'mode': e['mode']}
+                    # El hash sale gratis al comprimir: se aprovecha para el índice
+                    self.indice_hashes.actualizar(rel, st, e['hash'])
+            self.indice_hashes.podar({rel for rel, _, _ in entradas})
+            self.indice_hashes.guardar()
+
+            size_total = sum(a['size'] for a in archivos.values())
+            self.catalogo.registrar({
+                'nombre': backup_name,
+                'timestamp': timestamp,
+                'descripcion': descripcion,
+                'tipo': 'archivo',
+                'path': str(ruta_tar),
+                'archivos': len(archivos),
+                'size_total': size_total,
+                'bytes_nuevos': escritor.bytes_comprimidos,
+            }, archivos, con_blobs=False)
+
+            ratio = size_total / escritor.bytes_comprimidos if escritor.bytes_comprimidos else 0
+            print(f"✅ Backup empaquetado: {backup_name} ({len(archivos)} archivos, {escritor.codec}, "
+                  f"{escritor.bytes_comprimidos / (1024 * 1024):.2f} MB, x{ratio:.1f})")
+            self.notificar_telegram(f"✅ Backup empaquetado creado: {backup_name}")
+            return backup_name
+
+        except Exception as e:
+            print(f"❌ Error creando backup: {e}")
+            self.notificar_telegram(f"❌ Error en backup: {e}")
+            return None
+
+    def crear_backup_enlazado(self, descripcion=""):
+        """Crea un snapshot navegable en backups/enlaces/<nombre>/ (backup_enlaces.py): lo que no
+        cambió desde el snapshot enlazado anterior se enlaza con hardlinks, solo se copia lo nuevo"""
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        backup_name = f"backup_enlaces_{timestamp}"
+        n = 1
+        while self.catalogo.existe(backup_name):
+            n += 1
+            backup_name = f"backup_enlaces_{timestamp}_{n}"
+        enlaces_dir = self.backup_dir / 'enlaces'
+        anterior = next((b for b in self.catalogo.snapshots()
+                         if b['tipo'] == 'enlaces' and Path(b['path']).is_dir()), None)
+
+        try:
+            print(f"🔗 Creando snapshot enlazado: {backup_name}")
+            # Mismo recorrido + hashing con índice que crear_backup_completo
+            entradas = list(recorrer(self.raiz, EXCLUIR | {self.backup_dir.name}))
+            motor = MotorHash(self.indice_hashes)
+            digests = motor.hashear(entradas)
+            self.indice_hashes.podar({rel for rel, _, _ in entradas})
+
+            constructor = ConstructorEnlazado(
+                enlaces_dir / backup_name,
+                anterior['path'] if anterior else None,
+                self.catalogo.archivos(anterior['nombre']) if anterior else None,
+            )
+            archivos = {}
+            try:
+                for rel, filepath, st in entradas:
+                    digest = digests.get(rel)
+                    if not digest:
+                        continue
+                    try:
+                        archivos[rel] = constructor.agregar(rel, filepath, st, digest)
+                    except OSError as e:
+                        print(f"⚠️ Omitido {rel}: {e}")
+                constructor.cerrar()
+            except BaseException:
+                constructor.abortar()
+                raise
+
+            self.catalogo.registrar({
+                'nombre': backup_name,
+                'timestamp': timestamp,
+                'descripcion': descripcion,
+                'tipo': 'enlaces',
+                'path': str(enlaces_dir / backup_name),
+                'archivos': len(archivos),
+                'size_total': sum(a['size'] for a in archivos.values()),
+                'bytes_nuevos': constructor.bytes_copiados,
+            }, archivos, con_blobs=False)
+
+            print(f"✅ Snapshot enlazado: {backup_name} ({constructor.enlazados} enlazados, {constructor.copiados} copiados, "
+                  f"{constructor.bytes_copiados / (1024 * 1024):.2f} MB nuevos)")
+            self.notificar_telegram(f"✅ Snapshot enlazado creado: {backup_name}")
+            return backup_name
+
         except Exception as e:
             print(f"❌ Error creando backup: {e}")
             self.notificar_telegram(f"❌ Error en backup: {e}")
             return None
-            
+
+    def extraer_archivo(self, backup_name, rel, destino=None):
+        """Saca un único archivo de un backup (por defecto a su ruta en el árbol)"""
+        backup_info = self.catalogo.snapshot(backup_name)
+        info = self.catalogo.archivo(backup_name, rel)
+        if not backup_info or not info:
+            print(f"❌ {rel} no está en {backup_name}")
+            return False
+        destino = Path(destino) if destino else self.raiz / rel
+        if backup_info['tipo'] == 'snapshot':
+            self.almacen.restaurar(info['hash'], destino)
+        elif backup_info['tipo'] == 'archivo':
+            LectorArchivo(backup_info['path']).extraer(rel, destino)
+        else:
+            destino.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(Path(backup_info['path']) / rel, destino)
+        print(f"✅ {rel} extraído de {backup_name} -> {destino}")
+        return True
+
     def calcular_tamano(self, path):
         """Calcula tamaño total de directorio en bytes"""
         total_size = 0
@@ -132,134 +298,400 @@ class BackupRollbackManager:
         except Exception:
             pass
         return total_size
-        
-    def verificar_integridad_backup(self, backup_name):
-        """Verifica integridad de un backup usando hashes"""
-        backup_info = next((b for b in self.metadata['backups'] if b['name'] == backup_name), None)
-        if not backup_info:
-            return False
-            
-        backup_path = Path(backup_info['path'])
-        if not backup_path.exists():
+
+    def _disponible(self, backup_info):
+        """Los snapshots viven en el almacén; las copias antiguas necesitan su directorio"""
+        return backup_info['tipo'] == 'snapshot' or Path(backup_info['path']).exists()
+
+    MODOS_VERIFICACION = ('completo', 'cambios', 'muestra')
+
+    def verificar_integridad_backup(self, backup_name, modo='completo', muestra=0.05):
+        """Verifica integridad de un backup usando hashes (en paralelo) y guarda el resultado
+
+        modo 'completo' rehashea todo; 'cambios' solo los blobs cuyo mtime cambió desde su última
+        verificación o que nunca se verificaron; 'muestra' una fracción aleatoria (mínimo 20)"""
+        backup_info = self.catalogo.snapshot(backup_name)
+        if not backup_info or not self._disponible(backup_info):
             return False
-            
-        print(f"🔍 Verificando integridad de {backup_name}...")
-        
+        if modo not in self.MODOS_VERIFICACION:
+            raise ValueError(f"Modo de verificación desconocido: {modo}")
+
+        print(f"🔍 Verificando integridad de {backup_name} ({modo})...")
         try:
-            for relative_path, expected_hash in backup_info['file_hashes'].items():
-                filepath = backup_path / relative_path
-                if not filepath.exists():
-                    print(f"❌ Archivo faltante: {relative_path}")
-                    return False
-                    
-                actual_hash = self.calcular_hash_archivo(filepath)
-                if actual_hash != expected_hash:
-                    print(f"❌ Hash inválido: {relative_path}")
-                    return False
-                    
-            print(f"✅ Integridad verificada: {backup_name}")
-            return True
-            
+            if backup_info['tipo'] == 'snapshot':
+                ok, detalle = self._verificar_snapshot(backup_name, modo, muestra)
+            elif backup_info['tipo'] == 'archivo':
+                ok, detalle = self._verificar_empaquetado(backup_info, modo, muestra)
+            else:
+                ok, detalle = self._verificar_copia(backup_info, modo, muestra)
         except Exception as e:
-            print(f"Error en verificación: {e}")
-            return False
-            
-    def hacer_rollback(self, backup_name=None):
-        """Realiza rollback a un backup específico"""
+            ok, detalle = False, f"Error en verificación: {e}"
+
+        self.catalogo.guardar_verificacion(backup_name, datetime.now().strftime("%Y%m%d_%H%M%S"), modo, ok, detalle)
+        if ok:
+            print(f"✅ Integridad verificada: {backup_name} ({detalle})")
+        else:
+            print(f"❌ {detalle}")
+        return ok
+
+    def verificar_todos(self, modo='cambios', muestra=0.05):
+        """Verifica todos los backups; devuelve {nombre: ok}"""
+        return {b['nombre']: self.verificar_integridad_backup(b['nombre'], modo, muestra)
+                for b in self.catalogo.snapshots()}
+
+    @staticmethod
+    def _muestrear(items, muestra):
+        k = min(len(items), max(20, int(len(items) * muestra)))
+        return random.sample(items, k)
+
+    def _verificar_blobs(self, digests):
+        """Rehashea los blobs en paralelo y marca los buenos como verificados. Devuelve los inválidos"""
+        digests = list(digests)
+        with ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="verificar") as pool:
+            resultados = list(pool.map(self.almacen.verificar, digests))
+        buenos = []
+        for digest, ok in zip(digests, resultados):
+            if ok:
+                try:
+                    buenos.append((digest, self.almacen.ruta(digest).stat().st_mtime_ns))
+                except OSError:
+                    pass
+        self.catalogo.marcar_blobs_verificados(buenos)
+        return [d for d, ok in zip(digests, resultados) if not ok]
+
+    def _verificar_snapshot(self, backup_name, modo, muestra):
+        """Cada blob referenciado existe y conserva su hash. Devuelve (ok, detalle)"""
+        blobs = self.catalogo.blobs_de(backup_name)
+        faltan, pendientes = [], []
+        for digest, size, verificado_mtime_ns in blobs:
+            try:
+                st = self.almacen.ruta(digest).stat()
+            except OSError:
+                faltan.append(digest)
+                continue
+            # En modo cambios se salta lo ya verificado si el blob no se ha tocado desde entonces
+            if modo == 'cambios' and verificado_mtime_ns == st.st_mtime_ns and st.st_size == size:
+                continue
+            pendientes.append(digest)
+        if faltan:
+            return False, f"{len(faltan)} blobs faltantes en {backup_name} (p. ej. {faltan[0][:12]})"
+        if modo == 'muestra':
+            pendientes = self._muestrear(pendientes, muestra)
+        malos = self._verificar_blobs(pendientes)
+        if malos:
+            return False, f"{len(malos)} blobs con hash inválido en {backup_name} (p. ej. {malos[0][:12]})"
+        return True, f"{len(pendientes)}/{len(blobs)} blobs rehasheados"
+
+    def _verificar_empaquetado(self, backup_info, modo, muestra):
+        """Backups .tar: descomprime y rehashea cada miembro leyendo por offset (modo cambios = completo)"""
+        lector = LectorArchivo(backup_info['path'])
+        rels = list(lector.indice)
+        if modo == 'muestra':
+            rels = self._muestrear(rels, muestra)
+        with ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="verificar") as pool:
+            resultados = list(pool.map(lector.verificar, rels))
+        malos = [rel for rel, ok in zip(rels, resultados) if not ok]
+        if malos:
+            return False, f"{len(malos)} archivos dañados en {backup_info['nombre']} (p. ej. {malos[0]})"
+        return True, f"{len(rels)}/{len(lector.indice)} archivos rehasheados"
+
+    def _verificar_copia(self, backup_info, modo, muestra):
+        """Copias de directorio antiguas: rehashea sus archivos (modo cambios = completo)"""
+        backup_path = Path(backup_info['path'])
+        items = list(self.catalogo.archivos(backup_info['nombre']).items())
+        if modo == 'muestra':
+            items = self._muestrear(items, muestra)
+        with ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="verificar") as pool:
+            hashes = list(pool.map(lambda it: self.calcular_hash_archivo(backup_path / it[0]), items))
+        for (rel, info), actual_hash in zip(items, hashes):
+            if actual_hash is None:
+                return False, f"Archivo faltante: {rel}"
+            if actual_hash != info['hash']:
+                return False, f"Hash inválido: {rel}"
+        return True, f"{len(items)} archivos rehasheados"
+
+    # Rutas que un rollback nunca borra (sí se restauran si están en el backup)
+    PROTEGIDOS = ('.windsurfrules',)
+
+    def _estado_actual(self):
+        """{ruta: (hash, modo)} del árbol de trabajo (vía índice de hashes)"""
+        entradas = list(recorrer(self.raiz, EXCLUIR | {self.backup_dir.name}))
+        digests = MotorHash(self.indice_hashes).hashear(entradas)
+        return {rel: (digests[rel], st.st_mode & 0o777) for rel, _, st in entradas if rel in digests}
+
+    def plan_rollback(self, backup_name):
+        """Cambios para dejar el árbol como el backup: escribir, borrar, renombrar, permisos"""
+        objetivo = self.catalogo.archivos(backup_name)
+        actual = self._estado_actual()
+        escribir = sorted(rel for rel, info in objetivo.items() if actual.get(rel, (None,))[0] != info['hash'])
+        borrar = sorted(rel for rel in actual if rel not in objetivo and rel not in self.PROTEGIDOS)
+        permisos = sorted(
+            rel for rel, info in objetivo.items()
+            if rel in actual and actual[rel][0] == info['hash'] and info.get('mode') and actual[rel][1] != info['mode']
+        )
+        # Un archivo que sobra con el contenido que falta en otra ruta se mueve en lugar de copiarse
+        sobrantes = {}
+        for rel in borrar:
+            sobrantes.setdefault(actual[rel][0], []).append(rel)
+        renombrar = []
+        for rel in list(escribir):
+            candidatos = sobrantes.get(objetivo[rel]['hash'])
+            if candidatos:
+                origen = candidatos.pop()
+                renombrar.append((origen, rel))
+                escribir.remove(rel)
+                borrar.remove(origen)
+        return {'escribir': escribir, 'borrar': borrar, 'renombrar': renombrar, 'permisos': permisos}
+
+    def _imprimir_plan(self, plan):
+        for origen, destino in plan['renombrar']:
+            print(f"   ↪ {origen} -> {destino}")
+        for rel in plan['escribir']:
+            print(f"   ✏️ {rel}")
+        for rel in plan['borrar']:
+            print(f"   🗑️ {rel}")
+        for rel in plan['permisos']:
+            print(f"   🔐 {rel}")
+        print(f"   {len(plan['escribir'])} a escribir, {len(plan['borrar'])} a borrar, "
+              f"{len(plan['renombrar'])} a renombrar, {len(plan['permisos'])} permisos")
+
+    def _preparar_destino(self, destino):
+        """Quita lo que impida crear destino: un directorio en su lugar o un archivo en su ruta"""
+        if destino.is_dir() and not destino.is_symlink():
+            shutil.rmtree(destino)
+        padre = destino.parent
+        while padre != self.raiz and self.raiz in padre.parents:
+            if padre.is_file() or padre.is_symlink():
+                padre.unlink()
+                break
+            padre = padre.parent
+
+    def _aplicar_plan(self, backup_name, backup_info, plan):
+        """Aplica el plan con escrituras atómicas (temporal + rename), sin vaciar el árbol"""
+        objetivo = self.catalogo.archivos(backup_name)
+        backup_path = Path(backup_info['path'])
+        lector = LectorArchivo(backup_path) if backup_info['tipo'] == 'archivo' else None
+        for origen, rel in plan['renombrar']:
+            destino = self.raiz / rel
+            self._preparar_destino(destino)
+            destino.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(self.raiz / origen, destino)
+        for rel in plan['escribir']:
+            info = objetivo[rel]
+            destino = self.raiz / rel
+            self._preparar_destino(destino)
+            if backup_info['tipo'] == 'snapshot':
+                self.almacen.restaurar(info['hash'], destino)
+                os.utime(destino, ns=(info['mtime_ns'], info['mtime_ns']))
+            elif lector:
+                lector.extraer(rel, destino)
+                os.utime(destino, ns=(info['mtime_ns'], info['mtime_ns']))
+            else:
+                destino.parent.mkdir(parents=True, exist_ok=True)
+                tmp = destino.with_name(f".{destino.name}.restaurando")
+                shutil.copy2(backup_path / rel, tmp)
+                os.replace(tmp, destino)
+        for rel in plan['escribir'] + plan['permisos']:
+            if objetivo[rel].get('mode'):
+                os.chmod(self.raiz / rel, objetivo[rel]['mode'])
+        directorios = set()
+        for rel in plan['borrar']:
+            p = self.raiz / rel
+            if p.is_file() or p.is_symlink():
+                p.unlink()
+            directorios.update(p.parents)
+        # Quitar los directorios que quedaron vacíos (del más profundo al menos)
+        for d in sorted((d for d in directorios if self.raiz in d.parents), key=lambda d: len(d.parts), reverse=True):
+            try:
+                d.rmdir()
+            except OSError:
+                pass
+
+    def hacer_rollback(self, backup_name=None, dry_run=False):
+        """Realiza rollback a un backup específico (solo escribe, borra o mueve lo que difiere)"""
         if not backup_name:
-            backup_name = self.metadata.get('current_backup')
-            
+            backup_name = self.catalogo.actual()
+
         if not backup_name:
             print("❌ No hay backup especificado")
             return False
-            
-        backup_info = next((b for b in self.metadata['backups'] if b['name'] == backup_name), None)
+
+        backup_info = self.catalogo.snapshot(backup_name)
         if not backup_info:
             print(f"❌ Backup no encontrado: {backup_name}")
             return False
-            
-        backup_path = Path(backup_info['path'])
-        if not backup_path.exists():
-            print(f"❌ Directorio de backup no existe: {backup_path}")
-            return False
-            
-        # Verificar integridad antes de rollback
-        if not self.verificar_integridad_backup(backup_name):
-            print("❌ Backup con integridad comprometida, cancelando rollback")
+
+        if not self._disponible(backup_info):
+            print(f"❌ Directorio de backup no existe: {backup_info['path']}")
             return False
-            
+
         try:
+            plan = self.plan_rollback(backup_name)
+            if dry_run:
+                print(f"🧪 Dry-run de rollback a: {backup_name}")
+                self._imprimir_plan(plan)
+                return plan
+
+            if not any(plan.values()):
+                print(f"✅ El árbol ya coincide con {backup_name}: nada que restaurar")
+                return True
+
+            # Verificar integridad antes de rollback: solo lo que se va a escribir
+            if backup_info['tipo'] == 'snapshot':
+                objetivo = self.catalogo.archivos(backup_name)
+                integro = not self._verificar_blobs({objetivo[rel]['hash'] for rel in plan['escribir']})
+            elif backup_info['tipo'] == 'archivo':
+                lector = LectorArchivo(backup_info['path'])
+                with ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="verificar") as pool:
+                    integro = all(pool.map(lector.verificar, plan['escribir']))
+            elif backup_info['tipo'] == 'enlaces':
+                objetivo = self.catalogo.archivos(backup_name)
+                backup_path = Path(backup_info['path'])
+                with ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="verificar") as pool:
+                    hashes = pool.map(lambda rel: self.calcular_hash_archivo(backup_path / rel), plan['escribir'])
+                    integro = all(h == objetivo[rel]['hash'] for rel, h in zip(plan['escribir'], hashes))
+            else:
+                integro = self.verificar_integridad_backup(backup_name)
+            if not integro:
+                print("❌ Backup con integridad comprometida, cancelando rollback")
+                return False
+
             print(f"🔄 Iniciando rollback a: {backup_name}")
-            
-            # Crear backup del estado actual antes de rollback
-            self.crear_backup_completo(f"pre-rollback_{backup_name}")
-            
-            # Limpiar directorio actual (excepto .git y backups)
-            current_dir = Path('.')
-            for item in current_dir.iterdir():
-                if item.name not in ['.git', 'backups', '.windsurfrules']:
-                    if item.is_file():
-                        item.unlink()
-                    elif item.is_dir():
-                        shutil.rmtree(item)
-            
-            # Restaurar desde backup
-            if os.name == 'nt':  # Windows
-                subprocess.run([
-                    'robocopy', str(backup_path), '.', 
-                    '/E', '/NFL', '/NDL', '/NJH', '/NJS'
-                ], check=True)
-            else:  # Linux/Mac
-                shutil.copytree(backup_path, '.', dirs_exist_ok=True)
-            
-            print(f"✅ Rollback completado: {backup_name}")
+
+            # Snapshot del estado actual antes de rollback (incremental: solo blobs nuevos)
+            if not self.crear_backup_completo(f"pre-rollback_{backup_name}"):
+                print("❌ No se pudo respaldar el estado actual, cancelando rollback")
+                return False
+
+            self._aplicar_plan(backup_name, backup_info, plan)
+            print(f"✅ Rollback completado: {backup_name} ({len(plan['escribir'])} escritos, "
+                  f"{len(plan['borrar'])} borrados, {len(plan['renombrar'])} renombrados)")
             self.notificar_telegram(f"🔄 Rollback completado: {backup_name}")
             return True
-            
+
         except Exception as e:
             print(f"❌ Error en rollback: {e}")
             self.notificar_telegram(f"❌ Error en rollback: {e}")
             return False
-            
+
     def listar_backups(self):
         """Lista todos los backups disponibles"""
         print("\n📋 Backups disponibles:")
         print("-" * 80)
-        
-        for backup in sorted(self.metadata['backups'], key=lambda x: x['timestamp'], reverse=True):
+
+        for backup in self.catalogo.snapshots():
             size_mb = backup['size_total'] / (1024 * 1024)
-            estado = "✅" if Path(backup['path']).exists() else "❌"
-            
-            print(f"{estado} {backup['name']}")
+            estado = "✅" if self._disponible(backup) else "❌"
+
+            print(f"{estado} {backup['nombre']}")
             print(f"   📅 {backup['timestamp']}")
             print(f"   📝 {backup['descripcion']}")
             print(f"   💾 {size_mb:.2f} MB")
-            print(f"   🔍 {'Integridad OK' if self.verificar_integridad_backup(backup['name']) else 'Integridad ERROR'}")
+            if backup['tipo'] in ('snapshot', 'enlaces'):
+                print(f"   🧩 {backup['archivos']} archivos, {backup['bytes_nuevos'] / (1024 * 1024):.2f} MB nuevos")
+            # Resultado guardado de la última verificación (verificar es una operación aparte)
+            if backup['ver_ok'] is None:
+                print("   🔍 Sin verificar")
+            else:
+                print(f"   🔍 {'Integridad OK' if backup['ver_ok'] else 'Integridad ERROR'} ({backup['ver_modo']}, {backup['ver_fecha']})")
             print()
-            
+
+    def _bytes_propios(self, backup):
+        """Bytes que ocupa un backup fuera del almacén de blobs (copia de directorio o .tar)"""
+        if backup['tipo'] == 'snapshot':
+            return 0
+        backup_path = Path(backup['path'])
+        if backup['tipo'] == 'enlaces':
+            # Lo compartido por hardlink con otros snapshots no se libera
+            return bytes_exclusivos([backup_path]) if backup_path.is_dir() else 0
+        if backup_path.is_dir():
+            return self.calcular_tamano(backup_path)
+        return backup_path.stat().st_size if backup_path.exists() else 0
+
+    def _eliminar_backup(self, backup):
+        """Borra un backup del catálogo y sus datos propios. Devuelve los bytes liberados
+        (sin contar blobs compartidos: esos se recolectan después)"""
+        liberados = self._bytes_propios(backup)
+        if backup['tipo'] != 'snapshot':
+            backup_path = Path(backup['path'])
+            if backup_path.is_dir():
+                shutil.rmtree(backup_path)
+            elif backup_path.exists():
+                backup_path.unlink()
+                ruta_indice(backup_path).unlink(missing_ok=True)
+        self.catalogo.eliminar(backup['nombre'])
+        return liberados
+
     def limpiar_backups_viejos(self, dias=7):
         """Elimina backups más antiguos que N días"""
         from datetime import datetime, timedelta
-        
-        cutoff_date = datetime.now() - timedelta(days=dias)
+
+        cutoff = (datetime.now() - timedelta(days=dias)).strftime("%Y%m%d_%H%M%S")
         eliminados = []
-        
-        for backup in self.metadata['backups'][:]:
-            backup_date = datetime.strptime(backup['timestamp'], "%Y%m%d_%H%M%S")
-            if backup_date < cutoff_date:
-                backup_path = Path(backup['path'])
-                if backup_path.exists():
-                    shutil.rmtree(backup_path)
-                    eliminados.append(backup['name'])
-                    self.metadata['backups'].remove(backup)
-        
+        liberados = 0
+
+        for backup in self.catalogo.snapshots(hasta=cutoff):
+            liberados += self._eliminar_backup(backup)
+            eliminados.append(backup['nombre'])
+
         if eliminados:
-            self.save_metadata()
             print(f"🗑️ Eliminados {len(eliminados)} backups antiguos")
+            borrados, liberados_blobs = self.recolectar_blobs()
+            liberados += liberados_blobs
+            print(f"🧹 {borrados} blobs sin referencias, {liberados / (1024 * 1024):.2f} MB liberados")
             self.notificar_telegram(f"🗑️ Limpieza: {len(eliminados)} backups eliminados")
         else:
             print("✅ No hay backups viejos para eliminar")
 
+    def aplicar_retencion(self, politica=None, dry_run=False):
+        """Retención GFS (backup_retencion.py): borra lo que ningún nivel reclama y recolecta blobs
+
+        Solo se podan los snapshots automáticos (DESCRIPCIONES_AUTOMATICAS); los manuales y los
+        pre-rollback se conservan siempre.
+        Devuelve {'conservados', 'eliminados', 'blobs', 'bytes_liberados'}; con dry_run solo calcula"""
+        politica = politica or PoliticaRetencion.desde_env()
+        backups = {b['nombre']: b for b in self.catalogo.snapshots()}
+        protegidos = [n for n, b in backups.items() if not b['descripcion'].startswith(DESCRIPCIONES_AUTOMATICAS)]
+        conservar, borrar = seleccionar([(n, b['timestamp']) for n, b in backups.items()], politica, protegidos)
+        resultado = {'conservados': conservar, 'eliminados': borrar, 'blobs': 0, 'bytes_liberados': 0}
+
+        print(f"🗂️ Retención {politica}: {len(conservar)} conservados ({len(protegidos)} manuales/pre-rollback), "
+              f"{len(borrar)} a eliminar")
+        if dry_run:
+            for nombre in borrar:
+                print(f"   🗑️ {nombre}")
+            propios = sum(self._bytes_propios(backups[n]) for n in borrar if backups[n]['tipo'] != 'enlaces')
+            # Los snapshots enlazados comparten inodos entre sí: se cuentan juntos
+            propios += bytes_exclusivos([backups[n]['path'] for n in borrar if backups[n]['tipo'] == 'enlaces'])
+            resultado['bytes_liberados'] = propios + self.catalogo.bytes_exclusivos(borrar)
+            print(f"   Se liberarían {resultado['bytes_liberados'] / (1024 * 1024):.2f} MB")
+            return resultado
+
+        liberados = sum(self._eliminar_backup(backups[n]) for n in borrar)
+        blobs, liberados_blobs = self.recolectar_blobs()
+        resultado['blobs'] = blobs
+        resultado['bytes_liberados'] = liberados + liberados_blobs
+        if borrar or blobs:
+            print(f"🧹 {len(borrar)} backups y {blobs} blobs eliminados, "
+                  f"{resultado['bytes_liberados'] / (1024 * 1024):.2f} MB liberados")
+            self.notificar_telegram(
+                f"🗑️ Retención {politica}: {len(borrar)} backups eliminados, "
+                f"{resultado['bytes_liberados'] / (1024 * 1024):.1f} MB liberados"
+            )
+        return resultado
+
+    def recolectar_blobs(self):
+        """Borra los blobs que ya no referencia ningún snapshot. Devuelve (blobs, bytes)"""
+        resultado = self.almacen.recolectar(self.catalogo.hashes_en_uso())
+        self.catalogo.olvidar_blobs([h for h, _ in self.catalogo.blobs_sin_referencias()])
+        return resultado
+
+    def modo_vigilante(self, silencio_s=30, umbral=200, max_espera_s=900):
+        """Snapshot incremental al detectar cambios (backup_vigilante.py) en lugar de cada hora"""
+        from backup_vigilante import VigilanteBackups
+
+        VigilanteBackups(self, silencio_s, umbral, max_espera_s).ejecutar()
+
 # Ejemplo de uso
 if __name__ == "__main__":
     manager = BackupRollbackManager()
@@ -269,8 +701,11 @@ if __name__ == "__main__":
     print("2. Listar backups")
     print("3. Verificar integridad de backup")
     print("4. Hacer rollback")
-    print("5. Limpiar backups viejos")
-    print("6. Modo automático (backup programado)")
+    print("5. Limpiar backups viejos (retención GFS)")
+    print("6. Modo automático (backup al detectar cambios)")
+    print("7. Crear backup empaquetado (.tar comprimido)")
+    print("8. Extraer un archivo de un backup")
+    print("9. Crear snapshot enlazado (hardlinks, directorio navegable)")
     
     choice = input("Selecciona opción: ")
     
@@ -280,21 +715,29 @@ if __name__ == "__main__":
     elif choice == "2":
         manager.listar_backups()
     elif choice == "3":
-        name = input("Nombre del backup a verificar: ")
-        manager.verificar_integridad_backup(name)
+        name = input("Nombre del backup a verificar (dejar en blanco para todos): ")
+        modo = input("Modo [completo/cambios/muestra] (default cambios): ").strip() or "cambios"
+        if name:
+            manager.verificar_integridad_backup(name, modo)
+        else:
+            manager.verificar_todos(modo)
     elif choice == "4":
         name = input("Nombre del backup (dejar en blanco para el más reciente): ")
-        manager.hacer_rollback(name if name else None)
+        solo_ver = input("¿Solo mostrar los cambios (dry-run)? [s/N]: ").strip().lower() == "s"
+        manager.hacer_rollback(name if name else None, dry_run=solo_ver)
     elif choice == "5":
-        dias = int(input("Días máximos de antigüedad (default 7): ") or 7)
-        manager.limpiar_backups_viejos(dias)
+        solo_ver = input("¿Solo mostrar qué se borraría (dry-run)? [s/N]: ").strip().lower() == "s"
+        manager.aplicar_retencion(dry_run=solo_ver)
     elif choice == "6":
-        print("🤖 Modo automático - Creando backup cada hora...")
-        print("Presiona Ctrl+C para detener")
-        try:
-            import time
-            while True:
-                manager.crear_backup_completo("backup_programado")
-                time.sleep(3600)  # 1 hora
-        except KeyboardInterrupt:
-            print("\n🛑 Modo automático detenido")
+        print("🤖 Modo automático - Snapshot tras cada ráfaga de cambios...")
+        manager.modo_vigilante()
+    elif choice == "7":
+        desc = input("Descripción del backup: ")
+        manager.crear_backup_empaquetado(desc)
+    elif choice == "8":
+        name = input("Nombre del backup: ")
+        rel = input("Ruta del archivo (relativa al proyecto): ").strip().replace("\\", "/")
+        manager.extraer_archivo(name, rel)
+    elif choice == "9":
+        desc = input("Descripción del backup: ")
+        manager.crear_backup_enlazado(desc)
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+Modo vigilante de backups: snapshot incremental cuando hay cambios, no cada hora.
+
+Recoge eventos del sistema de archivos y lanza crear_backup_completo():
+- tras `silencio_s` segundos sin cambios nuevos (la ráfaga de edición terminó), o
+- en cuanto se acumulan `umbral` rutas cambiadas (sesiones muy activas = más puntos), o
+- si lleva `max_espera_s` con cambios pendientes sin llegar a un silencio.
+Sin cambios no se hace nada. La retención GFS corre como mucho una vez por hora (y respeta la
+gracia de backup_retencion.py), así que los snapshots finos recientes no se podan al momento.
+
+Fuentes de eventos: inotify en Linux (vía ctypes, sin dependencias); en Windows/macOS el paquete
+watchdog si está instalado; si no, sondeo periódico comparando (tamaño, mtime).
+
+Uso: python backup_vigilante.py [--silencio 30] [--umbral 200] [--max-espera 900] [--sondeo]
+"""
+from __future__ import annotations
+
+import argparse
+import ctypes
+import ctypes.util
+import os
+import queue
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+
+from backup_almacen import EXCLUIR, recorrer
+
+# Máscara inotify (linux/inotify.h)
+IN_MODIFY = 0x002
+IN_ATTRIB = 0x004
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ONLYDIR = 0x1000000
+IN_DONT_FOLLOW = 0x2000000
+IN_ISDIR = 0x40000000
+MASCARA = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE
+           | IN_DELETE | IN_DELETE_SELF | IN_ONLYDIR | IN_DONT_FOLLOW)
+_EVENTO = struct.Struct("iIII")
+# Ruta simbólica que indica "se perdieron eventos": tratar como cambio masivo
+DESBORDE = "*"
+
+
+class FuenteInotify:
+    """Eventos inotify de todo el árbol (un watch por directorio)."""
+
+    def __init__(self, raiz: Path, excluir: frozenset[str] = EXCLUIR):
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify solo existe en Linux")
+        self.raiz = raiz
+        self.excluir = excluir
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        self._dirs: dict[int, Path] = {}
+        self._vigilar_arbol(raiz)
+
+    def _vigilar(self, d: Path) -> None:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(d), MASCARA)
+        if wd < 0:
+            # ENOSPC: límite fs.inotify.max_user_watches alcanzado
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch {d}")
+        self._dirs[wd] = d
+
+    def _vigilar_arbol(self, base: Path) -> list[str]:
+        """Añade watches a base y subdirectorios. Devuelve los archivos que ya contiene."""
+        archivos = []
+        pendientes = [base]
+        while pendientes:
+            d = pendientes.pop()
+            self._vigilar(d)
+            try:
+                for e in os.scandir(d):
+                    if e.name in self.excluir:
+                        continue
+                    if e.is_dir(follow_symlinks=False):
+                        pendientes.append(Path(e.path))
+                    else:
+                        archivos.append(Path(e.path).relative_to(self.raiz).as_posix())
+            except OSError:
+                continue
+        return archivos
+
+    def esperar(self, timeout: float) -> set[str]:
+        """Rutas relativas cambiadas (espera hasta timeout s a que llegue algo)."""
+        cambios: set[str] = set()
+        listos, _, _ = select.select([self._fd], [], [], max(0.0, timeout))
+        if not listos:
+            return cambios
+        try:
+            datos = os.read(self._fd, 1 << 16)
+        except BlockingIOError:
+            return cambios
+        off = 0
+        while off + _EVENTO.size <= len(datos):
+            wd, mask, _cookie, largo = _EVENTO.unpack_from(datos, off)
+            nombre = datos[off + _EVENTO.size: off + _EVENTO.size + largo].rstrip(b"\0")
+            off += _EVENTO.size + largo
+            if mask & IN_Q_OVERFLOW:
+                cambios.add(DESBORDE)
+                continue
+            if mask & IN_IGNORED:
+                self._dirs.pop(wd, None)
+                continue
+            d = self._dirs.get(wd)
+            if d is None or not nombre:
+                continue
+            nombre_str = os.fsdecode(nombre)
+            if nombre_str in self.excluir:
+                continue
+            ruta = d / nombre_str
+            cambios.add(ruta.relative_to(self.raiz).as_posix())
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                try:
+                    cambios.update(self._vigilar_arbol(ruta))
+                except OSError:
+                    cambios.add(DESBORDE)
+        return cambios
+
+    def cerrar(self) -> None:
+        os.close(self._fd)
+
+
+class FuenteWatchdog:
+    """Eventos vía watchdog (ReadDirectoryChangesW en Windows, FSEvents en macOS)."""
+
+    def __init__(self, raiz: Path, excluir: frozenset[str] = EXCLUIR):
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+
+        self.raiz = raiz
+        self.excluir = excluir
+        self._cola: queue.Queue[str] = queue.Queue()
+        fuente = self
+
+        class _Manejador(FileSystemEventHandler):
+            def on_any_event(self, event):
+                for ruta in (getattr(event, "src_path", None), getattr(event, "dest_path", None)):
+                    if ruta:
+                        fuente._encolar(os.fsdecode(ruta))
+
+        self._observer = Observer()
+        self._observer.schedule(_Manejador(), str(raiz), recursive=True)
+        self._observer.start()
+
+    def _encolar(self, ruta: str) -> None:
+        try:
+            rel = Path(ruta).relative_to(self.raiz)
+        except ValueError:
+            return
+        if rel.parts and not any(p in self.excluir for p in rel.parts):
+            self._cola.put(rel.as_posix())
+
+    def esperar(self, timeout: float) -> set[str]:
+        cambios: set[str] = set()
+        try:
+            cambios.add(self._cola.get(timeout=max(0.01, timeout)))
+            while True:
+                cambios.add(self._cola.get_nowait())
+        except queue.Empty:
+            pass
+        return cambios
+
+    def cerrar(self) -> None:
+        self._observer.stop()
+        self._observer.join(timeout=5)
+
+
+class FuenteSondeo:
+    """Sin eventos del SO: recorre el árbol cada `intervalo_s` y compara (tamaño, mtime)."""
+
+    def __init__(self, raiz: Path, excluir: frozenset[str] = EXCLUIR, intervalo_s: float = 10.0):
+        self.raiz = raiz
+        self.excluir = excluir
+        self.intervalo_s = intervalo_s
+        self._estado = self._leer()
+        self._proximo = time.monotonic() + intervalo_s
+
+    def _leer(self) -> dict[str, tuple[int, int]]:
+        return {rel: (st.st_size, st.st_mtime_ns) for rel, _, st in recorrer(self.raiz, self.excluir)}
+
+    def esperar(self, timeout: float) -> set[str]:
+        espera = self._proximo - time.monotonic()
+        if espera > timeout:
+            time.sleep(max(0.0, timeout))
+            return set()
+        time.sleep(max(0.0, espera))
+        self._proximo = time.monotonic() + self.intervalo_s
+        nuevo = self._leer()
+        cambios = {rel for rel, v in nuevo.items() if self._estado.get(rel) != v}
+        cambios.update(rel for rel in self._estado if rel not in nuevo)
+        self._estado = nuevo
+        return cambios
+
+    def cerrar(self) -> None:
+        pass
+
+
+def crear_fuente(raiz: Path, excluir: frozenset[str] = EXCLUIR, sondeo: bool = False, intervalo_s: float = 10.0):
+    """La mejor fuente disponible: inotify, watchdog o sondeo."""
+    if not sondeo:
+        try:
+            return FuenteInotify(raiz, excluir)
+        except OSError as e:
+            if sys.platform.startswith("linux"):
+                print(f"⚠️ inotify no disponible ({e}); se usa otra fuente")
+        try:
+            return FuenteWatchdog(raiz, excluir)
+        except ImportError:
+            pass
+    return FuenteSondeo(raiz, excluir, intervalo_s)
+
+
+class VigilanteBackups:
+    """Lanza snapshots incrementales del manager según la actividad del árbol."""
+
+    def __init__(self, manager, silencio_s: float = 30.0, umbral: int = 200, max_espera_s: float = 900.0,
+                 fuente=None, retencion: bool = True, retencion_cada_s: float = 3600.0):
+        self.manager = manager
+        self.silencio_s = silencio_s
+        self.umbral = umbral
+        self.max_espera_s = max_espera_s
+        self.retencion = retencion
+        # La retención no corre tras cada snapshot sino como mucho cada retencion_cada_s
+        self.retencion_cada_s = retencion_cada_s
+        self._ultima_retencion: float | None = None
+        self.fuente = fuente or crear_fuente(manager.raiz, EXCLUIR | {manager.backup_dir.name})
+        self.pendientes: set[str] = set()
+        self._primero = self._ultimo = 0.0
+        self.snapshots = 0
+
+    def _motivo(self, ahora: float) -> str | None:
+        if not self.pendientes:
+            return None
+        if DESBORDE in self.pendientes or len(self.pendientes) >= self.umbral:
+            return "umbral"
+        if ahora - self._ultimo >= self.silencio_s:
+            return "silencio"
+        if ahora - self._primero >= self.max_espera_s:
+            return "max_espera"
+        return None
+
+    def paso(self, timeout: float = 1.0) -> str | None:
+        """Procesa eventos hasta timeout s; si toca, hace el snapshot. Devuelve el motivo o None."""
+        cambios = self.fuente.esperar(timeout)
+        ahora = time.monotonic()
+        if cambios:
+            if not self.pendientes:
+                self._primero = ahora
+            self._ultimo = ahora
+            self.pendientes |= cambios
+        motivo = self._motivo(ahora)
+        if motivo:
+            n = "muchos" if DESBORDE in self.pendientes else len(self.pendientes)
+            self.pendientes = set()
+            print(f"👀 {n} cambios ({motivo}): snapshot")
+            self.manager.crear_backup_completo(f"vigilante_{motivo}")
+            self.snapshots += 1
+            if self.retencion and (self._ultima_retencion is None
+                                   or ahora - self._ultima_retencion >= self.retencion_cada_s):
+                self._ultima_retencion = ahora
+                self.manager.aplicar_retencion()
+        return motivo
+
+    def ejecutar(self) -> None:
+        print(f"👀 Vigilando {self.manager.raiz.resolve()} con {type(self.fuente).__name__} "
+              f"(silencio {self.silencio_s:.0f} s, umbral {self.umbral} rutas, máx {self.max_espera_s:.0f} s)")
+        print("Presiona Ctrl+C para detener")
+        try:
+            while True:
+                self.paso(1.0)
+        except KeyboardInterrupt:
+            if self.pendientes:
+                print(f"\n💾 {len(self.pendientes)} cambios pendientes: snapshot final")
+                self.manager.crear_backup_completo("vigilante_salida")
+            print("\n🛑 Modo vigilante detenido")
+        finally:
+            self.fuente.cerrar()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Backups incrementales disparados por cambios en el árbol")
+    parser.add_argument("--silencio", type=float, default=30.0, help="Segundos sin cambios antes del snapshot")
+    parser.add_argument("--umbral", type=int, default=200, help="Rutas cambiadas que fuerzan snapshot")
+    parser.add_argument("--max-espera", type=float, default=900.0, help="Máximo de segundos con cambios pendientes")
+    parser.add_argument("--sondeo", action="store_true", help="Forzar sondeo en lugar de eventos del SO")
+    args = parser.parse_args()
+
+    from backup_rollback import BackupRollbackManager
+
+    manager = BackupRollbackManager()
+    fuente = crear_fuente(manager.raiz, EXCLUIR | {manager.backup_dir.name}, sondeo=args.sondeo)
+    VigilanteBackups(manager, args.silencio, args.umbral, args.max_espera, fuente).ejecutar()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
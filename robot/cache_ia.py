@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""
+cache_ia.py — Caché local de respuestas de IA (SQLite en disco + LRU en memoria).
+
+La clave es el SHA-256 del prompt normalizado (Unicode NFC, espacios colapsados) junto con
+proveedor, modelo y parámetros: la misma pregunta vuelve sin red ni cuota. Cada entrada lleva su
+TTL; al superar `max_entradas` se expulsan las menos usadas. Los aciertos en memoria no tocan disco.
+
+Desactivar: IA_CACHE=0. TTL por defecto: IA_CACHE_TTL_S (86400). Por llamada: sin_cache=True.
+Uso: python cache_ia.py            → estadísticas
+     python cache_ia.py --limpiar  → vacía la caché
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable
+
+BASE = Path(__file__).resolve().parent
+CACHE_DB = BASE / "cache_ia.db"
+TTL_DEFECTO_S = float(os.environ.get("IA_CACHE_TTL_S", "86400"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS respuestas (
+    clave TEXT PRIMARY KEY,
+    proveedor TEXT NOT NULL,
+    modelo TEXT NOT NULL DEFAULT '',
+    texto TEXT NOT NULL,
+    creado REAL NOT NULL,
+    expira REAL NOT NULL,
+    usado REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_respuestas_usado ON respuestas (usado);
+"""
+_ESPACIOS = re.compile(r"\s+")
+
+
+def normalizar(prompt: str) -> str:
+    return _ESPACIOS.sub(" ", unicodedata.normalize("NFC", prompt)).strip()
+
+
+def habilitada() -> bool:
+    return os.environ.get("IA_CACHE", "1").strip().lower() not in ("0", "no", "false", "off")
+
+
+class CacheIA:
+    """Caché de respuestas. Segura entre hilos (una conexión SQLite por hilo)."""
+
+    def __init__(self, ruta: Path = CACHE_DB, max_memoria: int = 256, max_entradas: int = 5000) -> None:
+        self.ruta = Path(ruta)
+        self.max_memoria = max_memoria
+        self.max_entradas = max_entradas
+        self._memoria: OrderedDict[str, tuple[str, str, float]] = OrderedDict()  # clave -> (texto, proveedor, expira)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._listo = False
+        self.aciertos_memoria = self.aciertos_disco = self.fallos = self.guardados = 0
+
+    def _conexion(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.ruta, timeout=30)
+            if not self._listo:
+                with self._init_lock:
+                    if not self._listo:
+                        self.ruta.parent.mkdir(parents=True, exist_ok=True)
+                        con.execute("PRAGMA journal_mode=WAL")
+                        con.executescript(_SCHEMA)
+                        self._listo = True
+            self._local.con = con
+        return con
+
+    @staticmethod
+    def clave(prompt: str, proveedor: str, modelo: str = "", **params: Any) -> str:
+        datos = json.dumps([normalizar(prompt), proveedor, modelo, params], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(datos.encode("utf-8")).hexdigest()
+
+    def _recordar(self, clave: str, valor: tuple[str, str, float]) -> None:
+        with self._lock:
+            self._memoria[clave] = valor
+            self._memoria.move_to_end(clave)
+            while len(self._memoria) > self.max_memoria:
+                self._memoria.popitem(last=False)
+
+    def obtener(self, clave: str) -> tuple[str, str] | None:
+        """(texto, proveedor) si la clave está y no ha caducado. None siempre con IA_CACHE=0."""
+        if not habilitada():
+            return None
+        ahora = time.time()
+        with self._lock:
+            valor = self._memoria.get(clave)
+            if valor and valor[2] > ahora:
+                self._memoria.move_to_end(clave)
+                self.aciertos_memoria += 1
+                return valor[0], valor[1]
+            if valor:
+                del self._memoria[clave]
+        con = self._conexion()
+        fila = con.execute("SELECT texto, proveedor, expira FROM respuestas WHERE clave = ?", (clave,)).fetchone()
+        if not fila or fila[2] <= ahora:
+            with self._lock:
+                self.fallos += 1
+            return None
+        with con:
+            con.execute("UPDATE respuestas SET usado = ? WHERE clave = ?", (ahora, clave))
+        self._recordar(clave, fila)
+        with self._lock:
+            self.aciertos_disco += 1
+        return fila[0], fila[1]
+
+    def guardar(self, clave: str, texto: str, proveedor: str, modelo: str = "", ttl_s: float | None = None) -> None:
+        """Guarda la respuesta ttl_s segundos (defecto TTL_DEFECTO_S). No hace nada con IA_CACHE=0."""
+        if not habilitada():
+            return
+        ahora = time.time()
+        expira = ahora + (TTL_DEFECTO_S if ttl_s is None else ttl_s)
+        con = self._conexion()
+        with con:
+            con.execute(
+                "INSERT OR REPLACE INTO respuestas (clave, proveedor, modelo, texto, creado, expira, usado)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (clave, proveedor, modelo, texto, ahora, expira, ahora),
+            )
+        self._recordar(clave, (texto, proveedor, expira))
+        with self._lock:
+            self.guardados += 1
+            podar = self.guardados % 100 == 1
+        if podar:
+            self.podar()
+
+    def podar(self) -> int:
+        """Borra las caducadas y, si sobran, las menos usadas. Devuelve cuántas se borraron."""
+        con = self._conexion()
+        with con:
+            n = con.execute("DELETE FROM respuestas WHERE expira <= ?", (time.time(),)).rowcount
+            total = con.execute("SELECT COUNT(*) FROM respuestas").fetchone()[0]
+            if total > self.max_entradas:
+                # Se deja un margen del 10% para no podar en cada inserción
+                sobran = total - int(self.max_entradas * 0.9)
+                n += con.execute(
+                    "DELETE FROM respuestas WHERE clave IN (SELECT clave FROM respuestas ORDER BY usado LIMIT ?)",
+                    (sobran,),
+                ).rowcount
+        return n
+
+    def consultar(self, prompt: str, fn: Callable[[], tuple[str, str]], proveedor: str, modelo: str = "",
+                  ttl_s: float | None = None, sin_cache: bool = False, **params: Any) -> tuple[str, str, bool]:
+        """Devuelve (texto, proveedor, desde_cache). fn() se llama solo si no hay entrada válida."""
+        if sin_cache or not habilitada():
+            texto, real = fn()
+            return texto, real, False
+        clave = self.clave(prompt, proveedor, modelo, **params)
+        valor = self.obtener(clave)
+        if valor:
+            return valor[0], valor[1], True
+        texto, real = fn()
+        if texto:
+            self.guardar(clave, texto, real, modelo, ttl_s)
+        return texto, real, False
+
+    def limpiar(self) -> None:
+        with self._lock:
+            self._memoria.clear()
+        con = self._conexion()
+        with con:
+            con.execute("DELETE FROM respuestas")
+
+    def estadisticas(self) -> dict[str, Any]:
+        total = self._conexion().execute("SELECT COUNT(*) FROM respuestas").fetchone()[0]
+        with self._lock:
+            consultas = self.aciertos_memoria + self.aciertos_disco + self.fallos
+            return {
+                "entradas_disco": total,
+                "entradas_memoria": len(self._memoria),
+                "aciertos_memoria": self.aciertos_memoria,
+                "aciertos_disco": self.aciertos_disco,
+                "fallos": self.fallos,
+                "tasa_aciertos": round((self.aciertos_memoria + self.aciertos_disco) / consultas, 3) if consultas else None,
+            }
+
+
+_CACHE: CacheIA | None = None
+_CACHE_LOCK = threading.Lock()
+
+
+def cache_ia() -> CacheIA:
+    """Caché compartida del proceso (robot/cache_ia.db)."""
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = CacheIA()
+        return _CACHE
+
+
+def main() -> int:
+    cache = cache_ia()
+    if "--limpiar" in sys.argv:
+        cache.limpiar()
+        print("Caché de IA vaciada.")
+        return 0
+    print(f"Caché de IA: {cache.ruta}")
+    for k, v in cache.estadisticas().items():
+        print(f"  {k:18} {v}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
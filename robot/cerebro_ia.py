@@ -4,7 +4,7 @@ Cerebro IA — Robot RAULI integrado con Google Gemini.
 Lee GEMINI_API_KEY desde la Bóveda (archivo maestro de credenciales).
 
 Requisito: pip install google-generativeai
-Prueba:    python robot/cerebro_ia.py
+Prueba:    python robot/cerebro_ia.py [--sin-cache]
 """
 from __future__ import annotations
 
@@ -69,38 +69,45 @@ def init_gemini(api_key: str | None = None):
         raise RuntimeError(
             "GEMINI_API_KEY no encontrada. Ponla en la Bóveda (credenciales.txt) o en variable de entorno."
         )
-    import google.generativeai as genai
-    genai.configure(api_key=key)
+    from clientes_ia import registro_clientes
     # Modelos actuales: gemini-2.0-flash, gemini-1.5-flash, gemini-pro
-    return genai.GenerativeModel("gemini-2.0-flash")
+    return registro_clientes().gemini(key, "gemini-2.0-flash")
 
 
-def saludar(model_id: str = "gemini-2.0-flash") -> str:
-    """Envía 'Hola' a Gemini y devuelve su respuesta."""
-    import warnings
-    with warnings.catch_warnings():
-        warnings.simplefilter("ignore", FutureWarning)
-        import google.generativeai as genai
-    key = load_api_key()
-    if not key:
-        raise RuntimeError("GEMINI_API_KEY no encontrada en la Bóveda o en env.")
-    genai.configure(api_key=key)
-    model = genai.GenerativeModel(model_id)
-    r = model.generate_content("Hola")
-    if not r or not r.text:
-        return "(respuesta vacía)"
-    return r.text.strip()
+# Es una prueba de conexión: una respuesta cacheada solo vale unos minutos
+TTL_SALUDO_S = 300
+
+
+def saludar(model_id: str = "gemini-2.0-flash", ttl_s: float | None = TTL_SALUDO_S,
+            sin_cache: bool = False) -> tuple[str, bool]:
+    """Envía 'Hola' a Gemini. Devuelve (respuesta, desde_cache); cacheada ttl_s salvo sin_cache."""
+    from cache_ia import cache_ia
+
+    def _preguntar() -> tuple[str, str]:
+        from clientes_ia import registro_clientes
+        key = load_api_key()
+        if not key:
+            raise RuntimeError("GEMINI_API_KEY no encontrada en la Bóveda o en env.")
+        r = registro_clientes().gemini(key, model_id).generate_content("Hola")
+        # Vacío no se cachea (consultar solo guarda texto no vacío)
+        return (r.text.strip() if r and r.text else ""), "gemini"
+
+    texto, _, desde_cache = cache_ia().consultar("Hola", _preguntar, "gemini", model_id, ttl_s=ttl_s, sin_cache=sin_cache)
+    return texto or "(respuesta vacía)", desde_cache
 
 
 def main() -> int:
     print("Cerebro IA (Gemini) — prueba de conexión\n")
     try:
-        respuesta = saludar()
-        print("Respuesta de Gemini:")
+        respuesta, desde_cache = saludar(sin_cache="--sin-cache" in sys.argv)
+        print("Respuesta de Gemini (caché):" if desde_cache else "Respuesta de Gemini:")
         print("-" * 40)
         print(respuesta)
         print("-" * 40)
-        print("\n[OK] Cerebro vivo. Gemini responde correctamente.")
+        if desde_cache:
+            print(f"\n[OK] Gemini respondió hace menos de {TTL_SALUDO_S // 60} min (usa --sin-cache para comprobar ahora).")
+        else:
+            print("\n[OK] Cerebro vivo. Gemini responde correctamente.")
         return 0
     except Exception as e:
         err = str(e)
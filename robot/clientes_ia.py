@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+clientes_ia.py — Registro de clientes de IA reutilizables entre llamadas e hilos.
+
+Cada cliente se crea una vez y se reutiliza: el canal gRPC de Gemini, el cliente httpx de Groq y
+las conexiones keep-alive de requests hacia Ollama siguen abiertos, así que las llamadas siguientes
+se ahorran el handshake TLS y la creación del canal.
+
+- Gemini: genai.configure() solo cuando cambia la clave; un GenerativeModel por (clave, modelo).
+- Groq: un cliente por clave (httpx.Client es seguro entre hilos).
+- Ollama: una requests.Session por hilo (Session no es segura entre hilos), con su pool urllib3.
+estadisticas() cuenta clientes creados / reutilizados y, para HTTP, conexiones abiertas frente a
+peticiones servidas.
+
+Para streaming async: GenerativeModel, AsyncGroq y httpx.AsyncClient, uno por event loop (el
+cliente gRPC async de Gemini y los pools de conexión pertenecen al loop que los creó); se cierran
+con cerrar_async() o al desaparecer el loop.
+"""
+from __future__ import annotations
+
+import asyncio
+import threading
+import weakref
+from typing import Any
+
+
+class RegistroClientes:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._gemini_clave = ""
+        self._gemini: dict[tuple[str, str], Any] = {}
+        self._groq: dict[str, Any] = {}
+        self._local = threading.local()
+        self._sesiones: list[Any] = []
+        # loop -> {"groq:<clave>": AsyncGroq, "http": httpx.AsyncClient}
+        self._por_loop: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self._contadores = {n: {"creados": 0, "reutilizados": 0} for n in ("gemini", "groq", "ollama")}
+
+    def _contar(self, proveedor: str, creado: bool) -> None:
+        self._contadores[proveedor]["creados" if creado else "reutilizados"] += 1
+
+    def gemini(self, clave: str, modelo: str) -> Any:
+        """GenerativeModel listo para usar (configura genai solo si la clave cambió)."""
+        with self._lock:
+            model = self._gemini.get((clave, modelo))
+            if model is not None:
+                self._contar("gemini", False)
+                return model
+            model = self._gemini[(clave, modelo)] = self._crear_gemini(clave, modelo)
+            self._contar("gemini", True)
+            return model
+
+    def _crear_gemini(self, clave: str, modelo: str) -> Any:
+        # Con self._lock tomado
+        import warnings
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", FutureWarning)
+            import google.generativeai as genai
+        if clave != self._gemini_clave:
+            # genai.configure es global al proceso: los modelos de otra clave dejan de valer
+            genai.configure(api_key=clave)
+            self._gemini_clave = clave
+            self._gemini.clear()
+        return genai.GenerativeModel(modelo)
+
+    def groq(self, clave: str) -> Any:
+        with self._lock:
+            client = self._groq.get(clave)
+            if client is not None:
+                self._contar("groq", False)
+                return client
+            from groq import Groq
+            client = Groq(api_key=clave)
+            self._groq[clave] = client
+            self._contar("groq", True)
+            return client
+
+    def sesion_http(self) -> Any:
+        """requests.Session del hilo actual (keep-alive hacia Ollama)."""
+        sesion = getattr(self._local, "sesion", None)
+        with self._lock:
+            if sesion is not None:
+                self._contar("ollama", False)
+                return sesion
+            import requests
+            sesion = requests.Session()
+            self._local.sesion = sesion
+            self._sesiones.append(sesion)
+            self._contar("ollama", True)
+            return sesion
+
+    def _async(self, proveedor: str, nombre: str, crear) -> Any:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            clientes = self._por_loop.setdefault(loop, {})
+            client = clientes.get(nombre)
+            if client is not None:
+                self._contar(proveedor, False)
+                return client
+            client = clientes[nombre] = crear()
+            self._contar(proveedor, True)
+            return client
+
+    def gemini_async(self, clave: str, modelo: str) -> Any:
+        """GenerativeModel del event loop actual: su cliente gRPC async queda ligado al primer loop."""
+        return self._async("gemini", f"gemini:{clave}:{modelo}", lambda: self._crear_gemini(clave, modelo))
+
+    def groq_async(self, clave: str) -> Any:
+        """AsyncGroq del event loop actual."""
+        def crear():
+            from groq import AsyncGroq
+            return AsyncGroq(api_key=clave)
+        return self._async("groq", f"groq:{clave}", crear)
+
+    def http_async(self) -> Any:
+        """httpx.AsyncClient del event loop actual (streaming de Ollama)."""
+        def crear():
+            import httpx
+            return httpx.AsyncClient(timeout=httpx.Timeout(30.0, read=120.0))
+        return self._async("ollama", "http", crear)
+
+    async def cerrar_async(self) -> None:
+        """Cierra los clientes async del loop actual (llamar antes de que el loop termine)."""
+        with self._lock:
+            clientes = self._por_loop.pop(asyncio.get_running_loop(), {})
+        for nombre, client in clientes.items():
+            if nombre.startswith("gemini:"):
+                continue  # GenerativeModel no tiene close(): su canal cae con el loop
+            try:
+                await client.close() if hasattr(client, "close") else await client.aclose()
+            except Exception:
+                pass
+
+    def estadisticas(self) -> dict[str, dict[str, int]]:
+        with self._lock:
+            datos = {n: dict(c) for n, c in self._contadores.items()}
+            sesiones = list(self._sesiones)
+        conexiones = peticiones = 0
+        for sesion in sesiones:
+            for adaptador in sesion.adapters.values():
+                manager = getattr(adaptador, "poolmanager", None)
+                if manager is None:
+                    continue
+                for clave in list(manager.pools.keys()):
+                    pool = manager.pools.get(clave)
+                    if pool is not None:
+                        conexiones += pool.num_connections
+                        peticiones += pool.num_requests
+        datos["ollama"].update(conexiones=conexiones, peticiones=peticiones)
+        return datos
+
+    def cerrar(self) -> None:
+        with self._lock:
+            for client in self._groq.values():
+                try:
+                    client.close()
+                except Exception:
+                    pass
+            for sesion in self._sesiones:
+                sesion.close()
+            self._groq.clear()
+            self._gemini.clear()
+            self._sesiones.clear()
+            self._gemini_clave = ""
+            self._local = threading.local()
+
+
+_REGISTRO: RegistroClientes | None = None
+_REGISTRO_LOCK = threading.Lock()
+
+
+def registro_clientes() -> RegistroClientes:
+    """Registro compartido del proceso."""
+    global _REGISTRO
+    with _REGISTRO_LOCK:
+        if _REGISTRO is None:
+            _REGISTRO = RegistroClientes()
+        return _REGISTRO
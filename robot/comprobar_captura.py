@@ -6,6 +6,8 @@ import sys
 from pathlib import Path
 
 BASE = Path(__file__).resolve().parent
+if str(BASE.parent) not in sys.path:
+    sys.path.insert(0, str(BASE.parent))  # servicio_capturas.py (compartido en la raíz)
 EVIDENCIA_DIR = BASE / "evidencia"
 CAPTURA = EVIDENCIA_DIR / "captura_comprobacion.png"
 URL = os.environ.get("CAPTURA_URL", "https://rauli-panaderia.onrender.com")
@@ -34,21 +36,17 @@ def _load_telegram():
 async def _captura():
     EVIDENCIA_DIR.mkdir(parents=True, exist_ok=True)
     try:
-        from playwright.async_api import async_playwright
+        from servicio_capturas import ServicioCapturas
+        async with ServicioCapturas() as capt:
+            png = await capt.capturar(URL)
     except ImportError:
         print("Instala playwright (viene con browser-use).")
         return False
-    try:
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=True)
-            page = await browser.new_page()
-            await page.goto(URL, wait_until="domcontentloaded", timeout=20_000)
-            await page.screenshot(path=str(CAPTURA), full_page=True)
-            await browser.close()
-        return CAPTURA.exists()
     except Exception as e:
         print("Error capturando:", e)
         return False
+    CAPTURA.write_bytes(png)
+    return True
 
 
 def _enviar_photo(chat_id, path, caption):
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""
+enrutador_ia.py — Enrutado por salud entre proveedores de IA con circuit breakers.
+
+Por cada proveedor (y por cada modelo de Groq) se guarda una ventana de los últimos resultados:
+tasa de éxito y latencia media móvil. Tras `fallos_para_abrir` fallos seguidos (o un 429 / cuota
+agotada) el circuito se abre y el proveedor se salta sin esperar su fallo; pasado el enfriamiento
+queda semiabierto y deja pasar una sola llamada de prueba: si va bien se cierra, si falla se
+vuelve a abrir con el doble de enfriamiento (hasta `max_enfriamiento_s`).
+
+Cada llamada va primero al proveedor más sano; con todo sano se respeta el orden de preferencia
+(Gemini → Groq → Ollama). El estado vive en memoria del proceso (bot, servidor).
+
+llamar_cubierto() (async) lanza el primero y, si no responde en su p90 de latencia, lanza también
+el siguiente (hedging): gana la primera respuesta buena y las demás se cancelan.
+"""
+from __future__ import annotations
+
+import asyncio
+import functools
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor
+from typing import Callable
+
+CERRADO, ABIERTO, SEMIABIERTO = "cerrado", "abierto", "semiabierto"
+# Errores que indican límite de cuota: abrir el circuito sin esperar más fallos
+MARCAS_LIMITE = ("429", "quota", "rate limit", "rate_limit", "resource_exhausted", "too many requests")
+# Espera antes de cubrir una llamada cuando el proveedor aún no tiene latencias medidas
+RETRASO_COBERTURA_S = float(os.environ.get("IA_RETRASO_COBERTURA_S", "2.0"))
+
+
+def _percentil(valores, q: float) -> float | None:
+    orden = sorted(valores)
+    return orden[min(len(orden) - 1, int(q * len(orden)))] if orden else None
+
+
+def es_limite(error: BaseException | str) -> bool:
+    texto = str(error).lower()
+    return any(m in texto for m in MARCAS_LIMITE)
+
+
+class CircuitoIA:
+    """Circuit breaker + métricas de un proveedor o modelo. Seguro entre hilos."""
+
+    def __init__(self, nombre: str, fallos_para_abrir: int = 3, enfriamiento_s: float = 30.0,
+                 max_enfriamiento_s: float = 600.0, ventana: int = 20) -> None:
+        self.nombre = nombre
+        self.fallos_para_abrir = fallos_para_abrir
+        self.enfriamiento_base_s = enfriamiento_s
+        self.max_enfriamiento_s = max_enfriamiento_s
+        self._resultados: deque[bool] = deque(maxlen=ventana)
+        self._latencias: deque[float] = deque(maxlen=ventana)
+        self._lock = threading.Lock()
+        self.estado = CERRADO
+        self.fallos_seguidos = 0
+        self.enfriamiento_s = enfriamiento_s
+        self.abierto_hasta = 0.0
+        self.latencia_s: float | None = None  # media móvil exponencial de las llamadas con éxito
+        self.ultimo_error = ""
+        self._sondeando = False
+
+    def permitir(self) -> bool:
+        """True si se puede llamar ahora. En semiabierto solo pasa una sonda a la vez."""
+        with self._lock:
+            if self.estado == ABIERTO:
+                if time.monotonic() < self.abierto_hasta:
+                    return False
+                self.estado = SEMIABIERTO
+                self._sondeando = False
+            if self.estado == SEMIABIERTO:
+                if self._sondeando:
+                    return False
+                self._sondeando = True
+            return True
+
+    def exito(self, latencia_s: float) -> None:
+        with self._lock:
+            self._resultados.append(True)
+            self._latencias.append(latencia_s)
+            self.latencia_s = latencia_s if self.latencia_s is None else 0.7 * self.latencia_s + 0.3 * latencia_s
+            self.fallos_seguidos = 0
+            self.estado = CERRADO
+            self.enfriamiento_s = self.enfriamiento_base_s
+            self._sondeando = False
+
+    def fallo(self, error: BaseException | str = "") -> None:
+        with self._lock:
+            self._resultados.append(False)
+            self.fallos_seguidos += 1
+            self.ultimo_error = str(error)[:200]
+            if self.estado == SEMIABIERTO:
+                # La sonda falló: otra vez abierto, con más enfriamiento
+                self.enfriamiento_s = min(self.enfriamiento_s * 2, self.max_enfriamiento_s)
+                self._abrir()
+            elif self.fallos_seguidos >= self.fallos_para_abrir or es_limite(error):
+                self._abrir()
+            self._sondeando = False
+
+    def liberar(self) -> None:
+        """La llamada se canceló sin resultado: libera la sonda sin contar éxito ni fallo."""
+        with self._lock:
+            self._sondeando = False
+
+    def _abrir(self) -> None:
+        self.estado = ABIERTO
+        self.abierto_hasta = time.monotonic() + self.enfriamiento_s
+
+    @property
+    def tasa_exito(self) -> float:
+        """Éxitos / llamadas en la ventana, suavizado (sin datos = 1.0)."""
+        n = len(self._resultados)
+        return (sum(self._resultados) + 1) / (n + 1)
+
+    def percentil(self, q: float = 0.9) -> float | None:
+        """Latencia del percentil q de las últimas llamadas con éxito (None sin datos)."""
+        with self._lock:
+            return _percentil(self._latencias, q)
+
+    def puntuacion(self, preferencia: float = 1.0) -> float:
+        """Mayor es mejor: tasa de éxito penalizada por latencia (10 s ≈ la mitad)."""
+        if self.estado == ABIERTO and time.monotonic() < self.abierto_hasta:
+            return 0.0
+        latencia = self.latencia_s or 0.0
+        return self.tasa_exito * preferencia / (1 + latencia / 10)
+
+    def resumen(self) -> dict:
+        with self._lock:
+            restante = max(0.0, self.abierto_hasta - time.monotonic()) if self.estado == ABIERTO else 0.0
+            return {
+                "estado": self.estado,
+                "tasa_exito": round(self.tasa_exito, 3),
+                "llamadas": len(self._resultados),
+                "latencia_s": round(self.latencia_s, 3) if self.latencia_s is not None else None,
+                "p90_s": round(_percentil(self._latencias, 0.9), 3) if self._latencias else None,
+                "fallos_seguidos": self.fallos_seguidos,
+                "reabre_en_s": round(restante, 1),
+                "ultimo_error": self.ultimo_error,
+            }
+
+
+class EnrutadorIA:
+    """Reparte llamadas entre proveedores según su salud. proveedores: {nombre: fn(mensaje) -> texto}."""
+
+    def __init__(self, proveedores: dict[str, Callable[[str], str]], **opciones_circuito) -> None:
+        self.proveedores = dict(proveedores)
+        self._opciones = opciones_circuito
+        self._circuitos: dict[str, CircuitoIA] = {}
+        self._lock = threading.Lock()
+
+    def circuito(self, clave: str) -> CircuitoIA:
+        """Circuito de un proveedor ('gemini') o de un modelo ('groq:llama3-8b-8192')."""
+        with self._lock:
+            if clave not in self._circuitos:
+                self._circuitos[clave] = CircuitoIA(clave, **self._opciones)
+            return self._circuitos[clave]
+
+    def ordenar(self, claves: list[str] | tuple[str, ...]) -> list[str]:
+        """Claves de la más sana a la menos; a igualdad, en el orden dado (preferencia)."""
+        n = len(claves)
+        puntos = {c: self.circuito(c).puntuacion(1 - 0.05 * i / max(1, n - 1)) for i, c in enumerate(claves)}
+        return sorted(claves, key=lambda c: -puntos[c])
+
+    def medir(self, clave: str, fn: Callable[[], str]) -> str:
+        """Ejecuta fn registrando éxito/latencia o fallo en el circuito de clave."""
+        circuito = self.circuito(clave)
+        t0 = time.monotonic()
+        try:
+            texto = fn()
+        except Exception as e:
+            circuito.fallo(e)
+            raise
+        circuito.exito(time.monotonic() - t0)
+        return texto
+
+    def llamar(self, mensaje: str) -> tuple[str, str]:
+        """Prueba los proveedores por salud, saltando los de circuito abierto. Devuelve (texto, proveedor)."""
+        errores: dict[str, str] = {}
+        intentados = 0
+        for nombre in self.ordenar(list(self.proveedores)):
+            if not self.circuito(nombre).permitir():
+                errores[nombre] = f"circuito abierto ({self.circuito(nombre).ultimo_error[:60]})"
+                continue
+            intentados += 1
+            try:
+                return self.medir(nombre, lambda: self.proveedores[nombre](mensaje)), nombre
+            except Exception as e:
+                errores[nombre] = str(e)[:120]
+        if not intentados and self.proveedores:
+            # Todos abiertos: se prueba el que antes se reabriría en lugar de fallar sin intentarlo
+            nombre = min(self.proveedores, key=lambda n: self.circuito(n).abierto_hasta)
+            try:
+                return self.medir(nombre, lambda: self.proveedores[nombre](mensaje)), nombre
+            except Exception as e:
+                errores[nombre] = str(e)[:120]
+        raise RuntimeError("; ".join(f"{n}: {e}" for n, e in errores.items()))
+
+    async def llamar_cubierto(self, mensaje: str, retraso_s: float | None = None,
+                              max_simultaneos: int = 2, ejecutor: Executor | None = None) -> tuple[str, str]:
+        """Como llamar(), pero con hedging: si el proveedor en curso no responde en retraso_s (por
+        defecto su p90), se lanza también el siguiente. Gana la primera respuesta buena; el resto se
+        cancela. Un fallo lanza el siguiente en el acto. Devuelve (texto, proveedor).
+
+        Los intentos corren en `ejecutor` (por defecto, el del loop). asyncio.run() espera al
+        ejecutor por defecto al cerrar, perdedores incluidos: quien no quiera esperarlos pasa uno
+        propio y lo cierra con shutdown(wait=False)."""
+        loop = asyncio.get_running_loop()
+        candidatos = iter(self.ordenar(list(self.proveedores)))
+        en_curso: dict[asyncio.Task, str] = {}
+        errores: dict[str, str] = {}
+
+        def lanzar() -> str | None:
+            for nombre in candidatos:
+                if not self.circuito(nombre).permitir():
+                    errores[nombre] = f"circuito abierto ({self.circuito(nombre).ultimo_error[:60]})"
+                    continue
+                fn = self.proveedores[nombre]
+                # Los clientes son síncronos: cada intento va en un hilo (cancelar descarta su resultado)
+                tarea = asyncio.ensure_future(
+                    loop.run_in_executor(ejecutor, functools.partial(self.medir, nombre, lambda: fn(mensaje))))
+                en_curso[tarea] = nombre
+                return nombre
+            return None
+
+        ultimo = lanzar()
+        try:
+            while en_curso:
+                espera = None
+                if ultimo and len(en_curso) < max_simultaneos:
+                    espera = retraso_s if retraso_s is not None else self.circuito(ultimo).percentil(0.9)
+                    espera = RETRASO_COBERTURA_S if espera is None else max(0.05, espera)
+                hechas, _ = await asyncio.wait(en_curso, timeout=espera, return_when=asyncio.FIRST_COMPLETED)
+                if not hechas:
+                    # Sin respuesta a tiempo: se cubre con el siguiente proveedor
+                    ultimo = lanzar() or None
+                    continue
+                for tarea in hechas:
+                    nombre = en_curso.pop(tarea)
+                    if tarea.exception() is None:
+                        return tarea.result(), nombre
+                    errores[nombre] = str(tarea.exception())[:120]
+                if not en_curso or len(en_curso) < max_simultaneos:
+                    ultimo = lanzar() or ultimo
+        finally:
+            for tarea in en_curso:
+                tarea.cancel()
+        if not errores or all(e.startswith("circuito abierto") for e in errores.values()):
+            # Todos abiertos: mismo criterio que llamar()
+            return await loop.run_in_executor(ejecutor, self.llamar, mensaje)
+        raise RuntimeError("; ".join(f"{n}: {e}" for n, e in errores.items()))
+
+    def resumen(self) -> dict[str, dict]:
+        with self._lock:
+            circuitos = dict(self._circuitos)
+        return {clave: c.resumen() for clave, c in sorted(circuitos.items())}
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+historial_despliegues.py — Historial de despliegues append-only (SQLite, modo WAL).
+
+Cada despliegue es un INSERT (coste constante, seguro con varios escritores a la vez).
+El Excel historial_despliegues.xlsx se genera bajo demanda con exportar_xlsx().
+
+Uso:
+  python historial_despliegues.py                 → últimos 10 + estadísticas
+  python historial_despliegues.py --exportar      → genera historial_despliegues.xlsx
+  python historial_despliegues.py --ultimos 20 --proyecto panadería
+"""
+from __future__ import annotations
+
+import argparse
+import sqlite3
+import sys
+import threading
+from contextlib import closing
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+BASE = Path(__file__).resolve().parent
+HISTORIAL_DB = BASE / "historial_despliegues.db"
+HISTORIAL_XLSX = BASE / "historial_despliegues.xlsx"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS despliegues (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    fecha TEXT NOT NULL,
+    proyecto TEXT NOT NULL,
+    plataforma TEXT NOT NULL,
+    estado TEXT NOT NULL,
+    detalle TEXT NOT NULL DEFAULT '',
+    duracion_s REAL
+);
+CREATE INDEX IF NOT EXISTS idx_despliegues_proy_plat ON despliegues (proyecto, plataforma, id);
+"""
+
+
+def _ts() -> str:
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")[:19]
+
+
+class HistorialDespliegues:
+    """Almacén append-only. Una conexión por operación: seguro entre hilos y procesos."""
+
+    def __init__(self, ruta: Path = HISTORIAL_DB) -> None:
+        self.ruta = Path(ruta)
+        self._init_lock = threading.Lock()
+        self._listo = False
+
+    def _conectar(self) -> sqlite3.Connection:
+        if not self._listo:
+            # Antes de conectar: sqlite3 no crea directorios y la primera conexión fallaría
+            self.ruta.parent.mkdir(parents=True, exist_ok=True)
+        con = sqlite3.connect(self.ruta, timeout=30)
+        con.row_factory = sqlite3.Row
+        if not self._listo:
+            with self._init_lock:
+                if not self._listo:
+                    # WAL: lectores no bloquean al escritor; busy timeout serializa escritores concurrentes
+                    con.execute("PRAGMA journal_mode=WAL")
+                    con.executescript(_SCHEMA)
+                    self._listo = True
+        return con
+
+    def registrar(self, proyecto: str, plataforma: str, estado: str, detalle: str = "", duracion_s: float | None = None) -> None:
+        with closing(self._conectar()) as con, con:
+            con.execute(
+                "INSERT INTO despliegues (fecha, proyecto, plataforma, estado, detalle, duracion_s) VALUES (?, ?, ?, ?, ?, ?)",
+                (_ts(), proyecto[:200], plataforma[:50], estado[:100], (detalle or "")[:1000],
+                 round(duracion_s, 2) if duracion_s is not None else None),
+            )
+
+    def ultimos(self, n: int = 10, proyecto: str | None = None, plataforma: str | None = None) -> list[dict[str, Any]]:
+        """Últimos N despliegues (más reciente primero), opcionalmente por proyecto/plataforma."""
+        sql, args = "SELECT * FROM despliegues", []
+        filtros = []
+        if proyecto:
+            filtros.append("proyecto = ?")
+            args.append(proyecto)
+        if plataforma:
+            filtros.append("plataforma = ?")
+            args.append(plataforma)
+        if filtros:
+            sql += " WHERE " + " AND ".join(filtros)
+        sql += " ORDER BY id DESC LIMIT ?"
+        args.append(n)
+        with closing(self._conectar()) as con:
+            return [dict(r) for r in con.execute(sql, args)]
+
+    def estadisticas(self) -> list[dict[str, Any]]:
+        """Por proyecto/plataforma: total, ok, tasa de éxito y duración media/máxima de los ok."""
+        with closing(self._conectar()) as con:
+            filas = con.execute(
+                """
+                SELECT proyecto, plataforma,
+                       COUNT(*) AS total,
+                       SUM(estado = 'ok') AS ok,
+                       AVG(CASE WHEN estado = 'ok' THEN duracion_s END) AS duracion_media_s,
+                       MAX(CASE WHEN estado = 'ok' THEN duracion_s END) AS duracion_max_s,
+                       MAX(fecha) AS ultimo
+                FROM despliegues GROUP BY proyecto, plataforma ORDER BY proyecto, plataforma
+                """
+            ).fetchall()
+        out = []
+        for r in filas:
+            d = dict(r)
+            d["tasa_exito"] = round(d["ok"] / d["total"], 3) if d["total"] else 0.0
+            if d["duracion_media_s"] is not None:
+                d["duracion_media_s"] = round(d["duracion_media_s"], 1)
+            out.append(d)
+        return out
+
+    def exportar_xlsx(self, destino: Path = HISTORIAL_XLSX) -> Path:
+        """Vuelca todo el historial a XLSX (modo write_only: memoria constante)."""
+        import openpyxl
+        wb = openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet("Historial")
+        ws.append(["Fecha", "Proyecto", "Plataforma", "Estado", "Detalle", "Duración (s)"])
+        with closing(self._conectar()) as con:
+            for r in con.execute("SELECT fecha, proyecto, plataforma, estado, detalle, duracion_s FROM despliegues ORDER BY id"):
+                ws.append(list(r))
+        tmp = destino.with_suffix(".tmp.xlsx")
+        wb.save(tmp)
+        tmp.replace(destino)
+        return destino
+
+    def importar_xlsx(self, origen: Path = HISTORIAL_XLSX) -> int:
+        """Migra un historial_despliegues.xlsx antiguo (solo si la base está vacía)."""
+        if not origen.exists():
+            return 0
+        with closing(self._conectar()) as con:
+            if con.execute("SELECT 1 FROM despliegues LIMIT 1").fetchone():
+                return 0
+        import openpyxl
+        wb = openpyxl.load_workbook(origen, read_only=True)
+        filas = [
+            (str(f[0] or ""), str(f[1] or ""), str(f[2] or ""), str(f[3] or ""), str(f[4] or ""))
+            for f in wb.active.iter_rows(min_row=2, values_only=True) if f and f[0]
+        ]
+        with closing(self._conectar()) as con, con:
+            con.executemany(
+                "INSERT INTO despliegues (fecha, proyecto, plataforma, estado, detalle) VALUES (?, ?, ?, ?, ?)", filas
+            )
+        return len(filas)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Historial de despliegues (SQLite)")
+    parser.add_argument("--exportar", nargs="?", const=str(HISTORIAL_XLSX), help="Genera el XLSX (ruta opcional)")
+    parser.add_argument("--importar", action="store_true", help="Migra historial_despliegues.xlsx antiguo a la base")
+    parser.add_argument("--ultimos", type=int, default=10)
+    parser.add_argument("--proyecto")
+    parser.add_argument("--plataforma")
+    args = parser.parse_args()
+    h = HistorialDespliegues()
+    if args.importar:
+        print(f"Importadas {h.importar_xlsx()} filas.")
+    if args.exportar:
+        print(f"Exportado: {h.exportar_xlsx(Path(args.exportar))}")
+        return 0
+    print(f"=== Últimos {args.ultimos} despliegues ===")
+    for r in h.ultimos(args.ultimos, args.proyecto, args.plataforma):
+        dur = f" {r['duracion_s']:.0f} s" if r["duracion_s"] is not None else ""
+        print(f"  {r['fecha']}  {r['proyecto']}/{r['plataforma']}: {r['estado']}{dur}  {r['detalle'][:60]}")
+    print("\n=== Estadísticas ===")
+    for e in h.estadisticas():
+        media = f", media {e['duracion_media_s']} s" if e["duracion_media_s"] is not None else ""
+        print(f"  {e['proyecto']}/{e['plataforma']}: {e['ok']}/{e['total']} ok ({e['tasa_exito']:.0%}){media}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,7 +3,9 @@
 omni_gestor_proyectos.py — Gestor por voz (Telegram). Incorporado en rauli-panaderia.
 
 - /ping, /start → ATLAS RAULI :: BOT OK
-- /captura → captura rauli-panaderia.onrender.com y envía imagen por Telegram
+- /captura [movil] → captura rauli-panaderia.onrender.com y envía imagen por Telegram
+- /estado → cola y latencia de la transcripción Whisper
+- /historial → últimos despliegues y tasa de éxito por proyecto/plataforma
 - Voz: «Despliega la panadería», «Actualiza todo» → despliegues Vercel/Render
 
 Requisitos: .\\setup_entorno.ps1, ffmpeg, ollama deepseek-r1:14b, omni_telegram.env
@@ -21,12 +23,17 @@ from pathlib import Path
 from typing import Any
 
 BASE = Path(__file__).resolve().parent
+if str(BASE.parent) not in sys.path:
+    sys.path.insert(0, str(BASE.parent))  # telegram_entrega.py (compartido en la raíz)
 CHROME_DATA = BASE / "chrome_data"
+# Cookies/localStorage exportados del perfil persistente: siembran los contextos aislados de cada tarea
+STORAGE_STATE = CHROME_DATA / "storage_state.json"
 DOWNLOADS_DIR = BASE / "downloads"
 TRACES_DIR = BASE / "traces"
-HISTORIAL_XLSX = BASE / "historial_despliegues.xlsx"
 LOG_FILE = BASE / "omni_gestor.log"
 AUDIO_DIR = BASE / "audio_temp"
+# Solo depuración: guarda cada nota de voz .oga en audio_temp/ (por defecto todo va en memoria)
+AUDIO_DEBUG = os.environ.get("OMNI_AUDIO_DEBUG", "").strip().lower() in ("1", "true", "si", "sí")
 EVIDENCIA_DIR = BASE / "evidencia"
 CAPTURA_COMPROBACION = EVIDENCIA_DIR / "captura_comprobacion.png"
 CAPTURA_URL = os.environ.get("CAPTURA_URL", "https://rauli-panaderia.onrender.com")
@@ -49,8 +56,15 @@ MODEL_NAVEGADOR = "deepseek-r1:14b"
 NUM_CTX = 64_000
 TEMPERATURE = 0.0
 WHISPER_MODEL = "base"
+WHISPER_WORKERS = int(os.environ.get("WHISPER_WORKERS", "2"))
 STEP_TIMEOUT_S = 120
 LLM_TIMEOUT_S = 180
+DESPLIEGUE_CONCURRENCIA = int(os.environ.get("DESPLIEGUE_CONCURRENCIA", "3"))
+DESPLIEGUE_PLAZO_S = float(os.environ.get("DESPLIEGUE_PLAZO_S", "900"))
+TAREAS_PLATAFORMA = {
+    "vercel": "En Vercel (vercel.com/dashboard), abre '{vercel_project}', Deploy/Redeploy si existe. Responde OK.",
+    "render": "En Render (dashboard.render.com), abre '{render_service}', Deploy/Manual Deploy si existe. Responde OK.",
+}
 
 
 def _telegram_env_candidates():
@@ -116,71 +130,62 @@ def _voice_say(text: str) -> None:
         logging.getLogger(__name__).warning("[Voz] %s", e)
 
 
-def _excel_append(proyecto: str, plataforma: str, estado: str, detalle: str) -> None:
-    try:
-        import openpyxl
-    except ImportError:
-        return
+_historial: Any = None
+
+
+def _historial_append(proyecto: str, plataforma: str, estado: str, detalle: str, duracion_s: float | None = None) -> None:
+    """Registra en historial_despliegues.db (append-only; XLSX con historial_despliegues.py --exportar)."""
+    global _historial
     try:
-        if HISTORIAL_XLSX.exists():
-            wb = openpyxl.load_workbook(HISTORIAL_XLSX)
-            ws = wb.active
-        else:
-            wb = openpyxl.Workbook()
-            ws = wb.active
-            ws.append(["Fecha", "Proyecto", "Plataforma", "Estado", "Detalle"])
-        ws.append([_ts(), proyecto[:200], plataforma[:50], estado[:100], (detalle or "")[:1000]])
-        wb.save(HISTORIAL_XLSX)
+        if _historial is None:
+            from historial_despliegues import HistorialDespliegues
+            _historial = HistorialDespliegues()
+        _historial.registrar(proyecto, plataforma, estado, detalle, duracion_s)
     except Exception as e:
-        logging.getLogger(__name__).warning("[Excel] %s", e)
+        logging.getLogger(__name__).warning("[Historial] %s", e)
+
+
+_entrega: Any = None
+
+
+def _get_entrega() -> Any:
+    """Cliente Telegram compartido (pool async + cola con límites); vive en el loop de PTB."""
+    global _entrega
+    if _entrega is None:
+        from telegram_entrega import EntregaTelegram
+        _entrega = EntregaTelegram(BOT_TOKEN)
+    return _entrega
 
 
-def _telegram_send(chat_id: str | int, text: str) -> bool:
+async def _telegram_send(chat_id: str | int, text: str) -> bool:
     if BOT_TOKEN in ("TU_BOT_TOKEN", "") or not text:
         return False
-    try:
-        import httpx
-        url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
-        r = httpx.post(url, json={"chat_id": chat_id, "text": text[:4096]}, timeout=30.0)
-        return r.status_code == 200
-    except Exception as e:
-        logging.getLogger(__name__).warning("[Telegram] %s", e)
-        return False
+    return await _get_entrega().enviar_texto(chat_id, text)
 
 
-def _telegram_send_photo(chat_id: str | int, path: Path, caption: str = "") -> bool:
+async def _telegram_send_photo(chat_id: str | int, path: Path, caption: str = "") -> bool:
     if not path.exists() or BOT_TOKEN in ("TU_BOT_TOKEN", ""):
         return False
-    try:
-        import httpx
-        url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendPhoto"
-        with open(path, "rb") as f:
-            files = {"photo": (path.name, f, "image/png")}
-            data = {"chat_id": chat_id, "caption": (caption or "Captura")[:1024]}
-            r = httpx.post(url, data=data, files=files, timeout=30.0)
-        return r.status_code == 200
-    except Exception as e:
-        logging.getLogger(__name__).warning("[Telegram] %s", e)
-        return False
+    return await _get_entrega().enviar_foto(chat_id, path, caption or "Captura")
 
 
-async def _hacer_captura(url: str, path: Path) -> bool:
+_capturas: Any = None
+
+
+async def _hacer_captura(url: str, path: Path, preset: str = "escritorio") -> bytes | None:
+    """PNG en memoria desde el navegador caliente compartido; guarda copia en evidencia/."""
+    global _capturas
     EVIDENCIA_DIR.mkdir(parents=True, exist_ok=True)
     try:
-        from playwright.async_api import async_playwright
-    except ImportError:
-        return False
-    try:
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=True)
-            page = await browser.new_page()
-            await page.goto(url, wait_until="domcontentloaded", timeout=20_000)
-            await page.screenshot(path=str(path), full_page=True)
-            await browser.close()
-        return path.exists()
+        if _capturas is None:
+            from servicio_capturas import ServicioCapturas
+            _capturas = ServicioCapturas()
+        png = await _capturas.capturar(url, preset=preset)
     except Exception as e:
         logging.getLogger(__name__).warning("[Captura] %s", e)
-        return False
+        return None
+    path.write_bytes(png)
+    return png
 
 
 def _ensure_ffmpeg() -> None:
@@ -193,35 +198,28 @@ def _ensure_ffmpeg() -> None:
         os.environ["PATH"] = f"{BASE}{os.pathsep}{p}"
 
 
-def _transcribir_audio(ruta_audio: Path) -> str:
-    _ensure_ffmpeg()
-    try:
-        import whisper
-    except ImportError:
-        return ""
-    try:
-        model = whisper.load_model(WHISPER_MODEL)
-        r = model.transcribe(str(ruta_audio), language="es", fp16=False)
-        return (r.get("text") or "").strip()
-    except Exception as e:
-        logging.getLogger(__name__).warning("[Whisper] %s", e)
-        return ""
+_transcriptor: Any = None
 
 
-def _oga_a_wav(oga_path: Path) -> Path | None:
-    _ensure_ffmpeg()
-    try:
-        from pydub import AudioSegment
-    except ImportError:
-        return None
+def _get_transcriptor() -> Any:
+    """Pool Whisper residente (un modelo cargado por worker)."""
+    global _transcriptor
+    if _transcriptor is None:
+        _ensure_ffmpeg()
+        from servicio_transcripcion import ServicioTranscripcion
+        _transcriptor = ServicioTranscripcion(WHISPER_MODEL, workers=WHISPER_WORKERS, idioma="es")
+    return _transcriptor
+
+
+async def _transcribir_audio(datos: bytes) -> str:
+    """Bytes OGG de Telegram → ffmpeg (pipe) → PCM en memoria → Whisper."""
+    from servicio_transcripcion import decodificar_audio
     try:
-        wav_path = oga_path.with_suffix(".wav")
-        seg = AudioSegment.from_ogg(str(oga_path))
-        seg.export(str(wav_path), format="wav")
-        return wav_path
+        pcm = await decodificar_audio(datos)
     except Exception as e:
-        logging.getLogger(__name__).warning("[pydub] %s", e)
-        return None
+        logging.getLogger(__name__).warning("[ffmpeg] %s", e)
+        return ""
+    return await _get_transcriptor().transcribir(pcm)
 
 
 def _parsear_comando(texto: str) -> list[str]:
@@ -281,26 +279,37 @@ class _OllamaAdapter:
         return ChatInvokeCompletion(completion=c, usage=None)
 
 
-async def _desplegar_proyecto(clave: str) -> dict[str, str]:
-    info = PROYECTOS.get(clave)
-    if not info:
-        return {}
-    repo = info["repo"]
-    plataformas = info.get("plataforma") or []
-    vercel_project = info.get("vercel_project") or f"{repo}-app"
-    render_service = info.get("render_service") or repo
-    resultado: dict[str, str] = {p: "skip" for p in plataformas}
-    os.environ.setdefault("BROWSER_USE_DOWNLOADS_DIR", str(DOWNLOADS_DIR))
-    os.environ.setdefault("ANONYMIZED_TELEMETRY", "false")
-    os.environ.setdefault("BROWSER_USE_CLOUD_SYNC", "false")
-    _patch_browser_use()
-    from langchain_ollama import ChatOllama
+async def _exportar_sesion() -> Path | None:
+    """Exporta la sesión (login Vercel/Render) del perfil persistente a STORAGE_STATE."""
+    try:
+        from playwright.async_api import async_playwright
+    except ImportError:
+        return STORAGE_STATE if STORAGE_STATE.exists() else None
+    try:
+        async with async_playwright() as p:
+            ctx = await p.chromium.launch_persistent_context(str(CHROME_DATA), headless=True)
+            await ctx.storage_state(path=str(STORAGE_STATE))
+            await ctx.close()
+        return STORAGE_STATE
+    except Exception as e:
+        # Perfil en uso o Chromium no instalado: usar la última exportación si existe
+        logging.getLogger(__name__).warning("[Sesión] %s", e)
+        return STORAGE_STATE if STORAGE_STATE.exists() else None
+
+
+async def _desplegar_plataforma(clave: str, plataforma: str, adapter: Any, sesion: Path | None) -> None:
+    """Un despliegue (proyecto × plataforma) en su propio contexto de navegador aislado."""
     from browser_use import Agent, Browser
-    llm = ChatOllama(model=MODEL_NAVEGADOR, num_ctx=NUM_CTX, temperature=TEMPERATURE)
-    adapter = _OllamaAdapter(llm)
+    info = PROYECTOS[clave]
+    repo = info["repo"]
+    task = TAREAS_PLATAFORMA[plataforma].format(
+        vercel_project=info.get("vercel_project") or f"{repo}-app",
+        render_service=info.get("render_service") or repo,
+    )
     browser = Browser(
         headless=False,
-        user_data_dir=str(CHROME_DATA),
+        user_data_dir=None,
+        storage_state=str(sesion) if sesion else None,
         downloads_path=str(DOWNLOADS_DIR),
         traces_dir=str(TRACES_DIR),
         args=["--disable-blink-features=AutomationControlled", "--no-sandbox"],
@@ -310,32 +319,11 @@ async def _desplegar_proyecto(clave: str) -> dict[str, str]:
     )
     await browser.start()
     try:
-        if "vercel" in plataformas:
-            agent_v = Agent(
-                task=f"En Vercel (vercel.com/dashboard), abre '{vercel_project}', Deploy/Redeploy si existe. Responde OK.",
-                llm=adapter, browser=browser, use_vision=False,
-                llm_timeout=LLM_TIMEOUT_S, step_timeout=STEP_TIMEOUT_S,
-            )
-            try:
-                await asyncio.wait_for(agent_v.run(), timeout=STEP_TIMEOUT_S + 60)
-                resultado["vercel"] = "ok"
-                _excel_append(clave, "vercel", "ok", "Despliegue ejecutado")
-            except Exception as e:
-                resultado["vercel"] = "error"
-                _excel_append(clave, "vercel", "error", str(e)[:500])
-        if "render" in plataformas:
-            agent_r = Agent(
-                task=f"En Render (dashboard.render.com), abre '{render_service}', Deploy/Manual Deploy si existe. Responde OK.",
-                llm=adapter, browser=browser, use_vision=False,
-                llm_timeout=LLM_TIMEOUT_S, step_timeout=STEP_TIMEOUT_S,
-            )
-            try:
-                await asyncio.wait_for(agent_r.run(), timeout=STEP_TIMEOUT_S + 60)
-                resultado["render"] = "ok"
-                _excel_append(clave, "render", "ok", "Despliegue ejecutado")
-            except Exception as e:
-                resultado["render"] = "error"
-                _excel_append(clave, "render", "error", str(e)[:500])
+        agent = Agent(
+            task=task, llm=adapter, browser=browser, use_vision=False,
+            llm_timeout=LLM_TIMEOUT_S, step_timeout=STEP_TIMEOUT_S,
+        )
+        await asyncio.wait_for(agent.run(), timeout=STEP_TIMEOUT_S + 60)
     finally:
         try:
             close = getattr(browser, "close", None) or getattr(browser, "aclose", None)
@@ -345,6 +333,30 @@ async def _desplegar_proyecto(clave: str) -> dict[str, str]:
                     await r
         except Exception:
             pass
+
+
+async def _desplegar_proyectos(claves: list[str], progreso: Any = None) -> dict[str, dict[str, str]]:
+    """Despliega todos los proyectos × plataformas en paralelo (límite y plazo global).
+    Devuelve {proyecto: {plataforma: estado}}."""
+    from planificador_despliegues import PlanificadorDespliegues, TareaDespliegue
+    os.environ.setdefault("BROWSER_USE_DOWNLOADS_DIR", str(DOWNLOADS_DIR))
+    os.environ.setdefault("ANONYMIZED_TELEMETRY", "false")
+    os.environ.setdefault("BROWSER_USE_CLOUD_SYNC", "false")
+    _patch_browser_use()
+    from langchain_ollama import ChatOllama
+    llm = ChatOllama(model=MODEL_NAVEGADOR, num_ctx=NUM_CTX, temperature=TEMPERATURE)
+    adapter = _OllamaAdapter(llm)
+    sesion = await _exportar_sesion()
+    tareas = [
+        TareaDespliegue(clave, plat, lambda c=clave, p=plat: _desplegar_plataforma(c, p, adapter, sesion))
+        for clave in claves if clave in PROYECTOS
+        for plat in (PROYECTOS[clave].get("plataforma") or []) if plat in TAREAS_PLATAFORMA
+    ]
+    planificador = PlanificadorDespliegues(DESPLIEGUE_CONCURRENCIA, DESPLIEGUE_PLAZO_S, progreso)
+    resultado: dict[str, dict[str, str]] = {c: {} for c in claves if c in PROYECTOS}
+    for t in await planificador.ejecutar(tareas):
+        resultado[t.proyecto][t.plataforma] = t.estado
+        _historial_append(t.proyecto, t.plataforma, t.estado, t.detalle or "Despliegue ejecutado", t.duracion_s)
     return resultado
 
 
@@ -353,24 +365,18 @@ async def _handle_voice(update: Any, context: Any) -> None:
     chat_id = u.effective_chat.id if u.effective_chat else None
     if not chat_id:
         return
-    await u.message.reply_text("Procesando audio…")
+    en_cola = _get_transcriptor().en_cola()
+    await u.message.reply_text(f"Procesando audio… (en cola: {en_cola})" if en_cola else "Procesando audio…")
     voice = u.message.voice
     if not voice:
         await u.message.reply_text("No se detectó audio.")
         return
     file = await context.bot.get_file(voice.file_id)
-    AUDIO_DIR.mkdir(parents=True, exist_ok=True)
-    oga_path = AUDIO_DIR / f"voice_{chat_id}_{voice.file_unique_id}.oga"
-    await file.download_to_drive(oga_path)
-    wav_path = _oga_a_wav(oga_path)
-    transcribe_path = wav_path if wav_path and wav_path.exists() else oga_path
-    texto = _transcribir_audio(transcribe_path)
-    try:
-        oga_path.unlink(missing_ok=True)
-        if wav_path and wav_path.exists():
-            wav_path.unlink(missing_ok=True)
-    except Exception:
-        pass
+    datos = bytes(await file.download_as_bytearray())
+    if AUDIO_DEBUG:
+        AUDIO_DIR.mkdir(parents=True, exist_ok=True)
+        (AUDIO_DIR / f"voice_{chat_id}_{voice.file_unique_id}.oga").write_bytes(datos)
+    texto = await _transcribir_audio(datos)
     if not texto:
         await u.message.reply_text("No pude transcribir el audio. ¿Puedes repetir?")
         return
@@ -381,25 +387,35 @@ async def _handle_voice(update: Any, context: Any) -> None:
             "No detecté ningún proyecto. Prueba: «Despliega la panadería», «Actualiza todo»."
         )
         return
-    await u.message.reply_text(f"🚀 Desplegando: {', '.join(proyectos)}. Te aviso al terminar.")
+    await u.message.reply_text(f"🚀 Desplegando: {', '.join(proyectos)}. Te aviso de cada paso.")
+    _voice_say(f"Iniciando despliegue de {', '.join(proyectos)}.")
+
+    async def _progreso(t: Any) -> None:
+        if t.estado == "en_curso":
+            await u.message.reply_text(f"⏳ {t.proyecto}/{t.plataforma}: en curso")
+            return
+        icon = "✅" if t.estado == "ok" else "⌛" if t.estado == "timeout" else "❌"
+        detalle = f" — {t.detalle[:200]}" if t.detalle else ""
+        await u.message.reply_text(f"{icon} {t.proyecto}/{t.plataforma}: {t.estado} ({t.duracion_s:.0f} s){detalle}")
+
     resultados_proyecto: dict[str, str] = {}
-    for clave in proyectos:
-        _voice_say(f"Iniciando despliegue de {clave}.")
-        try:
-            res = await _desplegar_proyecto(clave)
-            ok = all(s == "ok" for _, s in res.items() if s != "skip")
+    try:
+        res = await _desplegar_proyectos(proyectos, _progreso)
+        for clave, estados in res.items():
+            ok = bool(estados) and all(s == "ok" for s in estados.values())
             resultados_proyecto[clave] = "Éxito" if ok else "Error"
-        except Exception as e:
+    except Exception as e:
+        for clave in proyectos:
             resultados_proyecto[clave] = "Error"
-            _excel_append(clave, "general", "error", str(e)[:500])
-            logging.getLogger(__name__).exception("Despliegue %s", clave)
+            _historial_append(clave, "general", "error", str(e)[:500])
+        logging.getLogger(__name__).exception("Despliegue %s", proyectos)
     _voice_say("Despliegues terminados.")
     lineas = [f"{'✅' if v == 'Éxito' else '❌'} {k}: {v}" for k, v in resultados_proyecto.items()]
     await u.message.reply_text(" | ".join(lineas) if lineas else "Sin resultados.")
 
 
 def main() -> None:
-    for d in (CHROME_DATA, DOWNLOADS_DIR, TRACES_DIR, AUDIO_DIR, EVIDENCIA_DIR):
+    for d in (CHROME_DATA, DOWNLOADS_DIR, TRACES_DIR, EVIDENCIA_DIR):
         d.mkdir(parents=True, exist_ok=True)
     logging.basicConfig(
         level=logging.INFO,
@@ -431,30 +447,70 @@ def main() -> None:
         chat_id = update.effective_chat.id if update.effective_chat else None
         if not chat_id:
             return
+        movil = bool(context.args) and context.args[0].lower() in ("movil", "móvil", "mobile")
         await msg.reply_text("Capturando página…")
-        ok = await _hacer_captura(CAPTURA_URL, CAPTURA_COMPROBACION)
-        if ok:
-            _telegram_send_photo(chat_id, CAPTURA_COMPROBACION, f"Captura de comprobación — {CAPTURA_URL}")
+        png = await _hacer_captura(CAPTURA_URL, CAPTURA_COMPROBACION, "movil" if movil else "escritorio")
+        if png:
+            await _get_entrega().enviar_foto(chat_id, png, f"Captura de comprobación — {CAPTURA_URL}")
             await msg.reply_text("Captura enviada.")
         else:
             await msg.reply_text("Error al capturar la página.")
 
+    async def _cmd_estado(update: Update, context: Any) -> None:
+        e = _get_transcriptor().estadisticas()
+        await (update.message or update.effective_message).reply_text(
+            f"Whisper ({e['modelo']}, {e['workers']} workers): en curso {e['en_curso']}, en cola {e['en_cola']}, "
+            f"procesados {e['procesados']}, errores {e['errores']}. "
+            f"Latencia última {e['latencia_ultima_s']} s, p50 {e['latencia_p50_s']} s, p95 {e['latencia_p95_s']} s."
+        )
+
+    async def _cmd_historial(update: Update, context: Any) -> None:
+        from historial_despliegues import HistorialDespliegues
+        h = HistorialDespliegues()
+        lineas = ["Últimos despliegues:"]
+        for r in h.ultimos(5):
+            dur = f" {r['duracion_s']:.0f} s" if r["duracion_s"] is not None else ""
+            lineas.append(f"• {r['fecha']} {r['proyecto']}/{r['plataforma']}: {r['estado']}{dur}")
+        lineas.append("Tasa de éxito:")
+        for e in h.estadisticas():
+            media = f", media {e['duracion_media_s']} s" if e["duracion_media_s"] is not None else ""
+            lineas.append(f"• {e['proyecto']}/{e['plataforma']}: {e['ok']}/{e['total']} ({e['tasa_exito']:.0%}){media}")
+        await (update.message or update.effective_message).reply_text("\n".join(lineas))
+
+    async def _post_init(a: Application) -> None:
+        await _get_transcriptor().precalentar()
+
+    async def _post_shutdown(a: Application) -> None:
+        global _entrega, _capturas
+        if _entrega is not None:
+            await _entrega.cerrar()
+            _entrega = None
+        if _capturas is not None:
+            await _capturas.cerrar()
+            _capturas = None
+
     def _build_app() -> Application:
-        a = Application.builder().token(BOT_TOKEN).build()
+        a = Application.builder().token(BOT_TOKEN).post_init(_post_init).post_shutdown(_post_shutdown).build()
         a.add_handler(CommandHandler("ping", _cmd_ping))
         a.add_handler(CommandHandler("start", _cmd_ping))
         a.add_handler(CommandHandler("captura", _cmd_captura))
+        a.add_handler(CommandHandler("estado", _cmd_estado))
+        a.add_handler(CommandHandler("historial", _cmd_historial))
         a.add_handler(MessageHandler(filters.VOICE, _handle_voice))
         return a
 
-    log.info("ATLAS RAULI — /ping, /captura, voz para desplegar (rauli-panaderia).")
-    while True:
-        try:
-            app = _build_app()
-            app.run_polling(allowed_updates=Update.ALL_TYPES, drop_pending_updates=True)
-        except Exception as e:
-            log.warning("Polling terminó o error: %s. Reconectando en 10 s…", e)
-            time.sleep(10)
+    log.info("ATLAS RAULI — /ping, /captura, /estado, /historial, voz para desplegar (rauli-panaderia).")
+    try:
+        while True:
+            try:
+                app = _build_app()
+                app.run_polling(allowed_updates=Update.ALL_TYPES, drop_pending_updates=True)
+            except Exception as e:
+                log.warning("Polling terminó o error: %s. Reconectando en 10 s…", e)
+                time.sleep(10)
+    finally:
+        if _transcriptor is not None:
+            _transcriptor.cerrar()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+planificador_despliegues.py — Ejecuta despliegues (proyecto × plataforma) en paralelo.
+
+- Límite de concurrencia (semaphore): como mucho N tareas a la vez.
+- Plazo global: al agotarse, las tareas en curso se cancelan y las pendientes no arrancan.
+- Progreso: callback async por cada cambio de estado (en_curso, ok, error, timeout).
+  Un timeout propio de la tarea se distingue en el detalle del plazo global.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+ESTADOS_FINALES = ("ok", "error", "timeout")
+
+
+@dataclass
+class TareaDespliegue:
+    proyecto: str
+    plataforma: str
+    ejecutar: Callable[[], Awaitable[object]]
+    estado: str = "pendiente"
+    detalle: str = ""
+    duracion_s: float = 0.0
+
+
+Progreso = Callable[[TareaDespliegue], Awaitable[None]]
+
+
+class PlanificadorDespliegues:
+    def __init__(self, concurrencia: int = 3, plazo_s: float = 900, progreso: Progreso | None = None) -> None:
+        self.concurrencia = max(1, concurrencia)
+        self.plazo_s = plazo_s
+        self.progreso = progreso
+        self._log = logging.getLogger(__name__)
+
+    async def _avisar(self, tarea: TareaDespliegue) -> None:
+        if self.progreso is None:
+            return
+        try:
+            await self.progreso(tarea)
+        except Exception as e:
+            # Un fallo al informar (p. ej. Telegram) no debe tumbar el despliegue
+            self._log.warning("[Planificador] progreso: %s", e)
+
+    async def ejecutar(self, tareas: list[TareaDespliegue]) -> list[TareaDespliegue]:
+        """Ejecuta todas las tareas y devuelve la misma lista con estado/detalle/duración."""
+        loop = asyncio.get_running_loop()
+        limite = loop.time() + self.plazo_s
+        sem = asyncio.Semaphore(self.concurrencia)
+
+        async def _una(t: TareaDespliegue) -> None:
+            async with sem:
+                restante = limite - loop.time()
+                if restante <= 0:
+                    t.estado, t.detalle = "timeout", "Plazo global agotado antes de empezar"
+                    await self._avisar(t)
+                    return
+                t.estado = "en_curso"
+                await self._avisar(t)
+                t0 = time.perf_counter()
+                try:
+                    await asyncio.wait_for(t.ejecutar(), timeout=restante)
+                    t.estado = "ok"
+                except asyncio.TimeoutError as e:
+                    # También llega aquí el timeout propio de la tarea (p. ej. el de cada agente)
+                    if loop.time() >= limite:
+                        t.estado, t.detalle = "timeout", f"Plazo global de {self.plazo_s:.0f} s agotado"
+                    else:
+                        t.estado, t.detalle = "timeout", f"Tiempo agotado en la propia tarea{': ' + str(e) if str(e) else ''}"[:500]
+                except Exception as e:
+                    t.estado, t.detalle = "error", str(e)[:500]
+                t.duracion_s = time.perf_counter() - t0
+                self._log.info("[Planificador] %s/%s -> %s en %.1f s", t.proyecto, t.plataforma, t.estado, t.duracion_s)
+                await self._avisar(t)
+
+        await asyncio.gather(*(_una(t) for t in tareas))
+        return tareas
@@ -2,7 +2,7 @@
 """
 robot_preparar_todo.py — Descarga, instala y comprueba bot (rauli-panaderia).
 
-  1. pip install (whisper, pydub, python-telegram-bot, pyttsx3, ...)
+  1. pip install (whisper, python-telegram-bot, pyttsx3, ...)
   2. ffmpeg (robot_instalar_ffmpeg --download)
   3. getMe + sendMessage verificación
 
@@ -18,7 +18,7 @@ from pathlib import Path
 BASE = Path(__file__).resolve().parent
 ROOT = BASE.parent
 PIP_DEPS = [
-    "openai-whisper", "pydub", "python-telegram-bot", "pyttsx3",
+    "openai-whisper", "python-telegram-bot", "pyttsx3",
     "pandas", "openpyxl", "httpx", "Pillow", "browser-use", "langchain-ollama", "ollama",
 ]
 LOG: list[str] = []
@@ -3,14 +3,30 @@
 Protocolo de Inteligencia Híbrida — A prueba de fallos.
 Servicio unificado: Gemini → Groq → Ollama (offline).
 
+Las llamadas pasan por un enrutador con circuit breakers (enrutador_ia.py): un proveedor caído o
+con cuota agotada se salta hasta su prueba de reapertura, y cada llamada va primero al más sano.
+generar_respuesta_async() es la versión para asyncio, con hedging entre proveedores.
+Las respuestas se guardan en la caché local (cache_ia.py): la misma pregunta no vuelve a la red.
+Los clientes (Gemini, Groq, sesión HTTP de Ollama) se crean una vez y se reutilizan (clientes_ia.py).
+generar_respuesta_stream() entrega el texto por trozos según llega (async, cancelable).
+
 Carga GEMINI_API_KEY y GROQ_API_KEY desde la Bóveda Maestra (dotenv).
-Prueba: python robot/servicio_ia.py  → diagnóstico de los tres proveedores.
+Prueba: python robot/servicio_ia.py [--sin-cache]  → diagnóstico de los tres proveedores.
 """
 from __future__ import annotations
 
+import asyncio
+import json
 import os
 import sys
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
 from pathlib import Path
+from typing import AsyncIterator
+
+from cache_ia import cache_ia
+from clientes_ia import registro_clientes
+from enrutador_ia import EnrutadorIA
 
 BASE = Path(__file__).resolve().parent
 if (BASE / "packages").exists() and str(BASE / "packages") not in sys.path:
@@ -59,7 +75,9 @@ GEMINI_KEY_NAMES = ("GEMINI_API_KEY", "GEMINI_KEY", "AI_API_KEY")
 GROQ_KEY_NAMES = ("GROQ_API_KEY", "GROQ_KEY")
 OLLAMA_BASE = os.environ.get("OLLAMA_BASE", "http://localhost:11434")
 OLLAMA_MODEL = os.environ.get("OLLAMA_MODEL", "llama3.1")
+GEMINI_MODEL = "gemini-2.0-flash"
 GROQ_MODELS = ("llama3-8b-8192", "mixtral-8x7b-32768", "llama3-70b-8192")
+GROQ_MAX_TOKENS = 1024
 
 
 def _get_gemini_key() -> str:
@@ -83,12 +101,7 @@ def _llamar_gemini(mensaje: str) -> str:
     key = _get_gemini_key()
     if not key:
         raise RuntimeError("GEMINI_API_KEY no encontrada en la Bóveda.")
-    import warnings
-    with warnings.catch_warnings():
-        warnings.simplefilter("ignore", FutureWarning)
-        import google.generativeai as genai
-    genai.configure(api_key=key)
-    model = genai.GenerativeModel("gemini-2.0-flash")
+    model = registro_clientes().gemini(key, GEMINI_MODEL)
     r = model.generate_content(mensaje)
     if not r or not r.text:
         raise RuntimeError("Gemini devolvió respuesta vacía.")
@@ -100,18 +113,26 @@ def _llamar_groq(mensaje: str) -> str:
     key = _get_groq_key()
     if not key:
         raise RuntimeError("GROQ_API_KEY no encontrada en la Bóveda.")
-    from groq import Groq
-    client = Groq(api_key=key)
-    for model_id in GROQ_MODELS:
+    client = registro_clientes().groq(key)
+
+    def _completar(model_id: str) -> str:
+        completion = client.chat.completions.create(
+            model=model_id,
+            messages=[{"role": "user", "content": mensaje}],
+            max_tokens=GROQ_MAX_TOKENS,
+        )
+        text = (completion.choices[0].message.content or "").strip()
+        if not text:
+            raise RuntimeError(f"{model_id}: respuesta vacía")
+        return text
+
+    # Cada modelo tiene su circuito: los retirados o saturados se saltan en vez de reintentarse
+    claves = _ENRUTADOR.ordenar([f"groq:{m}" for m in GROQ_MODELS])
+    for clave in claves:
+        if not _ENRUTADOR.circuito(clave).permitir():
+            continue
         try:
-            completion = client.chat.completions.create(
-                model=model_id,
-                messages=[{"role": "user", "content": mensaje}],
-                max_tokens=1024,
-            )
-            text = (completion.choices[0].message.content or "").strip()
-            if text:
-                return text
+            return _ENRUTADOR.medir(clave, lambda: _completar(clave.split(":", 1)[1]))
         except Exception:
             continue
     raise RuntimeError("Groq no respondió con ningún modelo.")
@@ -119,11 +140,10 @@ def _llamar_groq(mensaje: str) -> str:
 
 # --- FALLO 2: Ollama (offline) ---
 def _llamar_ollama(mensaje: str) -> str:
-    import requests
     url = f"{OLLAMA_BASE.rstrip('/')}/api/generate"
     payload = {"model": OLLAMA_MODEL, "prompt": mensaje, "stream": False}
     try:
-        r = requests.post(url, json=payload, timeout=30)
+        r = registro_clientes().sesion_http().post(url, json=payload, timeout=30)
         r.raise_for_status()
         data = r.json()
         text = (data.get("response") or "").strip()
@@ -134,64 +154,281 @@ def _llamar_ollama(mensaje: str) -> str:
     raise RuntimeError("Ollama devolvió respuesta vacía.")
 
 
-def generar_respuesta(mensaje: str) -> tuple[str, str]:
+_ENRUTADOR = EnrutadorIA({"gemini": _llamar_gemini, "groq": _llamar_groq, "ollama": _llamar_ollama})
+
+
+# El diagnóstico solo comprueba conectividad: su caché dura poco
+TTL_DIAGNOSTICO_S = 300
+
+
+def _modelo_cache() -> str:
+    """Cadena de modelos de la respuesta híbrida: cambiar uno no debe servir respuestas del anterior."""
+    return ",".join([f"gemini:{GEMINI_MODEL}", *(f"groq:{m}" for m in GROQ_MODELS), f"ollama:{OLLAMA_MODEL}"])
+
+
+def _clave_cache(mensaje: str) -> str:
+    return cache_ia().clave(mensaje, "hibrido", _modelo_cache(), max_tokens=GROQ_MAX_TOKENS)
+
+
+def generar_respuesta(mensaje: str, cubrir: bool = False, retraso_s: float | None = None,
+                      ttl_s: float | None = None, sin_cache: bool = False) -> tuple[str, str]:
     """
-    Función maestra: intenta Gemini → Groq → Ollama.
+    Función maestra: Gemini → Groq → Ollama, ordenados por salud y saltando circuitos abiertos.
+    Con cubrir=True usa hedging (ver generar_respuesta_async); desde código async usar esa.
+    Las respuestas se cachean ttl_s segundos (defecto IA_CACHE_TTL_S); sin_cache=True la salta.
     Devuelve (texto_respuesta, proveedor_usado).
     """
-    # INTENTO 1: Gemini
-    try:
-        texto = _llamar_gemini(mensaje)
-        return (texto, "gemini")
-    except Exception:
-        pass
+    if cubrir:
+        # Ejecutor propio: al ganar uno no se espera a que terminen los intentos perdedores
+        ejecutor = ThreadPoolExecutor(max_workers=len(_ENRUTADOR.proveedores), thread_name_prefix="ia-cubrir")
+        try:
+            return asyncio.run(generar_respuesta_async(mensaje, True, retraso_s, ttl_s, sin_cache, ejecutor))
+        finally:
+            ejecutor.shutdown(wait=False)
+
+    def _llamar() -> tuple[str, str]:
+        try:
+            return _ENRUTADOR.llamar(mensaje)
+        except RuntimeError as e:
+            raise _error_todos(e) from e
 
-    # FALLO 1: Groq
+    texto, proveedor, _ = cache_ia().consultar(
+        mensaje, _llamar, "hibrido", _modelo_cache(), ttl_s=ttl_s, sin_cache=sin_cache, max_tokens=GROQ_MAX_TOKENS,
+    )
+    return texto, proveedor
+
+
+async def generar_respuesta_async(mensaje: str, cubrir: bool = True, retraso_s: float | None = None,
+                                  ttl_s: float | None = None, sin_cache: bool = False,
+                                  ejecutor: Executor | None = None) -> tuple[str, str]:
+    """
+    Versión async (no bloquea el loop del bot). Con cubrir=True lanza el proveedor más sano y, si no
+    ha respondido en retraso_s (por defecto su p90 de latencia), también el siguiente: gana la
+    primera respuesta buena y la otra se cancela. Los intentos corren en `ejecutor` (por defecto,
+    el del loop). Devuelve (texto_respuesta, proveedor_usado).
+    """
+    cache = cache_ia()
+    clave = _clave_cache(mensaje)
+    if not sin_cache and (valor := cache.obtener(clave)):
+        return valor
     try:
-        texto = _llamar_groq(mensaje)
-        return (texto, "groq")
-    except Exception:
-        pass
+        if cubrir:
+            texto, proveedor = await _ENRUTADOR.llamar_cubierto(mensaje, retraso_s, ejecutor=ejecutor)
+        else:
+            texto, proveedor = await asyncio.get_running_loop().run_in_executor(ejecutor, _ENRUTADOR.llamar, mensaje)
+    except RuntimeError as e:
+        raise _error_todos(e) from e
+    if not sin_cache:
+        cache.guardar(clave, texto, proveedor, _modelo_cache(), ttl_s)
+    return texto, proveedor
+
+
+# --- Streaming async ---
+async def _stream_gemini(mensaje: str) -> AsyncIterator[str]:
+    key = _get_gemini_key()
+    if not key:
+        raise RuntimeError("GEMINI_API_KEY no encontrada en la Bóveda.")
+    model = registro_clientes().gemini_async(key, GEMINI_MODEL)
+    respuesta = await model.generate_content_async(mensaje, stream=True)
+    async for trozo in respuesta:
+        texto = getattr(trozo, "text", "")
+        if texto:
+            yield texto
+
+
+async def _stream_groq(mensaje: str) -> AsyncIterator[str]:
+    key = _get_groq_key()
+    if not key:
+        raise RuntimeError("GROQ_API_KEY no encontrada en la Bóveda.")
+    client = registro_clientes().groq_async(key)
+    for clave in _ENRUTADOR.ordenar([f"groq:{m}" for m in GROQ_MODELS]):
+        circuito = _ENRUTADOR.circuito(clave)
+        if not circuito.permitir():
+            continue
+        t0 = time.monotonic()
+        try:
+            stream = await client.chat.completions.create(
+                model=clave.split(":", 1)[1],
+                messages=[{"role": "user", "content": mensaje}],
+                max_tokens=GROQ_MAX_TOKENS,
+                stream=True,
+            )
+        except Exception as e:
+            circuito.fallo(e)
+            continue
+        except BaseException:
+            circuito.liberar()
+            raise
+        try:
+            async for trozo in stream:
+                texto = trozo.choices[0].delta.content if trozo.choices else None
+                if texto:
+                    yield texto
+        except Exception as e:
+            circuito.fallo(e)
+            raise
+        except BaseException:
+            circuito.liberar()
+            raise
+        finally:
+            await stream.close()
+        circuito.exito(time.monotonic() - t0)
+        return
+    raise RuntimeError("Groq no respondió con ningún modelo.")
+
 
-    # FALLO 2: Ollama (offline)
+async def _stream_ollama(mensaje: str) -> AsyncIterator[str]:
+    url = f"{OLLAMA_BASE.rstrip('/')}/api/generate"
+    payload = {"model": OLLAMA_MODEL, "prompt": mensaje, "stream": True}
     try:
-        texto = _llamar_ollama(mensaje)
-        return (texto, "ollama")
+        async with registro_clientes().http_async().stream("POST", url, json=payload) as r:
+            r.raise_for_status()
+            # NDJSON: una línea {"response": "...", "done": false} por trozo
+            async for linea in r.aiter_lines():
+                if not linea.strip():
+                    continue
+                datos = json.loads(linea)
+                if datos.get("response"):
+                    yield datos["response"]
+                if datos.get("done"):
+                    return
     except Exception as e:
-        raise RuntimeError(
-            "Los tres proveedores fallaron (Gemini, Groq, Ollama). "
-            "Comprueba claves en la Bóveda, conexión a internet y que Ollama esté en ejecución."
-        ) from e
+        # La cancelación (CancelledError) no es Exception: se propaga tal cual
+        raise RuntimeError(f"Ollama no disponible: {e}") from e
+
+
+_STREAMS = {"gemini": _stream_gemini, "groq": _stream_groq, "ollama": _stream_ollama}
+
+
+class FlujoRespuesta:
+    """
+    Respuesta en streaming: `async for trozo in flujo` entrega el texto según llega.
+    Tras el primer trozo quedan proveedor y ttft_s; al terminar, texto tiene la respuesta completa.
+    Si un proveedor falla antes del primer trozo se pasa al siguiente; si falla a mitad, se lanza
+    RuntimeError (el texto parcial ya se entregó). Cancelar la tarea o salir del bucle (o
+    `await flujo.cancelar()`) cierra la conexión con el proveedor.
+    """
+
+    def __init__(self, mensaje: str, ttl_s: float | None = None, sin_cache: bool = False) -> None:
+        self.mensaje = mensaje
+        self.ttl_s = ttl_s
+        self.sin_cache = sin_cache
+        self.proveedor = ""
+        self.texto = ""
+        self.ttft_s: float | None = None
+        self.desde_cache = False
+        self._gen = self._generar()
+
+    def __aiter__(self) -> "FlujoRespuesta":
+        return self
+
+    async def __anext__(self) -> str:
+        return await self._gen.__anext__()
+
+    async def __aenter__(self) -> "FlujoRespuesta":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.cancelar()
+
+    async def cancelar(self) -> None:
+        await self._gen.aclose()
+
+    async def _generar(self) -> AsyncIterator[str]:
+        t0 = time.monotonic()
+        cache = cache_ia()
+        clave = _clave_cache(self.mensaje)
+        if not self.sin_cache and (valor := cache.obtener(clave)):
+            self.texto, self.proveedor = valor
+            self.desde_cache, self.ttft_s = True, time.monotonic() - t0
+            yield self.texto
+            return
+
+        errores: dict[str, str] = {}
+        for nombre in _ENRUTADOR.ordenar(list(_STREAMS)):
+            circuito = _ENRUTADOR.circuito(nombre)
+            if not circuito.permitir():
+                errores[nombre] = "circuito abierto"
+                continue
+            inicio = time.monotonic()
+            partes: list[str] = []
+            stream = _STREAMS[nombre](self.mensaje)
+            try:
+                async for trozo in stream:
+                    if not partes:
+                        self.proveedor, self.ttft_s = nombre, time.monotonic() - t0
+                    partes.append(trozo)
+                    yield trozo
+            except Exception as e:
+                circuito.fallo(e)
+                if partes:
+                    raise RuntimeError(f"{nombre} cortó la respuesta: {e}") from e
+                errores[nombre] = str(e)[:120]
+                continue
+            except BaseException:
+                # Cancelación o cierre del consumidor: no cuenta como fallo del proveedor
+                circuito.liberar()
+                raise
+            finally:
+                await stream.aclose()
+            if not partes:
+                circuito.fallo("respuesta vacía")
+                errores[nombre] = "respuesta vacía"
+                continue
+            circuito.exito(time.monotonic() - inicio)
+            self.texto = "".join(partes).strip()
+            if not self.sin_cache:
+                cache.guardar(clave, self.texto, nombre, _modelo_cache(), self.ttl_s)
+            return
+        raise _error_todos(RuntimeError("; ".join(f"{n}: {e}" for n, e in errores.items())))
+
+
+def generar_respuesta_stream(mensaje: str, ttl_s: float | None = None, sin_cache: bool = False) -> FlujoRespuesta:
+    """
+    Versión async en streaming (para el bot de Telegram y el asistente):
+
+        flujo = generar_respuesta_stream("Hola")
+        async for trozo in flujo:
+            ...
+        flujo.proveedor, flujo.ttft_s, flujo.texto
+    """
+    return FlujoRespuesta(mensaje, ttl_s, sin_cache)
+
+
+def _error_todos(e: Exception) -> RuntimeError:
+    return RuntimeError(
+        "Los tres proveedores fallaron (Gemini, Groq, Ollama). "
+        "Comprueba claves en la Bóveda, conexión a internet y que Ollama esté en ejecución. "
+        f"Detalle: {e}"
+    )
 
 
-def diagnosticar() -> dict[str, str]:
+def estado_proveedores() -> dict[str, dict]:
+    """Estado del circuito, tasa de éxito y latencia por proveedor y modelo."""
+    return _ENRUTADOR.resumen()
+
+
+def diagnosticar(usar_cache: bool = True) -> dict[str, str]:
     """
     Prueba conexión con Gemini, Groq y Ollama.
-    Devuelve {"gemini": "OK"|"error", "groq": ..., "ollama": ...}.
+    Devuelve {"gemini": "OK"|"OK (caché)"|"error", "groq": ..., "ollama": ...}.
+    Un OK de hace menos de TTL_DIAGNOSTICO_S se reutiliza salvo usar_cache=False.
     """
     resultado = {}
     mensaje_prueba = "Responde solo: OK"
+    cache = cache_ia()
 
-    # Gemini
-    try:
-        _llamar_gemini(mensaje_prueba)
-        resultado["gemini"] = "OK"
-    except Exception as e:
-        resultado["gemini"] = str(e)[:80]
-
-    # Groq
-    try:
-        _llamar_groq(mensaje_prueba)
-        resultado["groq"] = "OK"
-    except Exception as e:
-        resultado["groq"] = str(e)[:80]
-
-    # Ollama
-    try:
-        _llamar_ollama(mensaje_prueba)
-        resultado["ollama"] = "OK"
-    except Exception as e:
-        resultado["ollama"] = str(e)[:80]
+    # Se llama a los tres sin saltar circuitos, pero el resultado alimenta su salud
+    modelos = {"gemini": GEMINI_MODEL, "groq": ",".join(GROQ_MODELS), "ollama": OLLAMA_MODEL}
+    for nombre, fn in (("gemini", _llamar_gemini), ("groq", _llamar_groq), ("ollama", _llamar_ollama)):
+        try:
+            _, _, desde_cache = cache.consultar(
+                mensaje_prueba, lambda: (_ENRUTADOR.medir(nombre, lambda: fn(mensaje_prueba)), nombre),
+                nombre, modelos[nombre], ttl_s=TTL_DIAGNOSTICO_S, sin_cache=not usar_cache,
+            )
+            resultado[nombre] = "OK (caché)" if desde_cache else "OK"
+        except Exception as e:
+            resultado[nombre] = str(e)[:80]
 
     return resultado
 
@@ -200,13 +437,14 @@ def main() -> int:
     print("=== Protocolo de Inteligencia Híbrida — Diagnóstico ===\n")
     print("Bóveda: C:\\dev\\credenciales.txt (y fallbacks)\n")
 
-    # Diagnóstico
-    diag = diagnosticar()
+    # Diagnóstico (--sin-cache: comprobar de verdad aunque haya un OK reciente)
+    sin_cache = "--sin-cache" in sys.argv
+    diag = diagnosticar(usar_cache=not sin_cache)
     for proveedor, estado in diag.items():
-        icon = "[OK]" if estado == "OK" else "[X]"
+        icon = "[OK]" if estado.startswith("OK") else "[X]"
         print(f"  {icon} {proveedor.upper():8} -> {estado}")
 
-    ok = sum(1 for v in diag.values() if v == "OK")
+    ok = sum(1 for v in diag.values() if v.startswith("OK"))
     print(f"\n  Resumen: {ok}/3 proveedores disponibles.\n")
 
     if ok == 0:
@@ -216,10 +454,17 @@ def main() -> int:
     # Prueba real de generar_respuesta
     print("=== Prueba generar_respuesta('Hola') ===\n")
     try:
-        texto, proveedor = generar_respuesta("Hola")
+        texto, proveedor = generar_respuesta("Hola", sin_cache=sin_cache)
         print(f"  Proveedor usado: {proveedor.upper()}")
         print(f"  Respuesta: {texto[:200]}{'...' if len(texto) > 200 else ''}\n")
         print("  [OK] Servicio híbrido operativo.")
+        print("\n=== Salud de proveedores ===\n")
+        for clave, info in estado_proveedores().items():
+            lat = f"{info['latencia_s']:.2f} s" if info["latencia_s"] is not None else "-"
+            print(f"  {clave:28} {info['estado']:11} éxito {info['tasa_exito']:.0%}  latencia {lat}")
+        print("\n=== Reutilización de clientes ===\n")
+        for proveedor, info in registro_clientes().estadisticas().items():
+            print(f"  {proveedor:8} " + ", ".join(f"{k} {v}" for k, v in info.items()))
         return 0
     except Exception as e:
         print(f"  [ERROR] {e}", file=sys.stderr)
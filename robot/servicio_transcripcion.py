@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+servicio_transcripcion.py — Transcripción Whisper residente para el bot de voz.
+
+Cada proceso del pool carga el modelo Whisper una sola vez (initializer) y lo reutiliza
+para todas las notas de voz. El bot envía trabajo con `await servicio.transcribir(...)`,
+que no bloquea el event loop de python-telegram-bot.
+
+Decodificación en memoria: decodificar_audio() pasa los bytes OGG/Opus de Telegram a ffmpeg
+por un pipe y recibe PCM 16 kHz mono float32 (lo que Whisper espera), sin .oga/.wav en disco.
+
+Métricas: notas en cola / en curso y latencia por nota (estadisticas()).
+Si un worker muere (OOM, crash de torch) el pool queda roto: se descarta, se crea otro y la nota
+se reintenta una vez.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any
+
+SAMPLE_RATE = 16_000  # Whisper trabaja a 16 kHz mono
+
+# Estado por proceso worker (no se comparte con el proceso del bot)
+_MODELO: Any = None
+
+
+def _init_worker(nombre_modelo: str) -> None:
+    """Initializer del pool: carga Whisper una vez por proceso."""
+    global _MODELO
+    try:
+        import whisper
+    except ImportError:
+        _MODELO = None
+        return
+    _MODELO = whisper.load_model(nombre_modelo)
+
+
+def _ping_worker() -> bool:
+    return _MODELO is not None
+
+
+def _transcribir_en_worker(audio: Any, idioma: str) -> tuple[str, float]:
+    """Se ejecuta en el worker. Devuelve (texto, segundos_de_decodificación)."""
+    if _MODELO is None:
+        raise RuntimeError("Whisper no disponible en el worker (pip install openai-whisper).")
+    t0 = time.perf_counter()
+    r = _MODELO.transcribe(audio, language=idioma, fp16=False)
+    return (r.get("text") or "").strip(), time.perf_counter() - t0
+
+
+async def decodificar_audio(datos: bytes, ffmpeg: str = "ffmpeg") -> Any:
+    """OGG/Opus (o cualquier formato que lea ffmpeg) → numpy float32 16 kHz mono, todo por pipes."""
+    import numpy as np
+    proc = await asyncio.create_subprocess_exec(
+        ffmpeg, "-nostdin", "-hide_banner", "-loglevel", "error",
+        "-i", "pipe:0", "-f", "f32le", "-acodec", "pcm_f32le", "-ac", "1", "-ar", str(SAMPLE_RATE), "pipe:1",
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    pcm, err = await proc.communicate(datos)
+    if proc.returncode != 0 or not pcm:
+        raise RuntimeError(f"ffmpeg no pudo decodificar el audio: {err.decode(errors='ignore').strip()[:200]}")
+    return np.frombuffer(pcm, dtype=np.float32)
+
+
+class ServicioTranscripcion:
+    """Pool de procesos con el modelo Whisper residente."""
+
+    def __init__(self, modelo: str = "base", workers: int = 2, idioma: str = "es") -> None:
+        self.modelo = modelo
+        self.workers = max(1, workers)
+        self.idioma = idioma
+        self._pool: ProcessPoolExecutor | None = None
+        self._pendientes = 0
+        self._procesados = 0
+        self._errores = 0
+        self._latencias: deque[float] = deque(maxlen=200)
+        self._log = logging.getLogger(__name__)
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: igual en Windows y Linux, y seguro con hilos de PTB/torch
+            ctx = multiprocessing.get_context("spawn")
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=ctx,
+                initializer=_init_worker,
+                initargs=(self.modelo,),
+            )
+        return self._pool
+
+    def _descartar_pool(self, pool: ProcessPoolExecutor) -> None:
+        # Varias notas pueden ver el mismo pool roto: solo la primera lo sustituye
+        if self._pool is pool:
+            self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    async def precalentar(self) -> bool:
+        """Arranca los workers y espera a que carguen el modelo."""
+        loop = asyncio.get_running_loop()
+        pool = self._get_pool()
+        t0 = time.perf_counter()
+        oks = await asyncio.gather(
+            *(loop.run_in_executor(pool, _ping_worker) for _ in range(self.workers)),
+            return_exceptions=True,
+        )
+        listo = all(ok is True for ok in oks)
+        self._log.info("[Whisper] %d workers (%s) listos=%s en %.1f s", self.workers, self.modelo, listo, time.perf_counter() - t0)
+        return listo
+
+    async def transcribir(self, audio: Path | str | Any) -> str:
+        """Transcribe una nota (ruta o array PCM de decodificar_audio). Devuelve "" si falla."""
+        if isinstance(audio, Path):
+            audio = str(audio)
+        loop = asyncio.get_running_loop()
+        self._pendientes += 1
+        t0 = time.perf_counter()
+        try:
+            for intento in range(2):
+                pool = self._get_pool()
+                try:
+                    texto, t_decod = await loop.run_in_executor(pool, _transcribir_en_worker, audio, self.idioma)
+                    break
+                except BrokenProcessPool as e:
+                    self._descartar_pool(pool)
+                    if intento:
+                        raise
+                    self._log.warning("[Whisper] pool roto (%s): se recrea y se reintenta", e)
+        except Exception as e:
+            self._errores += 1
+            self._log.warning("[Whisper] %s", e)
+            return ""
+        finally:
+            self._pendientes -= 1
+        total = time.perf_counter() - t0
+        self._procesados += 1
+        self._latencias.append(total)
+        self._log.info(
+            "[Whisper] nota en %.2f s (decodificación %.2f s, espera %.2f s); en cola: %d",
+            total, t_decod, total - t_decod, self.en_cola(),
+        )
+        return texto
+
+    def en_cola(self) -> int:
+        """Notas esperando un worker libre (sin contar las que se están decodificando)."""
+        return max(0, self._pendientes - self.workers)
+
+    def estadisticas(self) -> dict[str, Any]:
+        lat = sorted(self._latencias)
+        n = len(lat)
+        return {
+            "workers": self.workers,
+            "modelo": self.modelo,
+            "en_curso": min(self._pendientes, self.workers),
+            "en_cola": self.en_cola(),
+            "procesados": self._procesados,
+            "errores": self._errores,
+            "latencia_ultima_s": round(self._latencias[-1], 2) if n else None,
+            "latencia_p50_s": round(lat[n // 2], 2) if n else None,
+            "latencia_p95_s": round(lat[min(n - 1, int(n * 0.95))], 2) if n else None,
+        }
+
+    def cerrar(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -8,7 +8,6 @@ Requiere: playwright, httpx, omni_telegram.env configurado
 import asyncio
 import os
 import sys
-import time
 from datetime import datetime
 from pathlib import Path
 
@@ -57,36 +56,42 @@ def _load_telegram():
     return token, chat
 
 
-def _telegram_send(text):
+_entrega = None
+
+
+def _get_entrega(token):
+    """Cliente Telegram async (pool + cola por chat); vive en el loop de _main_async."""
+    global _entrega
+    if _entrega is None:
+        from telegram_entrega import EntregaTelegram
+        _entrega = EntregaTelegram(token)
+    return _entrega
+
+
+async def _cerrar_entrega():
+    global _entrega
+    if _entrega is not None:
+        await _entrega.cerrar()
+        _entrega = None
+
+
+async def _telegram_send(text, esperar=True):
     token, chat = _load_telegram()
     if not token or not chat or "TU_" in token or "TU_" in chat:
         return False
     try:
-        import httpx
-        r = httpx.post(
-            f"https://api.telegram.org/bot{token}/sendMessage",
-            json={"chat_id": chat, "text": text[:4000]},
-            timeout=15
-        )
-        return r.status_code == 200
+        return await _get_entrega(token).enviar_texto(chat, text, esperar)
     except Exception:
         return False
 
 
-def _telegram_send_photo(path, caption=""):
+async def _telegram_send_album(fotos):
+    """fotos: [(path, caption)] -> un solo sendMediaGroup sobre la conexión compartida."""
     token, chat = _load_telegram()
-    if not token or not chat or not path.exists():
+    if not token or not chat:
         return False
     try:
-        import httpx
-        with open(path, "rb") as f:
-            r = httpx.post(
-                f"https://api.telegram.org/bot{token}/sendPhoto",
-                data={"chat_id": chat, "caption": caption[:1024]},
-                files={"photo": (path.name, f, "image/png")},
-                timeout=30
-            )
-        return r.status_code == 200
+        return await _get_entrega(token).enviar_album(chat, fotos)
     except Exception:
         return False
 
@@ -117,67 +122,71 @@ async def _check_url_httpx(url):
         return 0, str(e)[:200]
 
 
-async def _captura_url(url, path, timeout=15000, headless=True):
+async def _abrir_capturas(headless=True):
+    """Navegador caliente compartido por todas las capturas (y rondas de --watch)."""
     try:
-        from playwright.async_api import async_playwright
+        from servicio_capturas import ServicioCapturas
+        capt = ServicioCapturas(headless=headless)
+        await capt.iniciar()
+        return capt
     except ImportError:
         print("Playwright no instalado. Usando chequeo HTTP basico.")
-        status, _ = await _check_url_httpx(url)
-        return status == 200
-    try:
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=headless)
-            page = await browser.new_page()
-            await page.goto(url, wait_until="domcontentloaded", timeout=timeout)
-            await asyncio.sleep(2)
-            await page.screenshot(path=str(path), full_page=True)
-            await browser.close()
-        return path.exists()
     except Exception as e:
         err = str(e)
         if "Executable doesn't exist" in err or "playwright" in err.lower():
             print("Playwright: ejecuta 'playwright install chromium'")
-            status, _ = await _check_url_httpx(url)
-            return status == 200
-        print("Error:", err[:80])
+        else:
+            print("Error:", err[:80])
+    return None
+
+
+async def _captura_url(capt, url, path, timeout=15000):
+    """Captura en memoria y guarda la evidencia. True si hay captura nueva."""
+    if capt is None:
+        return False
+    try:
+        png = await capt.capturar(url, timeout_ms=timeout, espera_s=2)
+    except Exception as e:
+        print("Error:", str(e)[:80])
         return False
+    path.write_bytes(png)
+    return True
 
 
-async def _run(headless=True):
+async def _run(headless=True, capt=None):
     EVIDENCIA.mkdir(parents=True, exist_ok=True)
     ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
     print("[Robot] Iniciando verificacion de deploy...")
-    _telegram_send(f"Robot Verificar Deploy - Inicio {ts}")
-    _voice_say("Robot iniciando verificacion de despliegue.")
+    await _telegram_send(f"Robot Verificar Deploy - Inicio {ts}", esperar=False)
+    await asyncio.to_thread(_voice_say, "Robot iniciando verificacion de despliegue.")
 
     results = []
     capturas = []
 
-    # Vercel
+    # Vercel y Render a la vez: capturas (mismo navegador) + chequeo HTTP
     print("[1] Comprobando Vercel...")
+    print("[2] Comprobando Render...")
     p_vercel = EVIDENCIA / "vercel_frontend.png"
-    ok_vercel = await _captura_url(URL_VERCEL, p_vercel, headless=headless)
-    status_vercel, body_vercel = await _check_url_httpx(URL_VERCEL)
+    p_render = EVIDENCIA / "render_backend.png"
+    ok_vercel, ok_render, (status_vercel, body_vercel), (status_render, body_render) = await asyncio.gather(
+        _captura_url(capt, URL_VERCEL, p_vercel),
+        _captura_url(capt, URL_RENDER, p_render, timeout=30000),
+        _check_url_httpx(URL_VERCEL),
+        _check_url_httpx(URL_RENDER),
+    )
+
     # Solo considerar 404 cuando el HTTP status es 404 (evitar falso positivo si el body contiene "404")
     vercel_fail = status_vercel == 404 or (status_vercel != 200 and status_vercel != 0)
-    if p_vercel.exists():
+    if ok_vercel:
         capturas.append((p_vercel, "Vercel frontend"))
-        results.append(f"Vercel: {'404/Error' if vercel_fail else ('OK' if status_vercel == 200 else f'HTTP {status_vercel}')}")
-    else:
-        results.append(f"Vercel: {'404/Error' if vercel_fail else ('OK' if status_vercel == 200 else f'HTTP {status_vercel}')}")
+    results.append(f"Vercel: {'404/Error' if vercel_fail else ('OK' if status_vercel == 200 else f'HTTP {status_vercel}')}")
 
-    # Render
-    print("[2] Comprobando Render...")
-    p_render = EVIDENCIA / "render_backend.png"
-    ok_render = await _captura_url(URL_RENDER, p_render, timeout=30000, headless=headless)
-    status_render, body_render = await _check_url_httpx(URL_RENDER)
-    if p_render.exists():
+    render_ok = "\"status\":\"ok\"" in body_render or "\"status\": \"ok\"" in body_render
+    if ok_render:
         capturas.append((p_render, "Render backend"))
-        render_ok = "\"status\":\"ok\"" in body_render or "\"status\": \"ok\"" in body_render
         results.append(f"Render: {'OK' if render_ok else ('HTTP '+str(status_render) if status_render else 'Revisar')}")
     else:
-        render_ok = "\"status\":\"ok\"" in body_render or "\"status\": \"ok\"" in body_render
         results.append(f"Render: {'OK' if render_ok else ('HTTP '+str(status_render) if status_render else 'Fallo/Timeout')}")
 
     # Log
@@ -195,36 +204,43 @@ async def _run(headless=True):
 
     # Telegram
     res_txt = "\n".join(results)
-    _telegram_send(f"Robot Verificar Deploy - Fin\n{res_txt}")
-    for path, nombre in capturas:
-        if path.exists():
-            _telegram_send_photo(path, f"{nombre} - {res_txt}")
+    await _telegram_send(f"Robot Verificar Deploy - Fin\n{res_txt}")
+    await _telegram_send_album([(path, f"{nombre} - {res_txt}") for path, nombre in capturas if path.exists()])
 
-    _voice_say("Verificacion completada. Revisa Telegram.")
+    await asyncio.to_thread(_voice_say, "Verificacion completada. Revisa Telegram.")
     print("[Robot] Listo. Revisa evidencia/ y Telegram.")
 
 
-def main():
-    args = [a.lower() for a in sys.argv[1:]]
-    headless = "--show" not in args
-    watch = "--watch" in args
-    interval = 120
-    if watch:
+async def _main_async(headless=True, watch=False, interval=120):
+    capt = await _abrir_capturas(headless)
+    try:
+        if not watch:
+            await _run(headless=headless, capt=capt)
+            return 0
         print("[Robot] Modo vigilancia: verificando cada 2 minutos hasta OK.")
         while True:
-            asyncio.run(_run(headless=headless))
+            await _run(headless=headless, capt=capt)
             # Leer último log para decidir si OK
             last = MISION_LOG.read_text(encoding="utf-8") if MISION_LOG.exists() else ""
             ok = ("Vercel: OK" in last) and ("Render: OK" in last)
             if ok:
-                _telegram_send("✅ Deploy OK. Página y backend responden. Fin de vigilancia.")
-                _voice_say("Deploy verificado. Todo OK.")
+                await _telegram_send("✅ Deploy OK. Página y backend responden. Fin de vigilancia.")
+                await asyncio.to_thread(_voice_say, "Deploy verificado. Todo OK.")
                 return 0
-            _telegram_send("⚠️ Aún falla el deploy. Reintentando en 2 minutos.")
-            time.sleep(interval)
-    else:
-        asyncio.run(_run(headless=headless))
-    return 0
+            await _telegram_send("⚠️ Aún falla el deploy. Reintentando en 2 minutos.")
+            await asyncio.sleep(interval)
+    finally:
+        # Entrega lo que quede en cola antes de cerrar el loop
+        await _cerrar_entrega()
+        if capt is not None:
+            await capt.cerrar()
+
+
+def main():
+    args = [a.lower() for a in sys.argv[1:]]
+    headless = "--show" not in args
+    watch = "--watch" in args
+    return asyncio.run(_main_async(headless=headless, watch=watch, interval=120))
 
 
 if __name__ == "__main__":
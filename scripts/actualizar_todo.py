@@ -4,16 +4,21 @@ Actualiza TODO: push a GitHub (hub) con token de bóveda + deploy Vercel + Railw
 Carga desde bóveda: GH_TOKEN o GITHUB_TOKEN (push), VERCEL_TOKEN, RAILWAY_TOKEN (deploy).
 Uso: python scripts/actualizar_todo.py [mensaje_commit]
       python scripts/actualizar_todo.py --solo-deploy   (solo Vercel + Railway, sin git)
+      python scripts/actualizar_todo.py --reanudar      (retomar desde la etapa fallida)
+Etapas en DAG (scripts/orquestador.py): commit → push → Vercel y Railway en paralelo.
 """
 from __future__ import annotations
 
 import argparse
+import json
 import os
 import subprocess
 import sys
-import time
 from pathlib import Path
 
+from esperar_despliegue import APP_URL, DespliegueTimeout, esperar_version, leer_version_local, leer_version_remota
+from orquestador import ESTADO_DIR, Etapa, EtapaFallida, Orquestador
+
 ROOT = Path(__file__).resolve().parent.parent
 
 
@@ -86,6 +91,7 @@ def git_push_with_token(token: str, branch: str = "maestro") -> bool:
 def main() -> int:
     parser = argparse.ArgumentParser(description="Actualizar todo: push + Vercel + Railway")
     parser.add_argument("--solo-deploy", action="store_true", help="Solo ejecutar deploy (Vercel + Railway), sin git")
+    parser.add_argument("--reanudar", action="store_true", help="Retomar desde la etapa que falló en la última ejecución")
     parser.add_argument("mensaje_commit", nargs="*", help="Mensaje para el commit")
     args = parser.parse_args()
     commit_msg = " ".join(args.mensaje_commit) if args.mensaje_commit else "Actualizacion: despliegue"
@@ -95,71 +101,81 @@ def main() -> int:
     else:
         print("=== ACTUALIZAR TODO (Hub -> Vercel -> Railway -> Comprobacion) ===\n")
 
-    if not args.solo_deploy:
-        # 1) Git add
+    def _etapa_commit(ctx: dict) -> None:
         subprocess.run(["git", "add", "-A"], cwd=str(ROOT), timeout=10, check=False)
         r = subprocess.run(["git", "diff", "--cached", "--quiet"], cwd=str(ROOT), timeout=5)
-        has_changes = r.returncode != 0
-
-        if has_changes:
+        if r.returncode != 0:
             subprocess.run(["git", "commit", "-m", commit_msg], cwd=str(ROOT), timeout=10, check=False)
-            print("  Commit creado.\n")
+            print("  Commit creado.")
         else:
-            print("  Sin cambios que commitear.\n")
+            print("  Sin cambios que commitear.")
 
-        # 2) Push a GitHub
+    def _etapa_push(ctx: dict) -> None:
         gh_token = _load_from_vault(("GH_TOKEN", "GITHUB_TOKEN"))
         if gh_token:
-            print("--- Push a GitHub (maestro) ---\n")
-            if git_push_with_token(gh_token, "maestro"):
-                print("  OK Push a GitHub.\n")
-            else:
-                print("  Fallo push. Revisa GH_TOKEN en boveda.\n")
+            if not git_push_with_token(gh_token, "maestro"):
+                raise EtapaFallida("Fallo push. Revisa GH_TOKEN en boveda.")
         else:
-            print("--- Push a GitHub ---\n")
             r = subprocess.run(["git", "push", "origin", "maestro"], cwd=str(ROOT), timeout=90)
             if r.returncode != 0:
-                print("  GH_TOKEN no en boveda. Push fallo. Deploy usara lo ya en GitHub.\n")
-            else:
-                print("  OK Push a GitHub.\n")
-
-    # 3) Deploy Vercel + Railway (siempre se ejecuta)
-    print("--- Deploy Vercel + Railway ---\n")
-    r1 = subprocess.run(
-        [sys.executable, str(ROOT / "scripts" / "vercel_config_deploy.py")],
-        cwd=str(ROOT),
-        timeout=120,
-    )
-    if r1.returncode != 0:
-        print("  [AVISO] Vercel salio con codigo", r1.returncode)
-    else:
-        print("  Vercel: deploy disparado.\n")
-    r2 = subprocess.run(
-        [sys.executable, str(ROOT / "scripts" / "railway_deploy.py")],
-        cwd=str(ROOT),
-        timeout=120,
-    )
-    if r2.returncode != 0:
-        print("  [AVISO] Railway salio con codigo", r2.returncode)
-    else:
-        print("  Railway: deploy disparado.\n")
-
-    print("--- Esperando 90 s ---\n")
-    time.sleep(90)
-
-    r3 = subprocess.run(
-        [sys.executable, str(ROOT / "scripts" / "comprobar_urls.py")],
-        cwd=str(ROOT),
-        timeout=90,
-    )
+                raise EtapaFallida("GH_TOKEN no en boveda. Push fallo. Deploy usara lo ya en GitHub.")
+        print("  OK Push a GitHub.")
+
+    def _etapa_esperar(ctx: dict) -> None:
+        version = leer_version_local()
+        # Este pipeline no hace bump: si la app ya sirve esta versión la espera saldría al instante
+        # sin señalar nada del deploy nuevo (mismo criterio que deploy_y_notificar.py)
+        if leer_version_remota(APP_URL) == version:
+            ctx["t_en_linea"] = None
+            print(f"  v{version} ya está en línea y no cambia: no hay versión nueva que esperar.")
+            print("  (La comprobación siguiente puede ver aún el deploy anterior.)")
+            return
+        print(f"  Esperando a que v{version} esté en línea...")
+        try:
+            t_en_linea = esperar_version(APP_URL, version)
+        except DespliegueTimeout as e:
+            raise EtapaFallida(f"{e}. Revisa el deploy en Vercel/Railway antes de volver a lanzar.")
+        ctx["t_en_linea"] = round(t_en_linea, 1)
+        print(f"  v{version} en línea en {t_en_linea:.0f} s.")
+
+    def _etapa_comprobar(ctx: dict) -> None:
+        # comprobar_urls imprime el informe y deja el resultado en JSON para decidir aquí
+        salida = ESTADO_DIR / "comprobar_urls.json"
+        subprocess.run(
+            [sys.executable, str(ROOT / "scripts" / "comprobar_urls.py"), "--json-out", str(salida)],
+            cwd=str(ROOT),
+            timeout=120,
+        )
+        try:
+            ctx["servicio_ok"] = bool(json.loads(salida.read_text(encoding="utf-8")).get("ok"))
+        except Exception:
+            ctx["servicio_ok"] = False
+
+    orq = Orquestador("actualizar_todo", [
+        Etapa("commit", fn=_etapa_commit, omitir=args.solo_deploy),
+        Etapa("push", fn=_etapa_push, depende=("commit",), reintentos=2, opcional=True, omitir=args.solo_deploy),
+        # Deploy Vercel + Railway tras el push (en paralelo entre sí); con --solo-deploy, directamente
+        Etapa("vercel", cmd=[sys.executable, str(ROOT / "scripts" / "vercel_config_deploy.py")], depende=("push",), timeout_s=120, reintentos=1, opcional=True),
+        Etapa("railway", cmd=[sys.executable, str(ROOT / "scripts" / "railway_deploy.py")], depende=("push",), timeout_s=120, reintentos=1, opcional=True),
+        Etapa("esperar", fn=_etapa_esperar, depende=("vercel", "railway")),
+        Etapa("comprobar", fn=_etapa_comprobar, depende=("esperar",), opcional=True),
+    ])
+    ok = orq.ejecutar(reanudar=args.reanudar)
+    print()
+    print(orq.resumen())
     print("\n" + "=" * 50)
-    if r3.returncode == 0:
+    if ok and orq.ctx.get("t_en_linea", 0) is None:
+        print("  Deploy lanzado sin version nueva: la comprobacion refleja el deploy anterior.")
+        print("  Revisa el estado en Vercel/Railway para confirmar el nuevo.")
+    elif ok and orq.ctx.get("servicio_ok"):
         print("  Actualizacion completada: Vercel y Railway OK.")
-    else:
+    elif ok:
         print("  Deploy lanzado. En 1-2 min la app tendra la version nueva.")
         print("  En movil: abre el menu -> Buscar actualizaciones -> Actualizar ahora.")
+    else:
+        print("  Actualizacion incompleta. Corrige el fallo y ejecuta: python scripts/actualizar_todo.py --reanudar")
     print("=" * 50)
-    return 0
+    return 0 if ok else 1
 
 
 if __name__ == "__main__":
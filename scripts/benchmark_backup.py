@@ -0,0 +1,329 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark del motor de backups (backup_rollback.py) sobre árboles sintéticos.
+
+Genera un proyecto ficticio con N archivos y una distribución de tamaños configurable y, por cada
+formato de backup (snapshot de blobs, enlazado con hardlinks, empaquetado .tar), mide:
+snapshot inicial, snapshot sin cambios, snapshot tras modificar una fracción, verificación
+completa y por cambios, listado, rollback diferencial y restauración completa (árbol vacío).
+Por fase: segundos, MB/s, archivos/s y RSS pico de esa fase (un hilo muestrea el RSS mientras
+corre; sin psutil ni /proc se cae a ru_maxrss, que es el pico acumulado del proceso).
+
+Con --json-out guarda el resultado; con --base compara contra uno anterior y sale con código 1 si
+alguna fase es más lenta que la tolerancia (útil en CI antes de tocar el motor).
+
+Uso: python scripts/benchmark_backup.py [--archivos 2000] [--tamanos codigo|mixto|grande|1K:60,64K:35,4M:5]
+                                        [--formatos snapshot,enlaces,archivo] [--cambios 0.05]
+                                        [--json-out bench.json] [--base bench_anterior.json --tolerancia 0.25]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+# Distribuciones predefinidas: "tope:peso" (tamaño uniforme entre el tope anterior y este)
+DISTRIBUCIONES = {
+    "codigo": "512:30,4K:45,32K:20,256K:4,2M:1",
+    "mixto": "4K:50,64K:30,1M:15,8M:5",
+    "grande": "64K:20,1M:40,16M:40",
+}
+UNIDADES = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+FORMATOS = ("snapshot", "enlaces", "archivo")
+FASES_SNAPSHOT = ("snapshot_inicial", "snapshot_sin_cambios", "snapshot_incremental")
+PALABRAS = b"pan harina levadura horno venta caja stock cliente factura entrega turno receta ".split()
+
+
+def parsear_distribucion(texto):
+    """'1K:60,64K:35,4M:5' -> [(tope_bytes, peso)] ordenado por tope."""
+    texto = DISTRIBUCIONES.get(texto, texto)
+    cubos = []
+    for parte in texto.split(","):
+        tope, _, peso = parte.strip().partition(":")
+        tope = tope.strip().upper()
+        unidad = tope[-1] if tope and tope[-1] in UNIDADES else ""
+        cubos.append((int(float(tope[:len(tope) - len(unidad)]) * UNIDADES[unidad]), float(peso or 1)))
+    return sorted(cubos)
+
+
+def _contenido(rng, size, aleatorio):
+    """Texto comprimible o bytes aleatorios (como imágenes o zips ya comprimidos)."""
+    if rng.random() < aleatorio:
+        return rng.randbytes(size)
+    linea = b" ".join(rng.choice(PALABRAS) for _ in range(12)) + b"\n"
+    return (linea * (size // len(linea) + 1))[:size]
+
+
+def generar_arbol(destino, archivos, cubos, aleatorio, por_dir, rng):
+    """Crea el árbol sintético. Devuelve {ruta relativa: tamaño}."""
+    topes = [0] + [t for t, _ in cubos]
+    pesos = [p for _, p in cubos]
+    tamanos = {}
+    for i in range(archivos):
+        k = rng.choices(range(len(cubos)), weights=pesos)[0]
+        size = rng.randint(topes[k], topes[k + 1])
+        d = i // por_dir
+        rel = f"modulo{d // por_dir:03d}/pkg{d:04d}/archivo{i:06d}.{rng.choice(('py', 'js', 'json', 'md', 'bin'))}"
+        ruta = destino / rel
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        ruta.write_bytes(_contenido(rng, size, aleatorio))
+        tamanos[rel] = size
+    return tamanos
+
+
+def modificar(destino, tamanos, fraccion, aleatorio, rng):
+    """Reescribe una fracción de los archivos (mismo tamaño, otro contenido). Devuelve las rutas."""
+    rels = rng.sample(sorted(tamanos), max(1, int(len(tamanos) * fraccion)))
+    for rel in rels:
+        (destino / rel).write_bytes(_contenido(rng, tamanos[rel], aleatorio))
+    return rels
+
+
+def rss_actual_mb():
+    """RSS actual del proceso (MB), o None si no se puede medir (ni psutil ni /proc)."""
+    try:
+        import psutil
+
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class PicoRSS:
+    """Muestrea el RSS en un hilo mientras dura el bloque: pico de la fase, no del proceso entero."""
+
+    def __init__(self, intervalo_s=0.01):
+        self.intervalo_s = intervalo_s
+        self.inicio = self.pico = None
+        self._parar = threading.Event()
+        self._hilo = threading.Thread(target=self._muestrear, daemon=True)
+
+    def _muestrear(self):
+        while not self._parar.wait(self.intervalo_s):
+            self.pico = max(self.pico, rss_actual_mb())
+
+    def __enter__(self):
+        self.inicio = self.pico = rss_actual_mb()
+        if self.inicio is not None:
+            self._hilo.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self.inicio is None:
+            # Sin muestreo posible: pico acumulado del proceso
+            self.pico = rss_pico_mb()
+            return
+        self._parar.set()
+        self._hilo.join()
+        self.pico = max(self.pico, rss_actual_mb())
+
+
+def rss_pico_mb():
+    """RSS máximo del proceso hasta ahora (MB, acumulado), o None si no se puede medir."""
+    try:
+        import resource
+
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux da KB; macOS, bytes
+        return round(pico / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    except ImportError:
+        pass
+    try:
+        import psutil
+
+        info = psutil.Process().memory_info()
+        return round(getattr(info, "peak_wset", info.rss) / (1024 * 1024), 1)
+    except ImportError:
+        return None
+
+
+def medir(resultados, formato, fase, fn, archivos, size, verbose=False):
+    """Ejecuta fn (con la salida del manager silenciada) y añade la fila de resultados."""
+    salida = io.StringIO()
+    with PicoRSS() as rss, contextlib.redirect_stdout(sys.stdout if verbose else salida):
+        t0 = time.perf_counter()
+        valor = fn()
+        segundos = time.perf_counter() - t0
+    fila = {
+        "formato": formato,
+        "fase": fase,
+        "segundos": round(segundos, 4),
+        "archivos": archivos,
+        "bytes": size,
+        "mb_s": round(size / (1024 * 1024) / segundos, 1) if segundos else None,
+        "archivos_s": round(archivos / segundos, 1) if segundos else None,
+        "rss_inicio_mb": round(rss.inicio, 1) if rss.inicio is not None else None,
+        "rss_pico_mb": round(rss.pico, 1) if rss.pico is not None else None,
+        "ok": bool(valor),
+    }
+    resultados.append(fila)
+    print(f"  {fase:22s} {segundos:8.3f} s  {fila['mb_s'] or 0:9.1f} MB/s  {fila['archivos_s'] or 0:10.1f} arch/s"
+          f"  RSS {fila['rss_pico_mb'] or '-'} MB{_delta_rss(fila)}{'' if fila['ok'] else '  ❌'}")
+    return valor
+
+
+def _delta_rss(fila):
+    # Lo que la fase sumó sobre el RSS con que empezó (el heap de fases anteriores no se devuelve)
+    if fila["rss_inicio_mb"] is None or fila["rss_pico_mb"] is None:
+        return ""
+    return f" (+{fila['rss_pico_mb'] - fila['rss_inicio_mb']:.1f})"
+
+
+def vaciar(directorio):
+    for hijo in directorio.iterdir():
+        if hijo.is_dir() and not hijo.is_symlink():
+            shutil.rmtree(hijo)
+        else:
+            hijo.unlink()
+
+
+def arbol_igual(directorio, tamanos):
+    actual = {p.relative_to(directorio).as_posix(): p.stat().st_size for p in directorio.rglob("*") if p.is_file()}
+    return actual == tamanos
+
+
+def ejecutar_formato(formato, trabajo, tamanos, args, rng):
+    """Todas las fases para un formato, con un directorio de backups nuevo (índice en frío)."""
+    from backup_rollback import BackupRollbackManager
+
+    arbol = trabajo / "arbol"
+    manager = BackupRollbackManager(raiz=arbol, backup_dir=trabajo / f"backups_{formato}")
+    manager.telegram_token = None
+    crear = {
+        "snapshot": manager.crear_backup_completo,
+        "enlaces": manager.crear_backup_enlazado,
+        "archivo": manager.crear_backup_empaquetado,
+    }[formato]
+    n, total = len(tamanos), sum(tamanos.values())
+    resultados = []
+    print(f"\n▶ {formato}")
+
+    inicial = medir(resultados, formato, "snapshot_inicial", lambda: crear("bench inicial"), n, total, args.verbose)
+    medir(resultados, formato, "snapshot_sin_cambios", lambda: crear("bench sin cambios"), n, total, args.verbose)
+    cambiados = modificar(arbol, tamanos, args.cambios, args.aleatorio, rng)
+    medir(resultados, formato, "snapshot_incremental", lambda: crear("bench incremental"), n, total, args.verbose)
+    medir(resultados, formato, "verificar_completo",
+          lambda: manager.verificar_integridad_backup(inicial, "completo"), n, total, args.verbose)
+    medir(resultados, formato, "verificar_cambios",
+          lambda: manager.verificar_integridad_backup(inicial, "cambios"), n, total, args.verbose)
+    n_backups = len(manager.catalogo.snapshots())
+    medir(resultados, formato, "listar", lambda: manager.listar_backups() or True, n_backups, 0, args.verbose)
+    size_cambiados = sum(tamanos[rel] for rel in cambiados)
+    medir(resultados, formato, "rollback_diferencial",
+          lambda: manager.hacer_rollback(inicial) and arbol_igual(arbol, tamanos),
+          len(cambiados), size_cambiados, args.verbose)
+    vaciar(arbol)
+    medir(resultados, formato, "restaurar_completo",
+          lambda: manager.hacer_rollback(inicial) and arbol_igual(arbol, tamanos), n, total, args.verbose)
+
+    manager.indice_hashes.cerrar()
+    manager.catalogo.cerrar()
+    shutil.rmtree(trabajo / f"backups_{formato}", ignore_errors=True)
+    return resultados
+
+
+def comparar(resultados, base, tolerancia, minimo_s=0.05):
+    """Fases más lentas que la base por encima de la tolerancia: [(formato, fase, base_s, ahora_s)]."""
+    previos = {(r["formato"], r["fase"]): r["segundos"] for r in base.get("resultados", [])}
+    regresiones = []
+    for r in resultados:
+        antes = previos.get((r["formato"], r["fase"]))
+        if antes is not None and antes >= minimo_s and r["segundos"] > antes * (1 + tolerancia):
+            regresiones.append((r["formato"], r["fase"], antes, r["segundos"]))
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de snapshot, verificación, listado y restauración")
+    parser.add_argument("--archivos", type=int, default=2000, help="Archivos del árbol sintético")
+    parser.add_argument("--tamanos", default="codigo",
+                        help=f"Distribución: {', '.join(DISTRIBUCIONES)} o 'tope:peso,...' (p. ej. 1K:60,64K:35,4M:5)")
+    parser.add_argument("--aleatorio", type=float, default=0.2, help="Fracción de archivos incompresibles")
+    parser.add_argument("--por-dir", type=int, default=50, help="Archivos por directorio")
+    parser.add_argument("--cambios", type=float, default=0.05, help="Fracción de archivos modificados")
+    parser.add_argument("--formatos", default="snapshot,enlaces,archivo", help="Formatos a medir (separados por comas)")
+    parser.add_argument("--semilla", type=int, default=1234)
+    parser.add_argument("--dir", help="Directorio de trabajo (por defecto uno temporal que se borra)")
+    parser.add_argument("--json-out", help="Guarda el resultado JSON en esta ruta")
+    parser.add_argument("--base", help="JSON de una ejecución anterior para detectar regresiones")
+    parser.add_argument("--tolerancia", type=float, default=0.25, help="Lentitud admitida frente a --base (0.25 = +25%%)")
+    parser.add_argument("--verbose", action="store_true", help="Mostrar la salida del manager")
+    args = parser.parse_args()
+
+    if args.archivos < 1:
+        parser.error("--archivos debe ser al menos 1")
+    formatos = [f.strip() for f in args.formatos.split(",") if f.strip()]
+    if not formatos:
+        parser.error("--formatos: indica al menos uno de " + ", ".join(FORMATOS))
+    desconocidos = [f for f in formatos if f not in FORMATOS]
+    if desconocidos:
+        parser.error(f"--formatos: desconocido(s) {', '.join(desconocidos)} (válidos: {', '.join(FORMATOS)})")
+    cubos = parsear_distribucion(args.tamanos)
+    trabajo = Path(args.dir) if args.dir else Path(tempfile.mkdtemp(prefix="bench_backup_"))
+    trabajo.mkdir(parents=True, exist_ok=True)
+    arbol = trabajo / "arbol"
+    try:
+        resultados = []
+        for formato in formatos:
+            # Mismo árbol de partida para cada formato
+            if arbol.exists():
+                shutil.rmtree(arbol)
+            rng = random.Random(args.semilla)
+            t0 = time.perf_counter()
+            tamanos = generar_arbol(arbol, args.archivos, cubos, args.aleatorio, args.por_dir, rng)
+            print(f"🌳 Árbol: {len(tamanos)} archivos, {sum(tamanos.values()) / (1024 * 1024):.1f} MB "
+                  f"(generado en {time.perf_counter() - t0:.1f} s)")
+            resultados += ejecutar_formato(formato, trabajo, tamanos, args, rng)
+    finally:
+        if not args.dir:
+            shutil.rmtree(trabajo, ignore_errors=True)
+
+    informe = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+        "parametros": {
+            "archivos": args.archivos, "tamanos": DISTRIBUCIONES.get(args.tamanos, args.tamanos),
+            "aleatorio": args.aleatorio, "cambios": args.cambios, "semilla": args.semilla, "formatos": formatos,
+        },
+        "arbol": {"archivos": len(tamanos), "bytes": sum(tamanos.values())},
+        "resultados": resultados,
+    }
+    if args.json_out:
+        Path(args.json_out).write_text(json.dumps(informe, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"\n💾 Resultado en {args.json_out}")
+
+    codigo = 0 if all(r["ok"] for r in resultados) else 1
+    if args.base:
+        base = json.loads(Path(args.base).read_text(encoding="utf-8"))
+        regresiones = comparar(resultados, base, args.tolerancia)
+        for formato, fase, antes, ahora in regresiones:
+            print(f"⚠️ Regresión {formato}/{fase}: {antes:.3f} s -> {ahora:.3f} s (+{(ahora / antes - 1) * 100:.0f}%)")
+        if regresiones:
+            codigo = 1
+        else:
+            print(f"✅ Sin regresiones frente a {args.base} (tolerancia {args.tolerancia:.0%})")
+    return codigo
+
+
+if __name__ == "__main__":
+    sys.exit(main())
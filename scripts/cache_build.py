@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+Caché del build del frontend por huella de contenido.
+
+La huella es un SHA-256 de las entradas del build: frontend/src, public, scripts, index.html,
+package.json, package-lock.json, configs (vite, postcss, tailwind, .env*) y la versión.
+Lo que escribe write-version.js en cada build (public/version.json, __APP_BUILD__ en index.html)
+se normaliza para que no cambie la huella.
+
+Si la huella coincide con un build OK anterior se reutiliza su dist (guardado en
+.deploy_estado/build_cache/<huella>/dist) y no se ejecuta npm run build. La limpieza de
+caché (limpiar_cache.py) solo se hace cuando la huella cambia o con --forzar.
+
+Uso: python scripts/cache_build.py [--forzar] [--huella]
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import re
+import shutil
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+FRONTEND = ROOT / "frontend"
+DIST = FRONTEND / "dist"
+VERSION_JS = FRONTEND / "src" / "config" / "version.js"
+CACHE_DIR = ROOT / ".deploy_estado" / "build_cache"
+MANIFIESTO = CACHE_DIR / "ultimo.json"
+# Builds guardados (los más antiguos se borran)
+MAX_GUARDADOS = 3
+
+DIRS_ENTRADA = ("src", "public", "scripts")
+ARCHIVOS_ENTRADA = (
+    "index.html", "package.json", "package-lock.json",
+    "vite.config.js", "postcss.config.js", "tailwind.config.js",
+    ".env", ".env.production", ".env.local", ".env.production.local",
+)
+# Generados por write-version.js en cada build
+IGNORAR = {"public/version.json"}
+_RE_INDEX_VOLATIL = re.compile(rb'(window\.__APP_(?:VERSION|BUILD)__\s*=\s*)["\'][^"\']*["\']')
+_RE_VERSION = re.compile(rb'(APP_VERSION\s*=\s*)["\'][^"\']*["\']')
+
+
+def leer_version() -> str:
+    if not VERSION_JS.exists():
+        return "1.0.0"
+    m = re.search(r'APP_VERSION\s*=\s*["\']([^"\']+)["\']', VERSION_JS.read_text(encoding="utf-8"))
+    return m.group(1) if m else "1.0.0"
+
+
+def _entradas(frontend: Path) -> list[Path]:
+    archivos = []
+    for d in DIRS_ENTRADA:
+        base = frontend / d
+        if base.is_dir():
+            archivos.extend(p for p in base.rglob("*") if p.is_file())
+    archivos.extend(frontend / n for n in ARCHIVOS_ENTRADA if (frontend / n).is_file())
+    return sorted(archivos, key=lambda p: p.relative_to(frontend).as_posix())
+
+
+def huella(frontend: Path = FRONTEND, incluir_version: bool = True) -> str:
+    """SHA-256 de las entradas del build. Sin versión: solo cambia si cambian las fuentes."""
+    h = hashlib.sha256()
+    for p in _entradas(frontend):
+        rel = p.relative_to(frontend).as_posix()
+        if rel in IGNORAR:
+            continue
+        datos = p.read_bytes()
+        if rel == "index.html":
+            datos = _RE_INDEX_VOLATIL.sub(rb"\1''", datos)
+        elif rel == "src/config/version.js":
+            datos = _RE_VERSION.sub(rb"\1''", datos)
+        h.update(rel.encode("utf-8") + b"\0" + str(len(datos)).encode() + b"\0")
+        h.update(datos)
+    if incluir_version:
+        h.update(b"version\0" + leer_version().encode("utf-8"))
+    return h.hexdigest()
+
+
+def ultimo_build() -> dict:
+    """Manifiesto del último build OK ({} si no hay)."""
+    try:
+        return json.loads(MANIFIESTO.read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+
+
+def fuentes_cambiadas() -> bool:
+    """True si las fuentes del frontend (sin contar la versión) cambiaron desde el último build OK."""
+    previo = ultimo_build().get("huella_fuentes")
+    return previo is None or previo != huella(incluir_version=False)
+
+
+def _guardar(h: str, h_fuentes: str, version: str, duracion_s: float) -> None:
+    destino = CACHE_DIR / h / "dist"
+    tmp = CACHE_DIR / h / "dist.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    shutil.copytree(DIST, tmp)
+    shutil.rmtree(destino, ignore_errors=True)
+    tmp.rename(destino)
+    data = {
+        "huella": h,
+        "huella_fuentes": h_fuentes,
+        "version": version,
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "duracion_build_s": round(duracion_s, 1),
+    }
+    (CACHE_DIR / h / "build.json").write_text(json.dumps(data, indent=2), encoding="utf-8")
+    tmp_m = MANIFIESTO.with_suffix(".tmp")
+    tmp_m.write_text(json.dumps(data, indent=2), encoding="utf-8")
+    tmp_m.replace(MANIFIESTO)
+    # Podar los builds más antiguos
+    guardados = sorted(
+        (d for d in CACHE_DIR.iterdir() if d.is_dir() and (d / "build.json").exists()),
+        key=lambda d: (d / "build.json").stat().st_mtime,
+        reverse=True,
+    )
+    for d in guardados[MAX_GUARDADOS:]:
+        shutil.rmtree(d, ignore_errors=True)
+
+
+def _restaurar(h: str) -> bool:
+    """Copia el dist guardado para la huella h a frontend/dist. False si no existe."""
+    origen = CACHE_DIR / h / "dist"
+    if not (origen / "index.html").exists():
+        return False
+    tmp = FRONTEND / "dist.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    shutil.copytree(origen, tmp)
+    shutil.rmtree(DIST, ignore_errors=True)
+    tmp.rename(DIST)
+    return True
+
+
+def construir(forzar: bool = False, timeout_s: float = 300) -> dict:
+    """Build con caché. Devuelve {"huella", "version", "cache": bool, "duracion_s"}.
+    RuntimeError si el build falla."""
+    t0 = time.monotonic()
+    version = leer_version()
+    h = huella()
+    previo = ultimo_build()
+    if not forzar and previo.get("huella") == h and _restaurar(h):
+        print(f"  Build en caché (huella {h[:12]}, v{version}): dist reutilizado.")
+        return {"huella": h, "version": version, "cache": True, "duracion_s": time.monotonic() - t0}
+
+    if forzar or previo.get("huella") != h:
+        subprocess.run([sys.executable, str(ROOT / "scripts" / "limpiar_cache.py")], cwd=str(ROOT), timeout=30, check=False)
+    h_fuentes = huella(incluir_version=False)
+    print(f"  Build (huella {h[:12]}, v{version})...")
+    try:
+        r = subprocess.run("npm run build", cwd=str(FRONTEND), shell=True, timeout=timeout_s)
+    except subprocess.TimeoutExpired:
+        raise RuntimeError(f"npm run build: timeout tras {timeout_s:.0f} s")
+    if r.returncode != 0 or not (DIST / "index.html").exists():
+        raise RuntimeError(f"npm run build falló (código {r.returncode})")
+    duracion = time.monotonic() - t0
+    try:
+        _guardar(h, h_fuentes, version, duracion)
+    except Exception as e:
+        print(f"  Aviso: no se pudo guardar el build en caché: {e}")
+    return {"huella": h, "version": version, "cache": False, "duracion_s": duracion}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Build del frontend con caché por huella de contenido")
+    parser.add_argument("--forzar", action="store_true", help="Limpiar caché y construir aunque la huella no cambie")
+    parser.add_argument("--huella", action="store_true", help="Solo mostrar la huella actual y la del último build")
+    args = parser.parse_args()
+    if args.huella:
+        previo = ultimo_build()
+        print(f"Actual:       {huella()}  (v{leer_version()})")
+        print(f"Último build: {previo.get('huella', '-')}  (v{previo.get('version', '-')}, {previo.get('fecha', '-')})")
+        return 0
+    try:
+        res = construir(forzar=args.forzar)
+    except RuntimeError as e:
+        print(f"ERROR: {e}")
+        return 1
+    print(f"  OK en {res['duracion_s']:.1f} s{' (caché)' if res['cache'] else ''}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,21 @@
 # -*- coding: utf-8 -*-
-"""Verifica URLs de Vercel y API (Render o Railway)."""
+"""
+Verifica URLs de Vercel y API (Render o Railway).
+
+Todas las URLs se comprueban a la vez (un httpx.AsyncClient compartido). Por cada muestra se
+miden DNS, conexión TCP, TLS, TTFB y total; con --muestras N se calculan p50/p95.
+
+Uso: python scripts/comprobar_urls.py [--muestras 5] [--json] [--json-out resultado.json]
+"""
+import argparse
+import asyncio
+import json
 import os
+import socket
 import sys
+import time
 from pathlib import Path
+from urllib.parse import urlsplit
 
 # URLs por defecto (env en CI: URL_VERCEL, RAILWAY_PUBLIC_URL)
 URL_VERCEL = os.environ.get("URL_VERCEL", "https://rauli-panaderia-app.vercel.app").strip()
@@ -38,49 +51,123 @@ def _load_railway_url():
             pass
     return (URL_RAILWAY or "").strip()
 
-def check():
-    results = []
-    try:
-        import httpx
-    except ImportError:
-        print("Instala: pip install httpx")
-        return 1
-
+def _endpoints():
+    """[(nombre, url, timeout_s)] igual que antes: Vercel, /api/version y la API (Railway o Render)."""
     url_railway = _load_railway_url()
-    urls_to_check = [("Vercel (frontend)", URL_VERCEL), ("Vercel /api/version", URL_VERCEL.rstrip("/") + "/api/version")]
     api_url = url_railway if url_railway else URL_RENDER
     api_label = "API (Railway)" if url_railway else "API (Render)"
-    urls_to_check.append((api_label, api_url))
-    timeouts = {URL_RENDER: 90, URL_VERCEL: 15}
-    if url_railway:
-        timeouts[url_railway] = 30
-    timeouts[api_url] = timeouts.get(api_url, 60)
-    for name, url in urls_to_check:
+    # Render en frío puede tardar ~1 min en despertar
+    return [
+        ("Vercel (frontend)", URL_VERCEL, 15),
+        ("Vercel /api/version", URL_VERCEL.rstrip("/") + "/api/version", 20),
+        (api_label, api_url, 30 if url_railway else 90),
+    ]
+
+def _percentil(valores, p):
+    if not valores:
+        return None
+    v = sorted(valores)
+    return v[min(len(v) - 1, int(round(p / 100 * (len(v) - 1))))]
+
+async def _muestra(client, url, timeout):
+    """Una petición con tiempos por fase (ms). connect_ms incluye la resolución que hace httpcore."""
+    marcas = {}
+    loop = asyncio.get_running_loop()
+
+    async def trace(evento, info):
+        marcas[evento] = time.perf_counter()
+
+    m = {"dns_ms": None, "connect_ms": None, "tls_ms": None, "ttfb_ms": None, "total_ms": None,
+         "reutilizada": False, "http_status": 0, "error": None}
+    parts = urlsplit(url)
+    t0 = time.perf_counter()
+    try:
+        await loop.getaddrinfo(parts.hostname, parts.port or (443 if parts.scheme == "https" else 80), type=socket.SOCK_STREAM)
+        m["dns_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+    except OSError as e:
+        m["error"] = f"DNS: {e}"
+        return m, None
+    t0 = time.perf_counter()
+    try:
+        r = await client.get(url, timeout=timeout, extensions={"trace": trace})
+    except Exception as e:
+        m["total_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+        m["error"] = (type(e).__name__ + ": " + str(e))[:120]
+        return m, None
+    fin = time.perf_counter()
+
+    def _dur(a, b):
+        return round((marcas[b] - marcas[a]) * 1000, 1) if a in marcas and b in marcas else None
+
+    m["connect_ms"] = _dur("connection.connect_tcp.started", "connection.connect_tcp.complete")
+    m["tls_ms"] = _dur("connection.start_tls.started", "connection.start_tls.complete")
+    m["reutilizada"] = "connection.connect_tcp.started" not in marcas
+    cabeceras = marcas.get("http11.receive_response_headers.complete") or marcas.get("http2.receive_response_headers.complete")
+    m["ttfb_ms"] = round((cabeceras - t0) * 1000, 1) if cabeceras else None
+    m["total_ms"] = round((fin - t0) * 1000, 1)
+    m["http_status"] = r.status_code
+    return m, r
+
+def _evaluar(url, r):
+    """(ok, status_texto, version) con el mismo criterio que la versión síncrona."""
+    ok = r.status_code == 200
+    version = None
+    if ok and "/api/version" in url:
         try:
-            r = httpx.get(url, follow_redirects=True, timeout=timeouts.get(url, 20))
-            ok = r.status_code == 200
-            if ok and "/api/version" in url:
-                try:
-                    d = r.json()
-                    ok = isinstance(d.get("version"), str)
-                    status = f"OK v{d.get('version', '?')}" if ok else "No es JSON de version"
-                except Exception:
-                    ok = False
-                    status = "Respuesta no es JSON (¿index.html?)"
-            else:
-                status = f"OK {r.status_code}" if ok else f"HTTP {r.status_code}"
-            results.append((name, url, status, ok))
-        except Exception as e:
-            results.append((name, url, str(e)[:60], False))
+            d = r.json()
+            ok = isinstance(d.get("version"), str)
+            version = d.get("version") if ok else None
+            status = f"OK v{d.get('version', '?')}" if ok else "No es JSON de version"
+        except Exception:
+            ok = False
+            status = "Respuesta no es JSON (¿index.html?)"
+    else:
+        status = f"OK {r.status_code}" if ok else f"HTTP {r.status_code}"
+    return ok, status, version
 
+async def _probar(client, nombre, url, timeout, muestras):
+    res = {"nombre": nombre, "url": url, "ok": False, "status": "", "version": None, "muestras": []}
+    for _ in range(muestras):
+        m, r = await _muestra(client, url, timeout)
+        res["muestras"].append(m)
+        if r is not None:
+            res["ok"], res["status"], res["version"] = _evaluar(url, r)
+        else:
+            res["ok"], res["status"] = False, (m["error"] or "")[:60]
+    totales = [m["total_ms"] for m in res["muestras"] if m["error"] is None]
+    ttfbs = [m["ttfb_ms"] for m in res["muestras"] if m["ttfb_ms"] is not None]
+    res["p50_ms"] = _percentil(totales, 50)
+    res["p95_ms"] = _percentil(totales, 95)
+    res["ttfb_p50_ms"] = _percentil(ttfbs, 50)
+    return res
+
+async def comprobar(muestras=1):
+    """Comprueba todos los endpoints a la vez. Devuelve la lista de resultados (serializable a JSON)."""
+    import httpx
+    limits = httpx.Limits(max_connections=20, max_keepalive_connections=10)
+    async with httpx.AsyncClient(follow_redirects=True, limits=limits) as client:
+        return await asyncio.gather(*(
+            _probar(client, nombre, url, timeout, max(1, muestras)) for nombre, url, timeout in _endpoints()
+        ))
+
+def _informe(results):
     print("\n=== SERVICIO COMPLETO (Vercel + API) ===\n")
     all_ok = True
-    for name, url, status, ok in results:
-        icon = "OK" if ok else "FALLO"
-        print(f"  [{icon}] {name}")
-        print(f"       {url}")
-        print(f"       -> {status}\n")
-        if not ok:
+    for r in results:
+        icon = "OK" if r["ok"] else "FALLO"
+        print(f"  [{icon}] {r['nombre']}")
+        print(f"       {r['url']}")
+        print(f"       -> {r['status']}")
+        ult = r["muestras"][-1]
+        fases = ", ".join(
+            f"{k[:-3]} {ult[k]:.0f} ms" for k in ("dns_ms", "connect_ms", "tls_ms", "ttfb_ms", "total_ms") if ult[k] is not None
+        )
+        if fases:
+            print(f"       tiempos: {fases}")
+        if len(r["muestras"]) > 1 and r["p50_ms"] is not None:
+            print(f"       {len(r['muestras'])} muestras: p50 {r['p50_ms']:.0f} ms, p95 {r['p95_ms']:.0f} ms")
+        print()
+        if not r["ok"]:
             all_ok = False
 
     print("=" * 40)
@@ -90,7 +177,33 @@ def check():
         print("  Si la API da timeout: espera 1 min (cold start) y vuelve a ejecutar:")
         print("  python scripts/comprobar_urls.py")
     print("=" * 40)
+    return all_ok
+
+def check(muestras=1, json_stdout=False, json_out=None):
+    try:
+        import httpx  # noqa: F401
+    except ImportError:
+        print("Instala: pip install httpx")
+        return 1
+
+    results = asyncio.run(comprobar(muestras))
+    all_ok = all(r["ok"] for r in results)
+    payload = {"ok": all_ok, "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"), "resultados": results}
+    if json_out:
+        Path(json_out).write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+    if json_stdout:
+        print(json.dumps(payload, ensure_ascii=False, indent=2))
+    else:
+        _informe(results)
     return 0 if all_ok else 1
 
+def main():
+    parser = argparse.ArgumentParser(description="Comprueba Vercel y API en paralelo con tiempos por fase")
+    parser.add_argument("--muestras", type=int, default=1, help="Repeticiones por URL para p50/p95")
+    parser.add_argument("--json", action="store_true", help="Imprime solo el resultado JSON")
+    parser.add_argument("--json-out", help="Guarda además el resultado JSON en esta ruta")
+    args = parser.parse_args()
+    return check(args.muestras, args.json, args.json_out)
+
 if __name__ == "__main__":
-    sys.exit(check())
+    sys.exit(main())
@@ -3,7 +3,9 @@
 Script único: elimina caché en app (vía version.json), construye, despliega en todos los sitios
 y emite mensaje de nueva actualización (Telegram). La app en PC y móvil detecta la nueva versión
 y muestra "Nueva actualización disponible" -> el usuario pulsa "Actualizar ahora" y se actualiza solo.
-Uso: python scripts/deploy_y_notificar.py [--no-git] [--no-notify]
+Etapas en DAG (scripts/orquestador.py): build → git push → Vercel y Railway en paralelo.
+El build usa scripts/cache_build.py: si el frontend no cambió se reutiliza el dist anterior.
+Uso: python scripts/deploy_y_notificar.py [--no-git] [--no-notify] [--reanudar] [--limpiar-cache]
 """
 from __future__ import annotations
 
@@ -13,10 +15,13 @@ import os
 import re
 import subprocess
 import sys
-import time
 import urllib.request
 from pathlib import Path
 
+from cache_build import construir, fuentes_cambiadas
+from esperar_despliegue import DespliegueTimeout, esperar_version, leer_version_remota
+from orquestador import Etapa, EtapaFallida, Orquestador, ejecutar_comando
+
 ROOT = Path(__file__).resolve().parent.parent
 FRONTEND = ROOT / "frontend"
 VERSION_JS = FRONTEND / "src" / "config" / "version.js"
@@ -70,6 +75,14 @@ def send_telegram(text: str) -> bool:
     chat = _load_from_vault(("OMNI_BOT_TELEGRAM_CHAT_ID", "TELEGRAM_CHAT_ID", "OPERATOR_TELEGRAM"))
     if not token or not chat:
         return False
+    try:
+        # Cliente compartido (telegram_entrega.py en la raíz); requiere httpx
+        if str(ROOT) not in sys.path:
+            sys.path.insert(0, str(ROOT))
+        from telegram_entrega import entrega_sync
+        return entrega_sync(token).enviar_texto(chat, text)
+    except ImportError:
+        pass
     url = f"https://api.telegram.org/bot{token}/sendMessage"
     body = f"chat_id={chat}&text={urllib.parse.quote(text[:4096])}"
     try:
@@ -82,119 +95,150 @@ def send_telegram(text: str) -> bool:
         return False
 
 
-def main() -> int:
-    parser = argparse.ArgumentParser(description="Deploy y notificar nueva actualizacion")
-    parser.add_argument("--no-git", action="store_true", help="No hacer git add/commit/push")
-    parser.add_argument("--no-notify", action="store_true", help="No enviar mensaje Telegram")
-    args = parser.parse_args()
-
-    # 0) Bump versión patch si hay cambios (enlaza cada arreglo con versión nueva)
-    if not args.no_git:
-        r = subprocess.run(["git", "status", "--porcelain"], cwd=str(ROOT), capture_output=True, text=True, timeout=5)
-        if r.returncode == 0 and r.stdout.strip():
+def _git_push_todo() -> bool:
+    """Push de maestro (obligatorio) y, si va bien, master + main en un solo push."""
+    gh = _load_from_vault(("GH_TOKEN", "GITHUB_TOKEN"))
+    destinos = []
+    if gh:
+        r = subprocess.run(["git", "remote", "get-url", "origin"], cwd=str(ROOT), capture_output=True, text=True, timeout=5)
+        url = (r.stdout or "").strip()
+        if "github.com" in url:
+            destinos.append("https://{}@github.com/".format(gh) + url.split("github.com/", 1)[-1].lstrip("/"))
+    destinos.append("origin")
+    for destino in destinos:
+        rr = subprocess.run(["git", "push", destino, "maestro:maestro"], cwd=str(ROOT), timeout=90, capture_output=True, text=True)
+        if rr.returncode == 0:
+            subprocess.run(["git", "push", destino, "maestro:master", "maestro:main"], cwd=str(ROOT), timeout=60, capture_output=True, check=False)
+            return True
+    return False
+
+
+def _etapa_bump(ctx: dict) -> None:
+    # Bump versión patch si hay cambios en el frontend (enlaza cada arreglo visible con versión
+    # nueva). Si solo cambió backend/robot se conserva la versión y el build sale de caché.
+    previa = read_version()
+    r = subprocess.run(["git", "status", "--porcelain"], cwd=str(ROOT), capture_output=True, text=True, timeout=5)
+    if r.returncode == 0 and r.stdout.strip():
+        if ctx.get("forzar_build") or fuentes_cambiadas():
             subprocess.run([sys.executable, str(ROOT / "scripts" / "bump_version.py")], cwd=str(ROOT), capture_output=True, check=False)
+        else:
+            print("  Frontend sin cambios desde el último build: se mantiene la versión.")
+    ctx["version"] = read_version()
+    ctx["version_nueva"] = ctx["version"] != previa
 
-    version = read_version()
-    print("=== DEPLOY Y NOTIFICAR (v{}) ===\n".format(version))
 
-    # 1) Limpiar caché (dist, Vite)
-    subprocess.run([sys.executable, str(ROOT / "scripts" / "limpiar_cache.py")], cwd=str(ROOT), timeout=10, check=False)
+def _etapa_build(ctx: dict) -> None:
+    # Build con caché por huella; limpiar_cache.py solo si la huella cambió o con --limpiar-cache
+    try:
+        res = construir(forzar=bool(ctx.get("forzar_build")))
+    except RuntimeError as e:
+        raise EtapaFallida(str(e))
+    ctx["build_cache"] = res["cache"]
 
-    # 2) Build frontend (genera version.json y dist)
-    print("--- 2/5 Build frontend ---\n")
-    r = subprocess.run(
-        ["npm", "run", "build"],
-        cwd=str(FRONTEND),
-        shell=True,
-        timeout=300,
-    )
+
+def _etapa_git(ctx: dict) -> None:
+    subprocess.run(["git", "add", "-A"], cwd=str(ROOT), timeout=10, check=False)
+    r = subprocess.run(["git", "diff", "--cached", "--quiet"], cwd=str(ROOT), timeout=5)
     if r.returncode != 0:
-        print("ERROR: Build fallo.")
-        return 1
-    print("  Build OK.\n")
-
-    if not args.no_git:
-        # 3) Git add, commit, push
-        print("--- 3/5 Git add/commit/push ---\n")
-        subprocess.run(["git", "add", "-A"], cwd=str(ROOT), timeout=10, check=False)
-        r = subprocess.run(["git", "diff", "--cached", "--quiet"], cwd=str(ROOT), timeout=5)
-        if r.returncode != 0:
-            subprocess.run(
-                ["git", "commit", "-m", "Deploy v{}: actualizacion automatica".format(version)],
-                cwd=str(ROOT),
-                timeout=10,
-                check=False,
-            )
-        gh = _load_from_vault(("GH_TOKEN", "GITHUB_TOKEN"))
-        push_ok = False
-        if gh:
-            r = subprocess.run(["git", "remote", "get-url", "origin"], cwd=str(ROOT), capture_output=True, text=True, timeout=5)
-            url = (r.stdout or "").strip()
-            if "github.com" in url:
-                push_url = "https://{}@github.com/".format(gh) + url.split("github.com/", 1)[-1].lstrip("/")
-                rr = subprocess.run(["git", "push", push_url, "maestro:maestro"], cwd=str(ROOT), timeout=90, capture_output=True, text=True)
-                push_ok = rr.returncode == 0
-                if push_ok:
-                    subprocess.run(["git", "push", push_url, "maestro:master"], cwd=str(ROOT), timeout=60, capture_output=True, check=False)
-                    subprocess.run(["git", "push", push_url, "maestro:main"], cwd=str(ROOT), timeout=60, capture_output=True, check=False)
-        if not push_ok:
-            rr = subprocess.run(["git", "push", "origin", "maestro"], cwd=str(ROOT), timeout=90, capture_output=True, text=True)
-            push_ok = rr.returncode == 0
-            if push_ok:
-                subprocess.run(["git", "push", "origin", "maestro:master"], cwd=str(ROOT), timeout=60, capture_output=True, check=False)
-                subprocess.run(["git", "push", "origin", "maestro:main"], cwd=str(ROOT), timeout=60, capture_output=True, check=False)
-        if push_ok:
-            print("  Git OK (push maestro, master, main).\n")
-        else:
-            print("  AVISO: git push fallo.\n  Añade GH_TOKEN en credenciales.txt (GitHub -> Settings -> Developer settings -> Tokens)\n")
-    else:
-        print("--- 3/5 Git omitido (--no-git) ---\n")
-
-    # 4) Deploy Vercel + Railway
-    print("--- 4/5 Deploy Vercel + Railway ---\n")
-    rv = subprocess.run(
-        [sys.executable, str(ROOT / "scripts" / "vercel_config_deploy.py")],
-        cwd=str(ROOT),
-        timeout=120,
-        check=False,
-    )
-    if rv.returncode != 0:
-        print("  Fallback: deploy directo (CLI)...")
         subprocess.run(
-            [sys.executable, str(ROOT / "scripts" / "vercel_deploy_directo.py")],
+            ["git", "commit", "-m", "Deploy v{}: actualizacion automatica".format(ctx["version"])],
             cwd=str(ROOT),
-            timeout=360,
+            timeout=10,
             check=False,
         )
-    subprocess.run(
-        [sys.executable, str(ROOT / "scripts" / "railway_deploy.py")],
-        cwd=str(ROOT),
-        timeout=120,
-        check=False,
-    )
-    print("\n  Esperando 60 s...\n")
-    time.sleep(60)
-
-    # 5) Notificar (Telegram)
-    if not args.no_notify:
-        print("--- 5/5 Notificar nueva actualizacion ---\n")
+    if not _git_push_todo():
+        raise EtapaFallida(
+            "git push fallo. Añade GH_TOKEN en credenciales.txt "
+            "(GitHub -> Settings -> Developer settings -> Tokens)"
+        )
+    print("  Git OK (push maestro, master, main).")
+
+
+def _etapa_vercel(ctx: dict) -> None:
+    try:
+        ejecutar_comando([sys.executable, str(ROOT / "scripts" / "vercel_config_deploy.py")], timeout_s=120)
+    except EtapaFallida:
+        print("  Fallback: deploy directo (CLI)...")
+        ejecutar_comando([sys.executable, str(ROOT / "scripts" / "vercel_deploy_directo.py")], timeout_s=360)
+
+
+def _etapa_esperar(ctx: dict) -> None:
+    # Esperar a que la versión nueva esté en línea (backoff + jitter, plazo DEPLOY_PLAZO_S)
+    version = ctx["version"]
+    # Sin bump la app ya sirve esa versión y la espera saldría al instante (salvo que un deploy
+    # anterior no llegara a publicarse: entonces sí se espera)
+    if not ctx.get("version_nueva") and leer_version_remota(APP_URL) == version:
+        ctx["t_en_linea"] = None
+        print("  v{} sin cambios (deploy solo de backend): no hay versión nueva que esperar.".format(version))
+        return
+    print("  Esperando a que v{} esté en línea...".format(version))
+    try:
+        ctx["t_en_linea"] = round(esperar_version(APP_URL, version), 1)
+    except DespliegueTimeout as e:
+        raise EtapaFallida("{}. No se notifica: la app aún no sirve la versión nueva.".format(e))
+    print("  v{} en línea en {:.0f} s.".format(version, ctx["t_en_linea"]))
+
+
+def _etapa_notificar(ctx: dict) -> None:
+    if ctx.get("t_en_linea") is None:
+        # La versión no cambió: ni se puede afirmar que esté en línea ni la app pedirá actualizar
+        msg = (
+            "RAULI v{}: deploy lanzado sin cambios en el frontend (Vercel/Railway).\n\n"
+            "La versión de la app no cambia, así que no aparecerá aviso de actualización: {}"
+        ).format(ctx["version"], APP_URL)
+    else:
         msg = (
-            "RAULI v{} desplegada.\n\n"
+            "RAULI v{} desplegada (en línea en {:.0f} s).\n\n"
             "Abre la app (PC o movil): {}\n\n"
             "Se detectara la nueva version y aparecera \"Nueva actualizacion disponible\". "
             "Pulsa \"Actualizar ahora\" y la app se actualizara sola (sin pasos manuales)."
-        ).format(version, APP_URL)
-        if send_telegram(msg):
-            print("  Mensaje enviado a Telegram.\n")
-        else:
-            print("  Telegram no configurado o fallo. Boveda: OMNI_BOT_TELEGRAM_TOKEN, OMNI_BOT_TELEGRAM_CHAT_ID.\n")
-    else:
-        print("--- 5/5 Notificar omitido (--no-notify) ---\n")
+        ).format(ctx["version"], ctx["t_en_linea"], APP_URL)
+    if not send_telegram(msg):
+        raise EtapaFallida("Telegram no configurado o fallo. Boveda: OMNI_BOT_TELEGRAM_TOKEN, OMNI_BOT_TELEGRAM_CHAT_ID.")
+    print("  Mensaje enviado a Telegram.")
+
+
+def etapas(no_git: bool = False, no_notify: bool = False) -> list[Etapa]:
+    """bump → build (caché) → git → {vercel, railway} en paralelo → esperar versión → notificar.
+
+    vercel y railway esperan al push: desplegar antes publicaría el commit anterior. Con --no-git
+    la etapa git queda omitida y cuenta como hecha."""
+    return [
+        Etapa("bump", fn=_etapa_bump),
+        # Build frontend (genera version.json y dist), reutilizado si la huella no cambió
+        Etapa("build", fn=_etapa_build, depende=("bump",)),
+        Etapa("git", fn=_etapa_git, depende=("build",), reintentos=2, opcional=True, omitir=no_git),
+        Etapa("vercel", fn=_etapa_vercel, depende=("build", "git"), reintentos=1, opcional=True),
+        Etapa("railway", cmd=[sys.executable, str(ROOT / "scripts" / "railway_deploy.py")], depende=("build", "git"), timeout_s=120, reintentos=1, opcional=True),
+        Etapa("esperar", fn=_etapa_esperar, depende=("vercel", "railway")),
+        Etapa("notificar", fn=_etapa_notificar, depende=("esperar",), reintentos=1, opcional=True, omitir=no_notify),
+    ]
 
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Deploy y notificar nueva actualizacion")
+    parser.add_argument("--no-git", action="store_true", help="No hacer git add/commit/push")
+    parser.add_argument("--no-notify", action="store_true", help="No enviar mensaje Telegram")
+    parser.add_argument("--reanudar", action="store_true", help="Retomar desde la etapa que falló en la última ejecución")
+    parser.add_argument("--limpiar-cache", action="store_true", help="Limpiar caché y reconstruir aunque el frontend no cambie")
+    args = parser.parse_args()
+
+    print("=== DEPLOY Y NOTIFICAR (v{}) ===\n".format(read_version()))
+    orq = Orquestador("deploy_y_notificar", etapas(args.no_git, args.no_notify), ctx={"forzar_build": args.limpiar_cache})
+    if args.no_git:
+        orq.etapas["bump"].omitir = True
+        orq.ctx["version"] = read_version()
+    ok = orq.ejecutar(reanudar=args.reanudar)
+
+    print()
+    print(orq.resumen())
     print("=" * 50)
-    print("  Listo. En PC y movil: abrir la app -> si hay version nueva, se mostrara el aviso y \"Actualizar ahora\".")
+    if ok:
+        print("  Listo. En PC y movil: abrir la app -> si hay version nueva, se mostrara el aviso y \"Actualizar ahora\".")
+    else:
+        print("  Deploy incompleto. Corrige el fallo y ejecuta: python scripts/deploy_y_notificar.py --reanudar")
     print("=" * 50)
-    return 0
+    return 0 if ok else 1
 
 
 if __name__ == "__main__":
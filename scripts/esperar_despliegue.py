@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+Espera a que la versión recién construida esté en línea (en lugar de sleeps fijos).
+Consulta /api/version y /version.json de la app con backoff exponencial + jitter
+hasta que coinciden con la versión de frontend/src/config/version.js.
+
+Uso: python scripts/esperar_despliegue.py [--url URL] [--version 1.2.3] [--plazo 600]
+Sale con 0 y el tiempo hasta estar en línea, o 1 si se agota el plazo.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+import urllib.request
+from pathlib import Path
+from typing import Callable
+
+ROOT = Path(__file__).resolve().parent.parent
+VERSION_JS = ROOT / "frontend" / "src" / "config" / "version.js"
+APP_URL = os.environ.get("URL_VERCEL", "https://rauli-panaderia-app.vercel.app")
+PLAZO_S = float(os.environ.get("DEPLOY_PLAZO_S", "600"))
+RUTAS_VERSION = ("/api/version", "/version.json")
+
+
+class DespliegueTimeout(TimeoutError):
+    """La versión esperada no apareció dentro del plazo."""
+
+
+def leer_version_local(version_js: Path = VERSION_JS) -> str:
+    if not version_js.exists():
+        return "1.0.0"
+    m = re.search(r'APP_VERSION\s*=\s*["\']([^"\']+)["\']', version_js.read_text(encoding="utf-8"))
+    return m.group(1) if m else "1.0.0"
+
+
+def leer_version_remota(url_base: str, timeout: float = 10) -> str | None:
+    """Versión servida por la app (sin caché). None si no responde o no es JSON de versión."""
+    for ruta in RUTAS_VERSION:
+        url = f"{url_base.rstrip('/')}{ruta}?t={int(time.time() * 1000)}"
+        req = urllib.request.Request(url, headers={"Cache-Control": "no-cache", "User-Agent": "rauli-deploy"})
+        try:
+            with urllib.request.urlopen(req, timeout=timeout) as r:
+                d = json.loads(r.read().decode("utf-8", errors="ignore"))
+            v = d.get("version") if isinstance(d, dict) else None
+            if isinstance(v, str):
+                return v
+        except Exception:
+            continue
+    return None
+
+
+def esperar(
+    comprobar: Callable[[], bool],
+    plazo_s: float = PLAZO_S,
+    intervalo_inicial: float = 3.0,
+    intervalo_max: float = 30.0,
+    descripcion: str = "despliegue",
+) -> float:
+    """Llama a comprobar() con backoff exponencial y jitter hasta True.
+    Devuelve los segundos transcurridos; DespliegueTimeout si se agota el plazo."""
+    t0 = time.monotonic()
+    intento = 0
+    while True:
+        if comprobar():
+            return time.monotonic() - t0
+        transcurrido = time.monotonic() - t0
+        restante = plazo_s - transcurrido
+        if restante <= 0:
+            raise DespliegueTimeout(f"{descripcion}: no listo tras {transcurrido:.0f} s (plazo {plazo_s:.0f} s)")
+        # Jitter "igual": entre la mitad y el total del intervalo exponencial
+        base = min(intervalo_max, intervalo_inicial * (2 ** intento))
+        time.sleep(min(restante, base / 2 + random.uniform(0, base / 2)))
+        intento += 1
+
+
+def esperar_version(url_base: str, version: str, plazo_s: float = PLAZO_S, verbose: bool = True) -> float:
+    """Espera hasta que url_base sirva `version`. Devuelve el tiempo hasta estar en línea."""
+    vista: list[str | None] = [None]
+
+    def _lista() -> bool:
+        v = leer_version_remota(url_base)
+        if verbose and v != vista[0]:
+            print(f"  {url_base}: versión en línea {v or '(sin respuesta)'}, esperando {version}")
+        vista[0] = v
+        return v == version
+
+    return esperar(_lista, plazo_s, descripcion=f"v{version} en {url_base}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Espera a que la versión desplegada esté en línea")
+    parser.add_argument("--url", default=APP_URL, help="URL base de la app")
+    parser.add_argument("--version", default=None, help="Versión esperada (default: version.js)")
+    parser.add_argument("--plazo", type=float, default=PLAZO_S, help="Segundos máximos de espera")
+    args = parser.parse_args()
+    version = args.version or leer_version_local()
+    try:
+        t = esperar_version(args.url, version, args.plazo)
+    except DespliegueTimeout as e:
+        print(f"ERROR: {e}")
+        return 1
+    print(f"  v{version} en línea en {t:.0f} s.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
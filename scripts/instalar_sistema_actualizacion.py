@@ -150,6 +150,7 @@ def main():
         ("write-version.js", scripts_dir),
         ("VersionChecker.jsx", components_dir),
         ("deploy_cadena.py", scripts_root),
+        ("orquestador.py", scripts_root),
         ("DEPLOY_CADENA.bat", scripts_root),
     ]:
         src = template / name
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+Orquestador de etapas de deploy como grafo de dependencias (DAG).
+
+- Cada etapa declara de qué etapas depende; las independientes corren en paralelo.
+- Timeout y política de reintentos por etapa.
+- Resumen de tiempos por etapa al terminar.
+- Estado persistido en .deploy_estado/<pipeline>.json: con reanudar=True se saltan las
+  etapas que ya terminaron OK en la ejecución anterior y se retoma desde la que falló.
+
+Una etapa es un comando (cmd=[...]) o una función Python (fn=callable(ctx) -> bool | None).
+`ctx` es un dict compartido entre etapas (valores JSON) que también se persiste.
+timeout_s mata el comando de una etapa cmd; una etapa fn limita sus propios subprocesos
+con ejecutar_comando(..., timeout_s=...).
+"""
+from __future__ import annotations
+
+import json
+import shlex
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable
+
+ROOT = Path(__file__).resolve().parent.parent
+ESTADO_DIR = ROOT / ".deploy_estado"
+
+
+class EtapaFallida(RuntimeError):
+    pass
+
+
+@dataclass
+class Etapa:
+    nombre: str
+    cmd: list[str] | None = None
+    fn: Callable[[dict[str, Any]], bool | None] | None = None
+    depende: tuple[str, ...] = ()
+    cwd: Path | None = None
+    shell: bool = False
+    timeout_s: float | None = None
+    reintentos: int = 0
+    espera_reintento_s: float = 5.0
+    # Opcional: si falla, el pipeline sigue y sus dependientes se ejecutan igual
+    opcional: bool = False
+    omitir: bool = False
+    # Resultado
+    estado: str = "pendiente"  # pendiente | en_curso | ok | error | omitida | bloqueada
+    intentos: int = 0
+    inicio: float | None = None
+    duracion_s: float = 0.0
+    detalle: str = ""
+
+
+def ejecutar_comando(cmd: list[str], cwd: Path | None = None, timeout_s: float | None = None, shell: bool = False) -> None:
+    """subprocess.run con timeout; EtapaFallida si el código de salida no es 0."""
+    # shell=True (npm.cmd en Windows): en POSIX hay que pasar una sola cadena
+    arg: Any = shlex.join(cmd) if shell and sys.platform != "win32" else cmd
+    try:
+        r = subprocess.run(arg, cwd=str(cwd or ROOT), shell=shell, timeout=timeout_s)
+    except subprocess.TimeoutExpired:
+        raise EtapaFallida(f"timeout tras {timeout_s:.0f} s")
+    if r.returncode != 0:
+        raise EtapaFallida(f"código de salida {r.returncode}")
+
+
+class Orquestador:
+    def __init__(self, nombre: str, etapas: list[Etapa], max_paralelo: int = 4, ctx: dict[str, Any] | None = None) -> None:
+        self.nombre = nombre
+        self.etapas = {e.nombre: e for e in etapas}
+        self.orden = [e.nombre for e in etapas]
+        self.max_paralelo = max(1, max_paralelo)
+        self.ctx: dict[str, Any] = dict(ctx or {})
+        self.estado_path = ESTADO_DIR / f"{nombre}.json"
+        self._t0 = 0.0
+        self._validar()
+
+    def _validar(self) -> None:
+        for e in self.etapas.values():
+            for d in e.depende:
+                if d not in self.etapas:
+                    raise ValueError(f"Etapa '{e.nombre}' depende de '{d}', que no existe")
+        # Detectar ciclos (DFS)
+        visitando, hechas = set(), set()
+
+        def _dfs(n: str) -> None:
+            if n in hechas:
+                return
+            if n in visitando:
+                raise ValueError(f"Ciclo de dependencias en '{n}'")
+            visitando.add(n)
+            for d in self.etapas[n].depende:
+                _dfs(d)
+            visitando.discard(n)
+            hechas.add(n)
+
+        for n in self.orden:
+            _dfs(n)
+
+    # --- Estado persistido (reanudar) ---
+
+    def _guardar_estado(self) -> None:
+        ESTADO_DIR.mkdir(parents=True, exist_ok=True)
+        data = {
+            "pipeline": self.nombre,
+            "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "ctx": {k: v for k, v in self.ctx.items() if isinstance(v, (str, int, float, bool, type(None)))},
+            "etapas": {n: {"estado": e.estado, "duracion_s": round(e.duracion_s, 2), "detalle": e.detalle}
+                       for n, e in self.etapas.items()},
+        }
+        tmp = self.estado_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+        tmp.replace(self.estado_path)
+
+    def _cargar_estado(self) -> None:
+        if not self.estado_path.exists():
+            return
+        try:
+            data = json.loads(self.estado_path.read_text(encoding="utf-8"))
+        except Exception:
+            return
+        for k, v in (data.get("ctx") or {}).items():
+            self.ctx.setdefault(k, v)
+        for n, info in (data.get("etapas") or {}).items():
+            if n in self.etapas and info.get("estado") == "ok":
+                e = self.etapas[n]
+                e.estado, e.detalle = "ok", "reanudada: OK en la ejecución anterior"
+
+    # --- Ejecución ---
+
+    def _correr(self, e: Etapa) -> None:
+        e.inicio = time.monotonic()
+        ultimo_error = ""
+        for intento in range(e.reintentos + 1):
+            e.intentos = intento + 1
+            try:
+                if e.cmd is not None:
+                    ejecutar_comando(e.cmd, e.cwd, e.timeout_s, e.shell)
+                elif e.fn is not None:
+                    if e.fn(self.ctx) is False:
+                        raise EtapaFallida("la etapa devolvió False")
+                e.duracion_s = time.monotonic() - e.inicio
+                return
+            except Exception as ex:
+                ultimo_error = str(ex)[:300]
+                if intento < e.reintentos:
+                    print(f"  [{e.nombre}] fallo ({ultimo_error}); reintento {intento + 1}/{e.reintentos} en {e.espera_reintento_s:.0f} s")
+                    time.sleep(e.espera_reintento_s)
+        e.duracion_s = time.monotonic() - e.inicio
+        raise EtapaFallida(ultimo_error)
+
+    def _lista(self, e: Etapa) -> bool | None:
+        """True si sus dependencias terminaron; None si alguna obligatoria falló (bloqueada)."""
+        for d in e.depende:
+            dep = self.etapas[d]
+            if dep.estado in ("ok", "omitida"):
+                continue
+            if dep.estado == "error" and dep.opcional:
+                continue
+            if dep.estado in ("error", "bloqueada"):
+                return None
+            return False
+        return True
+
+    def ejecutar(self, reanudar: bool = False) -> bool:
+        """Ejecuta el DAG. True si todas las etapas obligatorias terminaron OK."""
+        if reanudar:
+            self._cargar_estado()
+        for e in self.etapas.values():
+            if e.omitir and e.estado != "ok":
+                e.estado = "omitida"
+        self._t0 = time.monotonic()
+        en_curso: dict[Future, Etapa] = {}
+        with ThreadPoolExecutor(max_workers=self.max_paralelo, thread_name_prefix="etapa") as pool:
+            while True:
+                cambio = True
+                while cambio:  # repetir: un bloqueo puede propagarse a etapas ya revisadas
+                    cambio = False
+                    for n in self.orden:
+                        e = self.etapas[n]
+                        if e.estado != "pendiente":
+                            continue
+                        lista = self._lista(e)
+                        if lista is None:
+                            e.estado, e.detalle = "bloqueada", "dependencia fallida"
+                            cambio = True
+                        elif lista and len(en_curso) < self.max_paralelo:
+                            e.estado = "en_curso"
+                            print(f"\n--- {e.nombre} ---")
+                            en_curso[pool.submit(self._correr, e)] = e
+                if not en_curso:
+                    break
+                hechos, _ = wait(list(en_curso), return_when=FIRST_COMPLETED)
+                for f in hechos:
+                    e = en_curso.pop(f)
+                    try:
+                        f.result()
+                        e.estado = "ok"
+                        print(f"  [{e.nombre}] OK en {e.duracion_s:.1f} s")
+                    except Exception as ex:
+                        e.estado, e.detalle = "error", str(ex)[:300]
+                        aviso = " (opcional, se continúa)" if e.opcional else ""
+                        print(f"  [{e.nombre}] ERROR: {e.detalle}{aviso}")
+                    self._guardar_estado()
+        self._guardar_estado()
+        return all(e.estado in ("ok", "omitida") or (e.estado == "error" and e.opcional) for e in self.etapas.values())
+
+    def resumen(self) -> str:
+        total = time.monotonic() - self._t0 if self._t0 else 0.0
+        lineas = [f"=== Tiempos ({self.nombre}) ==="]
+        for n in self.orden:
+            e = self.etapas[n]
+            extra = f" x{e.intentos}" if e.intentos > 1 else ""
+            det = f"  {e.detalle[:60]}" if e.detalle and e.estado != "ok" else ""
+            lineas.append(f"  {n:<14} {e.estado:<9} {e.duracion_s:7.1f} s{extra}{det}")
+        lineas.append(f"  {'TOTAL (pared)':<14} {'':<9} {total:7.1f} s")
+        if self.estado_path.exists():
+            lineas.append(f"  Estado: {self.estado_path} (reanudar con --reanudar)")
+        return "\n".join(lineas)
@@ -16,6 +16,8 @@ import urllib.request
 import urllib.error
 from pathlib import Path
 
+from cache_build import construir
+
 ROOT = Path(__file__).resolve().parent.parent
 FRONTEND = ROOT / "frontend"
 DIST = FRONTEND / "dist"
@@ -69,10 +71,12 @@ def main() -> int:
     if proj:
         env["VERCEL_PROJECT_ID"] = proj
 
-    # 1) Build local (para tener dist actualizado)
+    # 1) Build local (para tener dist actualizado); reutiliza el dist si el frontend no cambió
     print("--- 1/3 Build frontend ---")
-    r = subprocess.run(["npm", "run", "build"], cwd=str(FRONTEND), shell=True, timeout=300)
-    if r.returncode != 0:
+    try:
+        construir()
+    except RuntimeError as e:
+        print(f"ERROR: {e}")
         return 1
     print("  Build OK.")
 
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Servicio de capturas compartido (RauliERP-Panaderia): un Chromium headless caliente
+y un contexto nuevo por captura. Devuelve PNG en memoria (bytes).
+
+    async with ServicioCapturas() as capt:
+        png = await capt.capturar("https://rauli-panaderia.onrender.com", preset="movil")
+        varias = await capt.capturar_varias([url_a, url_b])   # en paralelo
+
+Presets de viewport: "escritorio" (1366x900) y "movil" (390x844, táctil, DPR 3).
+El navegador se reutiliza, los contextos no: un contexto reciclado conservaría caché HTTP, cookies
+y el service worker de la PWA (frontend/public/sw.js) y la captura mostraría la versión anterior.
+Crear un contexto cuesta milisegundos; arrancar Chromium, segundos.
+Requiere: playwright + `playwright install chromium` (viene con browser-use).
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any
+
+VIEWPORTS: dict[str, dict[str, Any]] = {
+    "escritorio": {"viewport": {"width": 1366, "height": 900}},
+    "movil": {
+        "viewport": {"width": 390, "height": 844},
+        "device_scale_factor": 3,
+        "is_mobile": True,
+        "has_touch": True,
+        "user_agent": (
+            "Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) AppleWebKit/605.1.15 "
+            "(KHTML, like Gecko) Version/17.0 Mobile/15E148 Safari/604.1"
+        ),
+    },
+}
+
+
+class ServicioCapturas:
+    """Navegador caliente + un contexto limpio por captura (máximo `max_contextos` a la vez)."""
+
+    def __init__(self, max_contextos: int = 4, headless: bool = True) -> None:
+        self.max_contextos = max(1, max_contextos)
+        self.headless = headless
+        self._pw: Any = None
+        self._browser: Any = None
+        self._sem = asyncio.Semaphore(self.max_contextos)
+        self._lock = asyncio.Lock()
+        self._log = logging.getLogger(__name__)
+
+    async def __aenter__(self) -> "ServicioCapturas":
+        await self.iniciar()
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self.cerrar()
+
+    async def iniciar(self) -> None:
+        """Arranca Chromium (una vez). ImportError si playwright no está instalado."""
+        async with self._lock:
+            if self._browser is not None and self._browser.is_connected():
+                return
+            from playwright.async_api import async_playwright
+            if self._pw is None:
+                self._pw = await async_playwright().start()
+            self._browser = await self._pw.chromium.launch(headless=self.headless)
+
+    async def _nuevo_contexto(self, preset: str) -> Any:
+        if self._browser is None or not self._browser.is_connected():
+            await self.iniciar()
+        # Sin service workers: la página siempre sale de la red, no de la caché de la PWA
+        return await self._browser.new_context(service_workers="block", **VIEWPORTS[preset])
+
+    async def capturar(
+        self,
+        url: str,
+        preset: str = "escritorio",
+        full_page: bool = True,
+        timeout_ms: int = 20_000,
+        espera_s: float = 0.0,
+    ) -> bytes:
+        """Captura una URL y devuelve el PNG en memoria."""
+        if preset not in VIEWPORTS:
+            raise ValueError(f"Preset desconocido: {preset} (usa {', '.join(VIEWPORTS)})")
+        async with self._sem:
+            ctx = await self._nuevo_contexto(preset)
+            try:
+                page = await ctx.new_page()
+                await page.goto(url, wait_until="domcontentloaded", timeout=timeout_ms)
+                if espera_s:
+                    await asyncio.sleep(espera_s)
+                return await page.screenshot(full_page=full_page, type="png")
+            finally:
+                try:
+                    await ctx.close()
+                except Exception:
+                    pass
+
+    async def capturar_varias(
+        self, urls: list[str], preset: str = "escritorio", **kwargs: Any
+    ) -> dict[str, bytes | None]:
+        """Captura varias URLs en paralelo. {url: png | None si falló}."""
+        async def _una(u: str) -> bytes | None:
+            try:
+                return await self.capturar(u, preset, **kwargs)
+            except Exception as e:
+                self._log.warning("[Captura] %s: %s", u, e)
+                return None
+
+        pngs = await asyncio.gather(*(_una(u) for u in urls))
+        return dict(zip(urls, pngs))
+
+    async def cerrar(self) -> None:
+        async with self._lock:
+            if self._browser is not None:
+                try:
+                    await self._browser.close()
+                except Exception:
+                    pass
+                self._browser = None
+            if self._pw is not None:
+                await self._pw.stop()
+                self._pw = None
@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""
+Entrega a Telegram compartida por todos los robots y scripts (RauliERP-Panaderia).
+
+- Un httpx.AsyncClient persistente (pool keep-alive): sin TCP/TLS nuevo por mensaje.
+- Cola por chat con los límites de Telegram: ~1 mensaje/s por chat y 30/s en total.
+- Ráfagas de textos cortos al mismo chat se fusionan en un solo mensaje (≤ 4096).
+- 429: espera `retry_after` y reintenta; 5xx / red: backoff exponencial.
+- Álbumes de fotos con sendMediaGroup (en bloques de 10).
+
+Async (bot PTB):   entrega = EntregaTelegram(token); await entrega.enviar_texto(chat, "hola")
+Sync (scripts):    entrega_sync(token).enviar_texto(chat, "hola")
+"""
+from __future__ import annotations
+
+import asyncio
+import atexit
+import json
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Union
+
+import httpx
+
+API = "https://api.telegram.org/bot{token}/{metodo}"
+MAX_TEXTO = 4096
+MAX_CAPTION = 1024
+MAX_ALBUM = 10
+
+Foto = Union[Path, bytes]
+
+
+@dataclass
+class _Envio:
+    tipo: str  # "texto" | "fotos"
+    texto: str = ""
+    fotos: list[tuple[Foto, str]] = field(default_factory=list)
+    futuro: asyncio.Future | None = None
+
+
+@dataclass
+class _Canal:
+    pendientes: deque = field(default_factory=deque)
+    evento: asyncio.Event = field(default_factory=asyncio.Event)
+    proximo_envio: float = 0.0
+    tarea: asyncio.Task | None = None
+
+
+class EntregaTelegram:
+    """Cliente de envío async con cola por chat. Crear y usar dentro del mismo event loop."""
+
+    def __init__(
+        self,
+        token: str,
+        intervalo_chat: float = 1.0,
+        intervalo_global: float = 1 / 30,
+        ventana_fusion: float = 0.3,
+        max_corto: int = 1000,
+        reintentos: int = 4,
+    ) -> None:
+        self.token = token
+        self.intervalo_chat = intervalo_chat
+        self.intervalo_global = intervalo_global
+        self.ventana_fusion = ventana_fusion
+        self.max_corto = max_corto
+        self.reintentos = reintentos
+        self._client: httpx.AsyncClient | None = None
+        self._canales: dict[str, _Canal] = {}
+        self._global_lock = asyncio.Lock()
+        self._proximo_global = 0.0
+        self._cerrando = False
+        self._log = logging.getLogger(__name__)
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(30.0, connect=10.0),
+                limits=httpx.Limits(max_connections=10, max_keepalive_connections=5, keepalive_expiry=120),
+            )
+        return self._client
+
+    # --- API pública ---
+
+    async def enviar_texto(self, chat_id: str | int, texto: str, esperar: bool = True) -> bool:
+        if not texto:
+            return False
+        return await self._encolar(chat_id, _Envio("texto", texto=texto[:MAX_TEXTO]), esperar)
+
+    async def enviar_foto(self, chat_id: str | int, foto: Foto, caption: str = "", esperar: bool = True) -> bool:
+        return await self.enviar_album(chat_id, [(foto, caption)], esperar)
+
+    async def enviar_album(self, chat_id: str | int, fotos: list[tuple[Foto, str]], esperar: bool = True) -> bool:
+        """Fotos (ruta o bytes PNG, caption). 1 foto → sendPhoto; 2-10 → sendMediaGroup."""
+        fotos = [(f, c) for f, c in fotos if isinstance(f, bytes) or Path(f).exists()]
+        if not fotos:
+            return False
+        oks = []
+        for i in range(0, len(fotos), MAX_ALBUM):
+            oks.append(await self._encolar(chat_id, _Envio("fotos", fotos=fotos[i:i + MAX_ALBUM]), esperar))
+        return all(oks)
+
+    async def cerrar(self) -> None:
+        """Entrega lo pendiente y cierra el pool de conexiones."""
+        self._cerrando = True
+        for canal in self._canales.values():
+            canal.evento.set()
+        tareas = [c.tarea for c in self._canales.values() if c.tarea]
+        if tareas:
+            await asyncio.gather(*tareas, return_exceptions=True)
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    # --- Cola por chat ---
+
+    async def _encolar(self, chat_id: str | int, envio: _Envio, esperar: bool) -> bool:
+        if not self.token or self._cerrando:
+            return False
+        clave = str(chat_id)
+        canal = self._canales.get(clave)
+        if canal is None:
+            canal = self._canales[clave] = _Canal()
+        envio.futuro = asyncio.get_running_loop().create_future()
+        canal.pendientes.append(envio)
+        canal.evento.set()
+        if canal.tarea is None or canal.tarea.done():
+            canal.tarea = asyncio.create_task(self._worker(clave, canal))
+        if not esperar:
+            return True
+        return await envio.futuro
+
+    def _es_corto(self, e: _Envio) -> bool:
+        return e.tipo == "texto" and len(e.texto) <= self.max_corto
+
+    async def _worker(self, chat_id: str, canal: _Canal) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            if not canal.pendientes:
+                if self._cerrando:
+                    return
+                canal.evento.clear()
+                await canal.evento.wait()
+                continue
+            espera = canal.proximo_envio - loop.time()
+            if espera <= 0 and self._es_corto(canal.pendientes[0]) and not self._cerrando:
+                espera = self.ventana_fusion  # dar tiempo a que llegue el resto de la ráfaga
+            if espera > 0:
+                await asyncio.sleep(espera)
+            lote = [canal.pendientes.popleft()]
+            if self._es_corto(lote[0]):
+                total = len(lote[0].texto)
+                while canal.pendientes and self._es_corto(canal.pendientes[0]):
+                    sig = canal.pendientes[0]
+                    if total + 1 + len(sig.texto) > MAX_TEXTO:
+                        break
+                    total += 1 + len(sig.texto)
+                    lote.append(canal.pendientes.popleft())
+            try:
+                if lote[0].tipo == "texto":
+                    ok = await self._post("sendMessage", chat_id, data={"text": "\n".join(e.texto for e in lote)})
+                else:
+                    ok = await self._enviar_fotos(chat_id, lote[0].fotos)
+            except Exception as ex:
+                self._log.warning("[Telegram] %s", ex)
+                ok = False
+            canal.proximo_envio = loop.time() + self.intervalo_chat
+            for e in lote:
+                if e.futuro and not e.futuro.done():
+                    e.futuro.set_result(ok)
+
+    async def _enviar_fotos(self, chat_id: str, fotos: list[tuple[Foto, str]]) -> bool:
+        def _archivo(f: Foto, nombre: str) -> tuple[str, bytes, str]:
+            datos = f if isinstance(f, bytes) else Path(f).read_bytes()
+            return (nombre if isinstance(f, bytes) else Path(f).name, datos, "image/png")
+
+        if len(fotos) == 1:
+            foto, caption = fotos[0]
+            return await self._post(
+                "sendPhoto", chat_id,
+                data={"caption": (caption or "")[:MAX_CAPTION]},
+                files={"photo": _archivo(foto, "captura.png")},
+            )
+        media, files = [], {}
+        for i, (foto, caption) in enumerate(fotos):
+            files[f"f{i}"] = _archivo(foto, f"captura_{i}.png")
+            item = {"type": "photo", "media": f"attach://f{i}"}
+            if caption:
+                item["caption"] = caption[:MAX_CAPTION]
+            media.append(item)
+        return await self._post("sendMediaGroup", chat_id, data={"media": json.dumps(media)}, files=files)
+
+    # --- HTTP con límites y reintentos ---
+
+    async def _turno_global(self) -> None:
+        loop = asyncio.get_running_loop()
+        async with self._global_lock:
+            espera = self._proximo_global - loop.time()
+            if espera > 0:
+                await asyncio.sleep(espera)
+            self._proximo_global = loop.time() + self.intervalo_global
+
+    async def _post(self, metodo: str, chat_id: str, data: dict[str, Any], files: dict | None = None) -> bool:
+        url = API.format(token=self.token, metodo=metodo)
+        data = {"chat_id": chat_id, **data}
+        backoff = 1.0
+        for intento in range(self.reintentos + 1):
+            await self._turno_global()
+            try:
+                r = await self._get_client().post(url, data=data, files=files)
+            except httpx.TransportError as e:
+                self._log.warning("[Telegram] %s: %s (intento %d)", metodo, e, intento + 1)
+                await asyncio.sleep(backoff)
+                backoff *= 2
+                continue
+            if r.status_code == 200:
+                return True
+            if r.status_code == 429:
+                try:
+                    retry_after = float(r.json().get("parameters", {}).get("retry_after", 0))
+                except Exception:
+                    retry_after = float(r.headers.get("Retry-After", 0) or 0)
+                espera = max(retry_after, backoff)
+                self._log.info("[Telegram] 429 en %s: reintento en %.0f s", metodo, espera)
+                await asyncio.sleep(espera)
+                continue
+            if r.status_code >= 500:
+                await asyncio.sleep(backoff)
+                backoff *= 2
+                continue
+            self._log.warning("[Telegram] %s HTTP %s: %s", metodo, r.status_code, r.text[:200])
+            return False
+        return False
+
+
+class EntregaSync:
+    """Fachada síncrona para scripts: un event loop en un hilo propio con un EntregaTelegram."""
+
+    def __init__(self, token: str) -> None:
+        self._loop = asyncio.new_event_loop()
+        self._hilo = threading.Thread(target=self._loop.run_forever, name="telegram-entrega", daemon=True)
+        self._hilo.start()
+        self._entrega: EntregaTelegram = self._ejecutar(self._crear(token))
+
+    @staticmethod
+    async def _crear(token: str) -> EntregaTelegram:
+        return EntregaTelegram(token)
+
+    def _ejecutar(self, coro: Any, timeout: float | None = 300) -> Any:
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result(timeout)
+
+    def enviar_texto(self, chat_id: str | int, texto: str, esperar: bool = True) -> bool:
+        return self._ejecutar(self._entrega.enviar_texto(chat_id, texto, esperar))
+
+    def enviar_foto(self, chat_id: str | int, foto: Foto, caption: str = "", esperar: bool = True) -> bool:
+        return self._ejecutar(self._entrega.enviar_foto(chat_id, foto, caption, esperar))
+
+    def enviar_album(self, chat_id: str | int, fotos: list[tuple[Foto, str]], esperar: bool = True) -> bool:
+        return self._ejecutar(self._entrega.enviar_album(chat_id, fotos, esperar))
+
+    def cerrar(self, timeout: float = 60) -> None:
+        if not self._loop.is_running():
+            return
+        try:
+            self._ejecutar(self._entrega.cerrar(), timeout)
+        except Exception:
+            pass
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._hilo.join(timeout=5)
+
+
+_sync: dict[str, EntregaSync] = {}
+_sync_lock = threading.Lock()
+
+
+def entrega_sync(token: str) -> EntregaSync:
+    """Instancia compartida por token; al salir del proceso se entrega lo pendiente."""
+    with _sync_lock:
+        e = _sync.get(token)
+        if e is None:
+            e = _sync[token] = EntregaSync(token)
+        return e
+
+
+@atexit.register
+def _cerrar_todo() -> None:
+    for e in list(_sync.values()):
+        e.cerrar()
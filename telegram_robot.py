@@ -73,16 +73,14 @@ def telegram_available() -> bool:
     return bool(token and chat and token != "TU_BOT_TOKEN" and chat != "TU_CHAT_ID")
 
 
-def telegram_send(text: str) -> bool:
-    """Envía mensaje de texto a Telegram."""
+def telegram_send(text: str, esperar: bool = True) -> bool:
+    """Envía mensaje de texto a Telegram (cliente compartido: pool + cola con límites)."""
     token, chat = _load_config()
     if not telegram_available():
         return False
     try:
-        import httpx
-        url = f"https://api.telegram.org/bot{token}/sendMessage"
-        r = httpx.post(url, json={"chat_id": chat, "text": text[:4096]}, timeout=15.0)
-        return r.status_code == 200
+        from telegram_entrega import entrega_sync
+        return entrega_sync(token).enviar_texto(chat, text, esperar)
     except Exception as e:
         logging.getLogger(__name__).warning("[Telegram] %s", e)
         return False
@@ -92,17 +90,17 @@ def telegram_send_photo(path: Path, caption: str = "") -> bool:
     """Envía imagen a Telegram."""
     if not path.exists():
         return False
+    return telegram_send_album([(path, caption)])
+
+
+def telegram_send_album(fotos: list[tuple[Path, str]]) -> bool:
+    """Envía varias imágenes como álbum (sendMediaGroup)."""
     token, chat = _load_config()
     if not telegram_available():
         return False
     try:
-        import httpx
-        url = f"https://api.telegram.org/bot{token}/sendPhoto"
-        with open(path, "rb") as f:
-            files = {"photo": (path.name, f, "image/png")}
-            data = {"chat_id": chat, "caption": caption[:1024]}
-            r = httpx.post(url, data=data, files=files, timeout=30.0)
-        return r.status_code == 200
+        from telegram_entrega import entrega_sync
+        return entrega_sync(token).enviar_album(chat, fotos)
     except Exception as e:
         logging.getLogger(__name__).warning("[Telegram] %s", e)
         return False
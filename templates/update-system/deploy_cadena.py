@@ -4,7 +4,9 @@ Cadena estándar: build frontend (genera version.json), git add/commit/push a Gi
 y opcional notificación (Telegram). Vercel/Railway suelen desplegar solos al hacer push.
 Reutilizable en cualquier proyecto. Credenciales desde bóveda (credenciales.txt) o env.
 
-Uso: python scripts/deploy_cadena.py [--no-git] [--no-notify]
+Etapas en DAG con orquestador.py (misma carpeta): tiempos por etapa y --reanudar.
+
+Uso: python scripts/deploy_cadena.py [--no-git] [--no-notify] [--reanudar]
 Variables: DEPLOY_BRANCH (default main), FRONTEND_DIR (default frontend), GH_TOKEN, TELEGRAM_TOKEN, TELEGRAM_CHAT_ID
 """
 from __future__ import annotations
@@ -19,6 +21,8 @@ import urllib.parse
 import urllib.request
 from pathlib import Path
 
+from orquestador import Etapa, EtapaFallida, Orquestador, ejecutar_comando
+
 # Cuando el script está en scripts/, ROOT = raíz del proyecto
 ROOT = Path(__file__).resolve().parent.parent
 FRONTEND = Path(os.environ.get("FRONTEND_DIR", str(ROOT / "frontend"))).resolve()
@@ -85,10 +89,43 @@ def send_telegram(text: str) -> bool:
         return False
 
 
+def _etapa_git(ctx: dict) -> None:
+    subprocess.run(["git", "add", "-A"], cwd=str(ROOT), timeout=10, check=False)
+    r = subprocess.run(["git", "diff", "--cached", "--quiet"], cwd=str(ROOT), timeout=5)
+    if r.returncode != 0:
+        subprocess.run(
+            ["git", "commit", "-m", "Deploy v{}: actualizacion automatica".format(ctx["version"])],
+            cwd=str(ROOT),
+            timeout=10,
+            check=False,
+        )
+    destino = "origin"
+    gh = _load_from_vault(("GH_TOKEN", "GITHUB_TOKEN"))
+    if gh:
+        r = subprocess.run(["git", "remote", "get-url", "origin"], cwd=str(ROOT), capture_output=True, text=True, timeout=5)
+        url = (r.stdout or "").strip()
+        if url.startswith("https://github.com/"):
+            destino = "https://{}@github.com/".format(gh) + url.split("github.com/", 1)[-1]
+    ejecutar_comando(["git", "push", destino, "{}:{}".format(BRANCH, BRANCH)], timeout_s=90)
+    print("  Git OK. Vercel/Railway suelen desplegar solos al detectar el push.")
+
+
+def _etapa_notificar(ctx: dict) -> None:
+    msg = (
+        "App v{} desplegada.\n\n"
+        "URL: {}\n\n"
+        "Si la app tiene VersionChecker, los usuarios veran \"Nueva actualizacion disponible\" y \"Actualizar ahora\"."
+    ).format(ctx["version"], APP_URL)
+    if not send_telegram(msg):
+        raise EtapaFallida("Telegram no configurado (TELEGRAM_TOKEN, TELEGRAM_CHAT_ID en boveda).")
+    print("  Telegram OK.")
+
+
 def main() -> int:
     parser = argparse.ArgumentParser(description="Cadena: build + git push + opcional Telegram")
     parser.add_argument("--no-git", action="store_true", help="No hacer git add/commit/push")
     parser.add_argument("--no-notify", action="store_true", help="No enviar Telegram")
+    parser.add_argument("--reanudar", action="store_true", help="Retomar desde la etapa que falló en la última ejecución")
     args = parser.parse_args()
 
     version = read_version()
@@ -99,65 +136,22 @@ def main() -> int:
         print("ERROR: No existe directorio frontend: {}".format(FRONTEND))
         return 1
 
-    # 1) Build frontend
-    print("--- 1/3 Build frontend ---\n")
-    r = subprocess.run(
-        ["npm", "run", "build"],
-        cwd=str(FRONTEND),
-        shell=True,
-        timeout=300,
-    )
-    if r.returncode != 0:
-        print("ERROR: Build fallo.")
-        return 1
-    print("  Build OK.\n")
-
-    if not args.no_git:
-        # 2) Git add, commit, push
-        print("--- 2/3 Git add/commit/push (GitHub) ---\n")
-        subprocess.run(["git", "add", "-A"], cwd=str(ROOT), timeout=10, check=False)
-        r = subprocess.run(["git", "diff", "--cached", "--quiet"], cwd=str(ROOT), timeout=5)
-        if r.returncode != 0:
-            subprocess.run(
-                ["git", "commit", "-m", "Deploy v{}: actualizacion automatica".format(version)],
-                cwd=str(ROOT),
-                timeout=10,
-                check=False,
-            )
-        gh = _load_from_vault(("GH_TOKEN", "GITHUB_TOKEN"))
-        if gh:
-            r = subprocess.run(["git", "remote", "get-url", "origin"], cwd=str(ROOT), capture_output=True, text=True, timeout=5)
-            url = (r.stdout or "").strip()
-            if url.startswith("https://github.com/"):
-                push_url = "https://{}@github.com/".format(gh) + url.split("github.com/", 1)[-1]
-                subprocess.run(["git", "push", push_url, "{}:{}".format(BRANCH, BRANCH)], cwd=str(ROOT), timeout=90, check=False)
-            else:
-                subprocess.run(["git", "push", "origin", BRANCH], cwd=str(ROOT), timeout=90, check=False)
-        else:
-            subprocess.run(["git", "push", "origin", BRANCH], cwd=str(ROOT), timeout=90, check=False)
-        print("  Git OK. Vercel/Railway suelen desplegar solos al detectar el push.\n")
-    else:
-        print("--- 2/3 Git omitido (--no-git) ---\n")
-
-    # 3) Notificar (opcional)
-    if not args.no_notify and APP_URL:
-        print("--- 3/3 Notificar ---\n")
-        msg = (
-            "App v{} desplegada.\n\n"
-            "URL: {}\n\n"
-            "Si la app tiene VersionChecker, los usuarios veran \"Nueva actualizacion disponible\" y \"Actualizar ahora\"."
-        ).format(version, APP_URL)
-        if send_telegram(msg):
-            print("  Telegram OK.\n")
-        else:
-            print("  Telegram no configurado (TELEGRAM_TOKEN, TELEGRAM_CHAT_ID en boveda).\n")
-    else:
-        print("--- 3/3 Notificar omitido ---\n")
+    orq = Orquestador("deploy_cadena", [
+        Etapa("build", cmd=["npm", "run", "build"], cwd=FRONTEND, shell=True, timeout_s=300),
+        Etapa("git", fn=_etapa_git, depende=("build",), reintentos=2, omitir=args.no_git),
+        Etapa("notificar", fn=_etapa_notificar, depende=("git",), opcional=True, omitir=args.no_notify or not APP_URL),
+    ], ctx={"version": version})
+    ok = orq.ejecutar(reanudar=args.reanudar)
 
+    print()
+    print(orq.resumen())
     print("=" * 50)
-    print("  Cadena lista: repo en GitHub actualizado; Vercel/Railway despliegan al hacer push.")
+    if ok:
+        print("  Cadena lista: repo en GitHub actualizado; Vercel/Railway despliegan al hacer push.")
+    else:
+        print("  Cadena incompleta. Corrige el fallo y ejecuta: python scripts/deploy_cadena.py --reanudar")
     print("=" * 50)
-    return 0
+    return 0 if ok else 1
 
 
 if __name__ == "__main__":
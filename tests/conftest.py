@@ -0,0 +1,10 @@
+# -*- coding: utf-8 -*-
+"""Rutas de importación: el motor de backups vive en la raíz, el bot en robot/ y los scripts de
+deploy en scripts/ (cada uno se importa con imports planos entre hermanos)."""
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+for ruta in (ROOT, ROOT / "robot", ROOT / "scripts"):
+    if str(ruta) not in sys.path:
+        sys.path.insert(0, str(ruta))
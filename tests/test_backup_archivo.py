@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+import os
+import tarfile
+
+import pytest
+
+import backup_archivo
+from backup_archivo import MIEMBRO_INDICE, EscritorArchivo, LectorArchivo, ruta_indice
+
+
+class FalloLectura(OSError):
+    pass
+
+
+def _escribir(tmp_path, nombre, datos):
+    p = tmp_path / "src" / nombre
+    p.parent.mkdir(parents=True, exist_ok=True)
+    p.write_bytes(datos)
+    return p
+
+
+@pytest.mark.parametrize("fallo", ["abrir", "leer"])
+def test_un_origen_que_falla_no_deja_miembro(tmp_path, monkeypatch, fallo):
+    buenos = {"a.txt": b"uno\n" * 1000, "c.txt": b"tres\n" * 1000}
+    rutas = {rel: _escribir(tmp_path, rel, datos) for rel, datos in buenos.items()}
+    malo = _escribir(tmp_path, "b.txt", b"dos\n" * 100_000)
+    ruta_tar = tmp_path / "backup.tar"
+
+    st_malo = malo.stat()
+    if fallo == "abrir":
+        malo.unlink()  # borrado tras el stat
+    else:
+        abrir = open
+
+        class LectorRoto:
+            def __init__(self, f):
+                self.f, self.leidas = f, 0
+
+            def read(self, n):
+                self.leidas += 1
+                if self.leidas > 1:
+                    raise FalloLectura("error de E/S a mitad")
+                return self.f.read(n)
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                self.f.close()
+
+        def abrir_roto(ruta, modo="r", *a, **k):
+            f = abrir(ruta, modo, *a, **k)
+            return LectorRoto(f) if os.fspath(ruta) == os.fspath(malo) else f
+
+        monkeypatch.setattr(backup_archivo, "open", abrir_roto, raising=False)
+        monkeypatch.setattr(backup_archivo, "BLOQUE", 4096)
+
+    with EscritorArchivo(ruta_tar, "gzip") as escritor:
+        escritor.agregar("a.txt", rutas["a.txt"], rutas["a.txt"].stat())
+        with pytest.raises(OSError):
+            escritor.agregar("b.txt", malo, st_malo)
+        escritor.agregar("c.txt", rutas["c.txt"], rutas["c.txt"].stat())
+    monkeypatch.undo()
+
+    with tarfile.open(ruta_tar, "r:") as tar:
+        assert tar.getnames() == ["a.txt.gz", "c.txt.gz", MIEMBRO_INDICE]
+
+    # Con el índice aparte y con el que va dentro del tar
+    for quitar_indice in (False, True):
+        if quitar_indice:
+            ruta_indice(ruta_tar).unlink()
+        lector = LectorArchivo(ruta_tar)
+        assert sorted(lector.indice) == ["a.txt", "c.txt"]
+        for rel, datos in buenos.items():
+            assert b"".join(lector.leer(rel)) == datos
+            assert lector.verificar(rel)
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime, timedelta
+
+from backup_retencion import PoliticaRetencion, seleccionar
+
+AHORA = datetime(2026, 10, 18, 12, 0, 0)
+
+
+def _backups(pasos_min, n):
+    """n backups separados pasos_min minutos, del más reciente (b0) al más antiguo."""
+    return [(f"b{i}", (AHORA - timedelta(minutes=pasos_min * i)).strftime("%Y%m%d_%H%M%S")) for i in range(n)]
+
+
+def test_vacio():
+    assert seleccionar([], PoliticaRetencion(), ahora=AHORA) == ({}, [])
+
+
+def test_el_ultimo_se_conserva_siempre():
+    politica = PoliticaRetencion(0, 0, 0, 0, cuartos=0, gracia_min=0)
+    conservar, borrar = seleccionar(_backups(60, 3), politica, ahora=AHORA)
+    assert conservar == {"b0": ["último"]}
+    assert borrar == ["b1", "b2"]
+
+
+def test_un_backup_por_hora():
+    # Cada 10 min durante 5 h: con 3 horarios se queda el más reciente de cada una de las 3 últimas horas
+    politica = PoliticaRetencion(horarios=3, diarios=0, semanales=0, mensuales=0, cuartos=0, gracia_min=0)
+    conservar, borrar = seleccionar(_backups(10, 30), politica, ahora=AHORA)
+    horarios = sorted((n for n, niveles in conservar.items() if "horarios" in niveles), key=lambda n: int(n[1:]))
+    assert horarios == ["b0", "b1", "b7"]  # 12:00, 11:50 (hora 11), 10:50 (hora 10)
+    assert set(conservar) | set(borrar) == {f"b{i}" for i in range(30)}
+    assert not set(conservar) & set(borrar)
+
+
+def test_cuartos_de_hora_conservan_los_snapshots_finos():
+    politica = PoliticaRetencion(horarios=0, diarios=0, semanales=0, mensuales=0, cuartos=4, gracia_min=0)
+    conservar, _ = seleccionar(_backups(5, 12), politica, ahora=AHORA)
+    cuartos = [n for n, niveles in conservar.items() if "cuartos" in niveles]
+    assert sorted(cuartos, key=lambda n: int(n[1:])) == ["b0", "b1", "b4", "b7"]
+
+
+def test_gracia_conserva_lo_reciente():
+    politica = PoliticaRetencion(0, 0, 0, 0, cuartos=0, gracia_min=30)
+    conservar, borrar = seleccionar(_backups(10, 6), politica, ahora=AHORA)
+    assert set(conservar) == {"b0", "b1", "b2"}  # 12:00, 11:50, 11:40 (< 30 min)
+    assert borrar == ["b3", "b4", "b5"]
+
+
+def test_protegidos_no_se_borran_ni_ocupan_cupo():
+    politica = PoliticaRetencion(0, 0, 0, 0, cuartos=0, gracia_min=0)
+    conservar, borrar = seleccionar(_backups(60, 4), politica, protegidos=["b0", "b3"], ahora=AHORA)
+    assert conservar["b0"] == ["protegido"]
+    assert conservar["b3"] == ["protegido"]
+    # El último no protegido sigue conservándose como "último"
+    assert conservar["b1"] == ["último"]
+    assert borrar == ["b2"]
+
+
+def test_politica_desde_env(monkeypatch):
+    monkeypatch.setenv("BACKUP_RETENCION", "12,3,2,6")
+    monkeypatch.setenv("BACKUP_RETENCION_GRACIA_MIN", "15")
+    p = PoliticaRetencion.desde_env()
+    assert (p.horarios, p.diarios, p.semanales, p.mensuales, p.cuartos, p.gracia_min) == (12, 3, 2, 6, 8, 15.0)
+    monkeypatch.setenv("BACKUP_RETENCION", "basura")
+    assert str(PoliticaRetencion.desde_env()) == "8c/24h/7d/4s/12m"
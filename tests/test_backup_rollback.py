@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+import os
+
+import pytest
+
+from backup_catalogo import CatalogoBackups
+from backup_rollback import BackupRollbackManager
+
+
+def _sha(datos: bytes) -> str:
+    return hashlib.sha256(datos).hexdigest()
+
+
+def _escribir(raiz, rel, datos: bytes):
+    p = raiz / rel
+    p.parent.mkdir(parents=True, exist_ok=True)
+    p.write_bytes(datos)
+    return p
+
+
+@pytest.fixture
+def arbol(tmp_path):
+    raiz = tmp_path / "proyecto"
+    _escribir(raiz, "a.txt", b"uno\n")
+    _escribir(raiz, "src/b.py", b"print('b')\n")
+    _escribir(raiz, "src/c.py", b"print('c')\n")
+    return raiz
+
+
+def _manager(raiz):
+    manager = BackupRollbackManager(raiz=raiz)
+    manager.telegram_token = None
+    return manager
+
+
+def test_plan_vacio_sin_cambios(arbol):
+    m = _manager(arbol)
+    nombre = m.crear_backup_completo("prueba")
+    assert m.plan_rollback(nombre) == {"escribir": [], "borrar": [], "renombrar": [], "permisos": []}
+
+
+def test_plan_escribe_borra_y_renombra(arbol):
+    m = _manager(arbol)
+    nombre = m.crear_backup_completo("prueba")
+    (arbol / "a.txt").write_bytes(b"cambiado\n")
+    _escribir(arbol, "nuevo.txt", b"sobra\n")
+    os.replace(arbol / "src/c.py", arbol / "src/movido.py")
+    plan = m.plan_rollback(nombre)
+    assert plan["escribir"] == ["a.txt"]
+    assert plan["borrar"] == ["nuevo.txt"]
+    # El contenido de c.py sigue en el árbol con otro nombre: se mueve en lugar de copiarse
+    assert plan["renombrar"] == [("src/movido.py", "src/c.py")]
+
+    assert m.hacer_rollback(nombre)
+    assert (arbol / "a.txt").read_bytes() == b"uno\n"
+    assert (arbol / "src/c.py").read_bytes() == b"print('c')\n"
+    assert not (arbol / "nuevo.txt").exists()
+    assert not (arbol / "src/movido.py").exists()
+
+
+@pytest.mark.skipif(os.name == "nt", reason="permisos POSIX")
+def test_plan_permisos(arbol):
+    m = _manager(arbol)
+    os.chmod(arbol / "a.txt", 0o644)
+    nombre = m.crear_backup_completo("prueba")
+    os.chmod(arbol / "a.txt", 0o600)
+    plan = m.plan_rollback(nombre)
+    assert plan["permisos"] == ["a.txt"] and not plan["escribir"]
+
+
+def test_dry_run_no_toca_el_arbol(arbol):
+    m = _manager(arbol)
+    nombre = m.crear_backup_completo("prueba")
+    (arbol / "a.txt").write_bytes(b"cambiado\n")
+    m.hacer_rollback(nombre, dry_run=True)
+    assert (arbol / "a.txt").read_bytes() == b"cambiado\n"
+
+
+def test_archivo_que_cambia_durante_el_backup_no_se_pierde(arbol):
+    m = _manager(arbol)
+    existe = m.almacen.existe
+
+    def existe_y_modifica(digest):
+        # Simula una escritura entre el hashing y la copia al almacén
+        (arbol / "a.txt").write_bytes(b"escrito a mitad de backup\n")
+        return existe(digest)
+
+    m.almacen.existe = existe_y_modifica
+    nombre = m.crear_backup_completo("prueba")
+    m.almacen.existe = existe
+    info = m.catalogo.archivos(nombre)["a.txt"]
+    assert info["hash"] == _sha(b"escrito a mitad de backup\n")
+    (arbol / "a.txt").unlink()
+    assert m.plan_rollback(nombre)["escribir"] == ["a.txt"]
+
+
+def _copia_antigua(raiz, claves_windows: bool):
+    """Copia de directorio como las de antes del catálogo (robocopy + backup_metadata.json)."""
+    copia = raiz / "backups" / "backup_completo_20240101_000000"
+    hashes = {}
+    for p in sorted(raiz.rglob("*")):
+        if p.is_file() and "backups" not in p.relative_to(raiz).parts:
+            rel = p.relative_to(raiz).as_posix()
+            _escribir(copia, rel, p.read_bytes())
+            hashes[rel.replace("/", "\\") if claves_windows else rel] = _sha(p.read_bytes())
+    # robocopy también copiaba backups/ dentro de la copia
+    hashes["backups\\viejo\\x.txt" if claves_windows else "backups/viejo/x.txt"] = _sha(b"x")
+    metadata = {
+        "backups": [{
+            "name": copia.name,
+            "timestamp": "20240101_000000",
+            "descripcion": "",
+            "tipo": "completo",
+            "path": str(copia),
+            "file_hashes": hashes,
+        }],
+        "current_backup": copia.name,
+    }
+    (raiz / "backups" / "backup_metadata.json").write_text(json.dumps(metadata), encoding="utf-8")
+    return copia.name
+
+
+@pytest.mark.parametrize("claves_windows", [False, True])
+def test_plan_copia_antigua(arbol, claves_windows):
+    nombre = _copia_antigua(arbol, claves_windows)
+    m = _manager(arbol)
+    assert set(m.catalogo.archivos(nombre)) == {"a.txt", "src/b.py", "src/c.py"}
+    assert m.plan_rollback(nombre) == {"escribir": [], "borrar": [], "renombrar": [], "permisos": []}
+
+    (arbol / "src/b.py").write_bytes(b"roto\n")
+    plan = m.plan_rollback(nombre)
+    assert plan["escribir"] == ["src/b.py"] and not plan["borrar"]
+    assert m.hacer_rollback(nombre)
+    assert (arbol / "src/b.py").read_bytes() == b"print('b')\n"
+    assert (arbol / "src/c.py").exists()
+
+
+def test_catalogo_migrado_antes_se_normaliza(tmp_path):
+    ruta_db = tmp_path / "catalogo.db"
+    catalogo = CatalogoBackups(ruta_db)
+    catalogo.registrar(
+        {"nombre": "viejo", "timestamp": "20240101_000000", "tipo": "completo"},
+        {"src\\b.py": {"hash": "h1"}, "backups\\x\\y.txt": {"hash": "h2"}, "a.txt": {"hash": "h3"}},
+        con_blobs=False,
+    )
+    catalogo.cerrar()
+    catalogo = CatalogoBackups(ruta_db)
+    assert set(catalogo.archivos("viejo")) == {"src/b.py", "a.txt"}
+    catalogo.cerrar()
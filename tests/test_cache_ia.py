@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+import types
+
+import pytest
+
+import cache_ia
+from cache_ia import CacheIA
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    r = types.SimpleNamespace(t=1_000_000.0)
+    monkeypatch.setattr(cache_ia, "time", types.SimpleNamespace(time=lambda: r.t))
+    return r
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.delenv("IA_CACHE", raising=False)
+    return CacheIA(tmp_path / "cache.db", max_memoria=2, max_entradas=10)
+
+
+def test_clave_normaliza_el_prompt():
+    assert CacheIA.clave("  Hola\n  mundo ", "groq") == CacheIA.clave("Hola mundo", "groq")
+    assert CacheIA.clave("Hola", "groq") != CacheIA.clave("Hola", "gemini")
+    assert CacheIA.clave("Hola", "groq", "m1") != CacheIA.clave("Hola", "groq", "m2")
+    assert CacheIA.clave("Hola", "groq", temperatura=0) != CacheIA.clave("Hola", "groq", temperatura=1)
+
+
+def test_consultar_llama_una_sola_vez(cache):
+    llamadas = []
+
+    def fn():
+        llamadas.append(1)
+        return "respuesta", "groq"
+
+    assert cache.consultar("hola", fn, "hibrido") == ("respuesta", "groq", False)
+    assert cache.consultar("hola", fn, "hibrido") == ("respuesta", "groq", True)
+    assert len(llamadas) == 1
+
+
+def test_vacio_no_se_cachea(cache):
+    assert cache.consultar("hola", lambda: ("", "groq"), "hibrido") == ("", "groq", False)
+    assert cache.obtener(CacheIA.clave("hola", "hibrido")) is None
+
+
+def test_ttl(cache, reloj):
+    cache.guardar("k", "texto", "groq", ttl_s=60)
+    reloj.t += 59
+    assert cache.obtener("k") == ("texto", "groq")
+    reloj.t += 2
+    assert cache.obtener("k") is None
+
+
+def test_ttl_desde_disco(tmp_path, reloj, monkeypatch):
+    monkeypatch.delenv("IA_CACHE", raising=False)
+    CacheIA(tmp_path / "c.db").guardar("k", "texto", "groq", ttl_s=60)
+    otra = CacheIA(tmp_path / "c.db")  # memoria vacía: se lee de SQLite
+    assert otra.obtener("k") == ("texto", "groq")
+    assert otra.aciertos_disco == 1
+    reloj.t += 61
+    assert CacheIA(tmp_path / "c.db").obtener("k") is None
+
+
+def test_lru_en_memoria(cache):
+    for k in ("a", "b", "c"):
+        cache.guardar(k, k.upper(), "groq")
+    # max_memoria=2: "a" salió de memoria pero sigue en disco
+    assert list(cache._memoria) == ["b", "c"]
+    assert cache.obtener("a") == ("A", "groq")
+    assert cache.aciertos_disco == 1
+    assert list(cache._memoria) == ["c", "a"]
+
+
+def test_podar_caducadas_y_menos_usadas(cache, reloj):
+    cache.guardar("vieja", "x", "groq", ttl_s=1)
+    for i in range(12):
+        reloj.t += 1
+        cache.guardar(f"k{i}", "x", "groq")
+    reloj.t += 1
+    cache.obtener("k0")  # k0 se usó hace poco: no es de las que sobran
+    cache.podar()
+    con = cache._conexion()
+    claves = {c for (c,) in con.execute("SELECT clave FROM respuestas")}
+    assert "vieja" not in claves
+    assert len(claves) <= cache.max_entradas
+    assert "k0" in claves and "k11" in claves
+    assert "k1" not in claves
+
+
+def test_sin_cache_por_llamada(cache):
+    cache.consultar("hola", lambda: ("uno", "groq"), "hibrido")
+    assert cache.consultar("hola", lambda: ("dos", "groq"), "hibrido", sin_cache=True) == ("dos", "groq", False)
+    assert cache.consultar("hola", lambda: ("tres", "groq"), "hibrido") == ("uno", "groq", True)
+
+
+def test_desactivada_con_ia_cache_0(cache, monkeypatch):
+    cache.guardar("k", "texto", "groq")
+    monkeypatch.setenv("IA_CACHE", "0")
+    # obtener/guardar también la respetan (los usan directamente la versión async y el streaming)
+    assert cache.obtener("k") is None
+    cache.guardar("otra", "texto", "groq")
+    assert cache.consultar("hola", lambda: ("fresca", "groq"), "hibrido") == ("fresca", "groq", False)
+    monkeypatch.setenv("IA_CACHE", "1")
+    assert cache.obtener("otra") is None
+    assert cache.obtener("k") == ("texto", "groq")
+
+
+def test_estadisticas(cache):
+    cache.guardar("k", "texto", "groq")
+    cache.obtener("k")
+    cache.obtener("nada")
+    datos = cache.estadisticas()
+    assert datos["entradas_disco"] == 1
+    assert datos["aciertos_memoria"] == 1 and datos["fallos"] == 1
+    assert datos["tasa_aciertos"] == 0.5
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import enrutador_ia
+from enrutador_ia import ABIERTO, CERRADO, SEMIABIERTO, CircuitoIA, EnrutadorIA
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    """Reloj monótono manual para el enfriamiento de los circuitos."""
+    r = types.SimpleNamespace(t=1000.0)
+    monkeypatch.setattr(enrutador_ia, "time", types.SimpleNamespace(monotonic=lambda: r.t))
+    return r
+
+
+def test_abre_tras_fallos_seguidos(reloj):
+    c = CircuitoIA("p", fallos_para_abrir=3, enfriamiento_s=30)
+    c.fallo("x")
+    c.fallo("x")
+    assert c.estado == CERRADO and c.permitir()
+    c.fallo("x")
+    assert c.estado == ABIERTO
+    assert not c.permitir()
+    assert c.puntuacion() == 0.0
+
+
+def test_un_exito_reinicia_la_cuenta(reloj):
+    c = CircuitoIA("p", fallos_para_abrir=2)
+    c.fallo("x")
+    c.exito(0.1)
+    c.fallo("x")
+    assert c.estado == CERRADO
+
+
+def test_limite_de_cuota_abre_al_momento(reloj):
+    c = CircuitoIA("p", fallos_para_abrir=3)
+    c.fallo("429 Too Many Requests")
+    assert c.estado == ABIERTO
+
+
+def test_semiabierto_deja_pasar_una_sola_sonda(reloj):
+    c = CircuitoIA("p", fallos_para_abrir=1, enfriamiento_s=30)
+    c.fallo("x")
+    reloj.t += 29
+    assert not c.permitir()
+    reloj.t += 2
+    assert c.permitir()
+    assert c.estado == SEMIABIERTO
+    assert not c.permitir()  # la sonda sigue en curso
+    c.exito(0.2)
+    assert c.estado == CERRADO and c.permitir()
+
+
+def test_sonda_fallida_duplica_el_enfriamiento(reloj):
+    c = CircuitoIA("p", fallos_para_abrir=1, enfriamiento_s=30, max_enfriamiento_s=100)
+    c.fallo("x")
+    for esperado in (60, 100, 100):
+        reloj.t = c.abierto_hasta
+        assert c.permitir()
+        c.fallo("x")
+        assert c.estado == ABIERTO
+        assert c.abierto_hasta - reloj.t == esperado
+    # Un éxito devuelve el enfriamiento al valor base
+    reloj.t = c.abierto_hasta
+    assert c.permitir()
+    c.exito(0.1)
+    assert c.enfriamiento_s == 30
+
+
+def test_liberar_suelta_la_sonda_sin_contar(reloj):
+    c = CircuitoIA("p", fallos_para_abrir=1, enfriamiento_s=10)
+    c.fallo("x")
+    reloj.t += 10
+    assert c.permitir()
+    c.liberar()
+    assert c.estado == SEMIABIERTO
+    assert c.permitir()
+
+
+def test_metricas(reloj):
+    c = CircuitoIA("p", ventana=4)
+    for lat in (1.0, 2.0, 3.0, 4.0):
+        c.exito(lat)
+    assert c.percentil(0.5) == 3.0
+    assert c.tasa_exito == 1.0
+    c.fallo("x")
+    assert c.tasa_exito == pytest.approx(4 / 5)  # ventana de 4: 3 éxitos + 1 fallo, suavizado
+    assert c.resumen()["llamadas"] == 4
+
+
+def test_enrutador_salta_el_circuito_abierto(reloj):
+    llamadas = []
+
+    def caido(m):
+        llamadas.append("a")
+        raise RuntimeError("caído")
+
+    def sano(m):
+        llamadas.append("b")
+        return "ok"
+
+    e = EnrutadorIA({"a": caido, "b": sano}, fallos_para_abrir=1)
+    assert e.llamar("hola") == ("ok", "b")
+    assert e.circuito("a").estado == ABIERTO
+    assert e.llamar("hola") == ("ok", "b")
+    assert llamadas == ["a", "b", "b"]
+
+
+def test_enrutador_todos_abiertos_prueba_el_primero_en_reabrir(reloj):
+    e = EnrutadorIA({"a": lambda m: "A", "b": lambda m: "B"}, fallos_para_abrir=1, enfriamiento_s=30)
+    e.circuito("a").fallo("x")
+    reloj.t += 5
+    e.circuito("b").fallo("x")
+    assert e.llamar("hola") == ("A", "a")
+
+
+# --- Hedging (llamar_cubierto) ---
+
+class Proveedor:
+    """Proveedor falso: responde al momento, falla o se bloquea hasta que se le suelte."""
+
+    def __init__(self, texto=None, error=None, bloquear=False):
+        self.texto, self.error = texto, error
+        self.soltar = threading.Event()
+        if not bloquear:
+            self.soltar.set()
+        self.llamadas = 0
+
+    def __call__(self, mensaje):
+        self.llamadas += 1
+        self.soltar.wait(10)
+        if self.error:
+            raise RuntimeError(self.error)
+        return self.texto
+
+
+def _cubierto(enrutador, **kwargs):
+    return asyncio.run(enrutador.llamar_cubierto("hola", **kwargs))
+
+
+def test_cubierto_sin_cobertura_si_responde_a_tiempo():
+    a, b = Proveedor("A"), Proveedor("B")
+    assert _cubierto(EnrutadorIA({"a": a, "b": b}), retraso_s=5) == ("A", "a")
+    assert b.llamadas == 0
+
+
+def test_cubierto_lanza_el_siguiente_si_el_primero_tarda():
+    a, b = Proveedor("A", bloquear=True), Proveedor("B")
+    # asyncio.run() espera al ejecutor por defecto al cerrar: se suelta a "a" poco después
+    threading.Timer(0.5, a.soltar.set).start()
+    e = EnrutadorIA({"a": a, "b": b})
+    assert _cubierto(e, retraso_s=0.1) == ("B", "b")
+    assert a.llamadas == b.llamadas == 1
+
+
+def test_cubierto_un_fallo_lanza_el_siguiente_sin_esperar():
+    a, b = Proveedor(error="500"), Proveedor("B")
+    e = EnrutadorIA({"a": a, "b": b})
+    t0 = time.monotonic()
+    assert _cubierto(e, retraso_s=5) == ("B", "b")
+    assert time.monotonic() - t0 < 2
+    assert e.circuito("a").fallos_seguidos == 1
+
+
+def test_cubierto_todos_fallan():
+    e = EnrutadorIA({"a": Proveedor(error="uno"), "b": Proveedor(error="dos")})
+    with pytest.raises(RuntimeError, match="a: uno.*b: dos|b: dos.*a: uno"):
+        _cubierto(e, retraso_s=0.05)
+
+
+def test_cubierto_salta_circuitos_abiertos():
+    a, b = Proveedor("A"), Proveedor("B")
+    e = EnrutadorIA({"a": a, "b": b}, fallos_para_abrir=1)
+    e.circuito("a").fallo("x")
+    assert _cubierto(e, retraso_s=5) == ("B", "b")
+    assert a.llamadas == 0
+
+
+def test_cubierto_con_ejecutor_propio_no_espera_al_perdedor():
+    a, b = Proveedor("A", bloquear=True), Proveedor("B")
+    ejecutor = ThreadPoolExecutor(max_workers=2)
+    try:
+        t0 = time.monotonic()
+        try:
+            assert _cubierto(EnrutadorIA({"a": a, "b": b}), retraso_s=0.05, ejecutor=ejecutor) == ("B", "b")
+        finally:
+            ejecutor.shutdown(wait=False)
+        # asyncio.run() no se quedó esperando al intento de "a", que sigue bloqueado
+        assert time.monotonic() - t0 < 5
+        assert not a.soltar.is_set()
+    finally:
+        a.soltar.set()
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+import pytest
+
+import orquestador
+from orquestador import Etapa, Orquestador
+
+
+@pytest.fixture(autouse=True)
+def estado_temporal(tmp_path, monkeypatch):
+    monkeypatch.setattr(orquestador, "ESTADO_DIR", tmp_path / ".deploy_estado")
+
+
+class Registro:
+    """Anota inicio y fin de cada etapa para comprobar el orden."""
+
+    def __init__(self):
+        self.eventos = []
+        self._lock = threading.Lock()
+
+    def etapa(self, nombre, dura_s=0.0, falla=False):
+        def fn(ctx):
+            with self._lock:
+                self.eventos.append(("inicio", nombre))
+            time.sleep(dura_s)
+            with self._lock:
+                self.eventos.append(("fin", nombre))
+            return not falla
+        return fn
+
+    def indice(self, evento, nombre):
+        return self.eventos.index((evento, nombre))
+
+
+def test_dependencias_antes_que_dependientes():
+    r = Registro()
+    orq = Orquestador("prueba", [
+        Etapa("c", fn=r.etapa("c"), depende=("b",)),
+        Etapa("a", fn=r.etapa("a", 0.05)),
+        Etapa("b", fn=r.etapa("b"), depende=("a",)),
+    ])
+    assert orq.ejecutar()
+    assert r.indice("fin", "a") < r.indice("inicio", "b")
+    assert r.indice("fin", "b") < r.indice("inicio", "c")
+
+
+def test_independientes_en_paralelo():
+    r = Registro()
+    orq = Orquestador("prueba", [
+        Etapa("x", fn=r.etapa("x", 0.2)),
+        Etapa("y", fn=r.etapa("y", 0.2)),
+    ], max_paralelo=2)
+    assert orq.ejecutar()
+    # Las dos empezaron antes de que terminara ninguna
+    assert r.indice("inicio", "y") < r.indice("fin", "x")
+
+
+def test_fallo_obligatorio_bloquea_dependientes():
+    r = Registro()
+    orq = Orquestador("prueba", [
+        Etapa("a", fn=r.etapa("a", falla=True)),
+        Etapa("b", fn=r.etapa("b"), depende=("a",)),
+        Etapa("c", fn=r.etapa("c"), depende=("b",)),
+    ])
+    assert not orq.ejecutar()
+    assert [orq.etapas[n].estado for n in "abc"] == ["error", "bloqueada", "bloqueada"]
+    assert ("inicio", "b") not in r.eventos
+
+
+def test_fallo_opcional_no_bloquea():
+    r = Registro()
+    orq = Orquestador("prueba", [
+        Etapa("a", fn=r.etapa("a", falla=True), opcional=True),
+        Etapa("b", fn=r.etapa("b"), depende=("a",)),
+    ])
+    assert orq.ejecutar()
+    assert orq.etapas["b"].estado == "ok"
+
+
+def test_reintentos():
+    intentos = []
+
+    def inestable(ctx):
+        intentos.append(1)
+        return len(intentos) >= 3
+
+    orq = Orquestador("prueba", [Etapa("a", fn=inestable, reintentos=2, espera_reintento_s=0)])
+    assert orq.ejecutar()
+    assert orq.etapas["a"].intentos == 3
+
+
+def test_ciclo_y_dependencia_desconocida():
+    with pytest.raises(ValueError, match="Ciclo"):
+        Orquestador("prueba", [Etapa("a", depende=("b",)), Etapa("b", depende=("a",))])
+    with pytest.raises(ValueError, match="no existe"):
+        Orquestador("prueba", [Etapa("a", depende=("z",))])
+
+
+def test_reanudar_salta_las_etapas_ok():
+    llamadas = []
+    fallar = [True]
+
+    def a(ctx):
+        llamadas.append("a")
+
+    def b(ctx):
+        llamadas.append("b")
+        return not fallar[0]
+
+    def etapas():
+        return [Etapa("a", fn=a), Etapa("b", fn=b, depende=("a",))]
+
+    assert not Orquestador("prueba", etapas()).ejecutar()
+    fallar[0] = False
+    assert Orquestador("prueba", etapas()).ejecutar(reanudar=True)
+    assert llamadas == ["a", "b", "b"]
+
+
+@pytest.mark.parametrize("no_git", [False, True])
+def test_deploy_despliega_tras_el_push(no_git):
+    import deploy_y_notificar
+
+    r = Registro()
+    etapas = deploy_y_notificar.etapas(no_git=no_git)
+    for e in etapas:
+        e.cmd, e.fn = None, r.etapa(e.nombre, 0.05)
+    orq = Orquestador("deploy_prueba", etapas)
+    assert orq.ejecutar()
+    for plataforma in ("vercel", "railway"):
+        assert r.indice("fin", "build") < r.indice("inicio", plataforma)
+        if not no_git:
+            assert r.indice("fin", "git") < r.indice("inicio", plataforma)
+        assert r.indice("fin", plataforma) < r.indice("inicio", "esperar")
+    # vercel y railway solo son paralelas entre sí
+    assert r.indice("inicio", "railway") < r.indice("fin", "vercel")
+    assert orq.etapas["git"].estado == ("omitida" if no_git else "ok")